@@ -17,4 +17,749 @@ def test_batch():
         test_passed = False
     
     assert test_passed
-    
\ No newline at end of file
+    
+def test_jit_parity():
+    import numpy as np
+    from sprit import sprit_jit
+
+    rng = np.random.default_rng(0)
+    test_passed = True
+    for min_len in [0, 1, 5]:
+        mask = rng.random(5000) > 0.3
+        indices = np.flatnonzero(mask)
+        for kernel, args in [(sprit_jit.runs_from_indices, (indices, min_len)),
+                             (sprit_jit.runs_from_mask, (mask, min_len))]:
+            jitOut = kernel(*args, use_jit=True)
+            npOut = kernel(*args, use_jit=False)
+            test_passed = test_passed and all(np.array_equal(j, n) for j, n in zip(jitOut, npOut))
+
+    starts = rng.integers(0, 10000, 200)
+    ends = starts + rng.integers(0, 300, 200)
+    jitOut = sprit_jit.merge_windows(starts, ends, use_jit=True)
+    npOut = sprit_jit.merge_windows(starts, ends, use_jit=False)
+    test_passed = test_passed and all(np.array_equal(j, n) for j, n in zip(jitOut, npOut))
+
+    data = rng.normal(1000, 50, 20000)
+    for win_len in [1, 2, 101, 2000]:
+        test_passed = test_passed and np.allclose(sprit_jit.moving_std(data, win_len, use_jit=True), 
+                                                  sprit_jit.moving_std(data, win_len, use_jit=False), atol=1e-6, equal_nan=True)
+
+    assert test_passed
+
+def test_interval_set():
+    import numpy as np
+    import obspy
+    import pandas as pd
+    from sprit import sprit_hvsr
+
+    IntervalSet = sprit_hvsr.IntervalSet
+    a = IntervalSet([[20, 30], [0, 10]], time_type='timestamp')
+    touching = IntervalSet([[10, 15], [30, 40]], time_type='timestamp')
+    adjacent = IntervalSet([[10.5, 19.5]], time_type='timestamp')
+
+    # Intervals are closed, so touching intervals are merged by union and share a single point in an intersection
+    test_passed = (a | touching).to_list('timestamp') == [[0, 15], [20, 40]]
+    test_passed = test_passed and (a | adjacent).to_list('timestamp') == [[0, 10], [10.5, 19.5], [20, 30]]
+    test_passed = test_passed and (a & touching).to_list('timestamp') == [[10, 10], [30, 30]]
+    test_passed = test_passed and len(a & adjacent) == 0
+    test_passed = test_passed and (a & IntervalSet([[5, 25]], time_type='timestamp')).to_list('timestamp') == [[5, 10], [20, 25]]
+    test_passed = test_passed and a.complement(-5, 35).to_list('timestamp') == [[-5, 0], [10, 20], [30, 35]]
+    test_passed = test_passed and a.complement(0, 30).to_list('timestamp') == [[10, 20]]
+    test_passed = test_passed and list(a.overlaps([10, 10.1, 30, -3, 31], [12, 19.9, 31, -0.1, 35])) == [True, False, True, False, False]
+
+    # Sample masks include samples at both ends of each interval
+    mask = a.sample_mask(0, 40, 1)
+    test_passed = test_passed and np.array_equal(np.flatnonzero(mask), np.r_[0:11, 20:31])
+    test_passed = test_passed and IntervalSet.from_mask(mask, 0, 1).to_list('timestamp') == a.to_list('timestamp')
+    # Separate intervals that share (or touch) samples once they are rounded to the samples are still one run of samples
+    close = IntervalSet([[0.2, 2.1], [2.3, 2.6], [2.7, 5.5], [5.4, 5.6], [7.0, 7.4]], time_type='timestamp')
+    closeMask = close.sample_mask(0, 20, 0.5)
+    test_passed = test_passed and closeMask.dtype == bool and np.array_equal(np.flatnonzero(closeMask), np.r_[1:12, 14])
+
+    # Every window that overlaps removed (masked) data is no longer used
+    t0 = obspy.UTCDateTime(2024, 1, 1)
+    stream = obspy.Stream()
+    for comp in 'ZEN':
+        data = np.ma.masked_array(np.ones(600), mask=np.zeros(600, dtype=bool))
+        if comp == 'E':
+            data.mask[100:151] = True
+        stream.append(obspy.Trace(data, header={'channel':f'EH{comp}', 'starttime':t0, 'sampling_rate':1}))
+    winStarts = [t0 + 60*i for i in range(10)]
+    hvsrDF = pd.DataFrame({'TimesProcessed_Obspy':winStarts, 'TimesProcessed_ObspyEnd':[t + 59 for t in winStarts],
+                           'Use':[True]*9 + [False]}, index=[t.datetime for t in winStarts])
+    hvsr_data = getattr(sprit_hvsr, '__remove_windows_from_df')({'stream_edited':stream, 'hvsr_windows_df':hvsrDF})
+    test_passed = test_passed and list(hvsr_data['hvsr_windows_df']['Use']) == [True, False, False] + [True]*6 + [False]
+    test_passed = test_passed and hvsr_data['x_gaps_obspyDT'] == [(t0 + 100, t0 + 150)]
+
+    assert test_passed
+
+def test_sample_mask():
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    SampleMask = sprit_hvsr.SampleMask
+    rng = np.random.default_rng(1)
+    test_passed = True
+    for npts in [1, 8, 13, 1001]:
+        boolMask = rng.random(npts) > 0.6
+        sMask = SampleMask.from_bool(boolMask)
+        test_passed = test_passed and sMask.nbytes == (npts + 7) // 8
+        test_passed = test_passed and np.array_equal(sMask.to_bool(), boolMask)
+        test_passed = test_passed and np.array_equal(sMask.to_bool(3, npts - 2), boolMask[3:npts - 2])
+        test_passed = test_passed and sMask.count() == boolMask.sum() and sMask.any() == boolMask.any()
+        # Padding bits must not be set by inverting
+        test_passed = test_passed and np.array_equal((~sMask).to_bool(), ~boolMask) and (~sMask).count() == (~boolMask).sum()
+
+        otherMask = rng.random(npts) > 0.5
+        test_passed = test_passed and np.array_equal((sMask | otherMask).to_bool(), boolMask | otherMask)
+        test_passed = test_passed and np.array_equal((sMask & otherMask).to_bool(), boolMask & otherMask)
+
+        # Runs and masked arrays
+        runStarts, runEnds = sMask.runs()
+        test_passed = test_passed and np.array_equal(SampleMask.from_runs(runStarts, runEnds, npts).to_bool(), boolMask)
+        data = rng.normal(size=npts)
+        maskedData = sMask.to_masked_array(data)
+        test_passed = test_passed and np.array_equal(SampleMask.from_array(maskedData).to_bool(), boolMask)
+        test_passed = test_passed and np.array_equal(np.ma.getdata(maskedData), data)
+
+    assert test_passed
+
+def test_stalta_cache():
+    import copy
+    import pickle
+    import numpy as np
+    import obspy
+    from obspy.signal.trigger import classic_sta_lta
+    from sprit import sprit_hvsr
+
+    rng = np.random.default_rng(2)
+    stream = obspy.Stream()
+    for comp in 'ZEN':
+        data = rng.normal(0, 1, 30000) + 5
+        data[12000:12500] *= 20
+        stream.append(obspy.Trace(data, header={'channel':f'EH{comp}', 'starttime':obspy.UTCDateTime(2024, 1, 1), 'sampling_rate':100}))
+
+    antiStalta = getattr(sprit_hvsr, '__remove_anti_stalta')
+    cache = sprit_hvsr.STALTACache()
+    freshWindows = antiStalta(stream, 2, 30, [0.5, 4], return_windows=True)
+    cachedWindows = antiStalta(stream, 2, 30, [0.5, 4], return_windows=True, cft_cache=cache)
+    test_passed = len(freshWindows) > 0 and cachedWindows.to_list('timestamp') == freshWindows.to_list('timestamp')
+    test_passed = test_passed and cache.misses == 3 and cache.hits == 0 and len(cache) == 3
+
+    # Changing only the threshold reuses the cached characteristic functions
+    cachedWindows = antiStalta(stream, 2, 30, [0.8, 3], return_windows=True, cft_cache=cache)
+    test_passed = test_passed and cache.hits == 3 and cachedWindows.to_list('timestamp') == antiStalta(stream, 2, 30, [0.8, 3], return_windows=True).to_list('timestamp')
+    cft = cache.get(stream[0], 2, 30, lambda tr: None)
+    test_passed = test_passed and np.array_equal(cft, classic_sta_lta(stream[0], nsta=200, nlta=3000))
+
+    # Changing the data (e.g., detrending) invalidates the cached values
+    detrended = stream.copy().detrend('linear')
+    cft = cache.get(detrended[0], 2, 30, lambda tr: classic_sta_lta(tr, nsta=200, nlta=3000))
+    test_passed = test_passed and cache.misses == 4 and np.array_equal(cft, classic_sta_lta(detrended[0], nsta=200, nlta=3000))
+    cache.prune(detrended)
+    test_passed = test_passed and len(cache) == 1 and cache.nbytes == cft.nbytes
+
+    # Hits and misses are counted correctly when the cache is used from several threads
+    threadCache = sprit_hvsr.STALTACache()
+    sprit_hvsr._threaded_map(lambda tr: threadCache.get(tr, 2, 30, lambda t: classic_sta_lta(t, nsta=200, nlta=3000)), list(stream)*20, n_workers=8)
+    test_passed = test_passed and threadCache.hits + threadCache.misses == 60 and len(threadCache) == 3 and threadCache.misses >= 3
+
+    # remove_noise() reuses the characteristic functions of the same data, and does not share data between stream and stream_edited
+    hvData = sprit.HVSRData({'stream':stream, 'input_stream':stream.copy(), 'site':'SyntheticSite', 'batch':False, 'ProcessingStatus':{'OverallStatus':True}})
+    hvData = sprit.remove_noise(hvData, remove_method='antitrigger', stalta_thresh=[0.5, 4])
+    hvData = sprit.remove_noise(hvData, remove_method='antitrigger', stalta_thresh=[0.8, 3])
+    test_passed = test_passed and hvData.stalta_cache.misses == 3 and hvData.stalta_cache.hits == 3
+    test_passed = test_passed and not any(np.may_share_memory(np.ma.getdata(edTr.data), tr.data) for edTr in hvData['stream_edited'] for tr in stream)
+    # No data removed (unrecognized method), so stream_edited would otherwise be the same data as stream
+    hvData = sprit.remove_noise(hvData, remove_method='not_a_method')
+    test_passed = test_passed and not any(np.may_share_memory(np.ma.getdata(edTr.data), tr.data) for edTr in hvData['stream_edited'] for tr in stream)
+
+    # Data with a cache can still be copied and pickled (e.g., by export_data()); the copy starts with an empty cache
+    for hvCopy in [copy.deepcopy(hvData), pickle.loads(pickle.dumps(hvData))]:
+        test_passed = test_passed and len(hvCopy.stalta_cache) == 0 and hvCopy.stalta_cache.misses == hvData.stalta_cache.misses
+        hvCopy = sprit.remove_noise(hvCopy, remove_method='antitrigger', stalta_thresh=[0.8, 3])
+        test_passed = test_passed and len(hvCopy.stalta_cache) == 3
+
+    assert test_passed
+
+def test_mseed_window_read():
+    import pathlib
+    import numpy as np
+    import obspy
+    from sprit import sprit_hvsr
+
+    sampleFile = pathlib.Path(sprit.__file__).parent.joinpath('resources', 'sample_data', 'SampleHVSRSite1_AM.RAC84.00.2023.046_2023-02-15_1704-1734.MSEED')
+    fullStream = obspy.read(str(sampleFile))
+    test_passed = sprit_hvsr._get_mseed_record_index(sampleFile) is not None
+
+    t0 = fullStream[0].stats.starttime
+    windows = [(t0 + 60, t0 + 300), (t0 + 61.237, t0 + 62.5), (t0 - 10, t0 + 5), (t0 + 1700, t0 + 2000)]
+    def _compare(window):
+        windowStream = sprit_hvsr._read_data_window(sampleFile, starttime=window[0], endtime=window[1])
+        trimStream = fullStream.copy().trim(window[0], window[1], nearest_sample=True)
+        windowStream.sort()
+        trimStream.sort()
+        return len(windowStream) == len(trimStream) and all(tr1.stats.starttime == tr2.stats.starttime and np.array_equal(tr1.data, tr2.data) 
+                                                            for tr1, tr2 in zip(windowStream, trimStream))
+
+    # Also read concurrently (the record index cache is shared between threads)
+    test_passed = test_passed and all(_compare(win) for win in windows)
+    test_passed = test_passed and all(sprit_hvsr._threaded_map(_compare, windows * 4, n_workers=4))
+
+    assert test_passed
+
+def test_rs_archive_catalog():
+    import os
+    import pathlib
+    import tempfile
+    import numpy as np
+    import obspy
+    from sprit import sprit_hvsr
+
+    # Directory walk used to find the files for a day before the catalog was added
+    def _walk_archive(archiveDir, year, doy):
+        fileList = []
+        filesinfolder = False
+        for child in archiveDir.iterdir():
+            if child.is_file() and child.name.startswith('AM') and str(doy).zfill(3) in child.name and str(year) in child.name:
+                filesinfolder = True
+                fileList.append(child)
+            elif child.is_dir() and child.name.startswith('EH') and not filesinfolder:
+                for c in child.iterdir():
+                    if c.is_file() and c.name.startswith('AM') and c.name.endswith(str(doy).zfill(3)) and str(year) in c.name:
+                        fileList.append(c)
+        return sorted(fileList, key=lambda f: f.name)
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        archiveDir = pathlib.Path(tempDir).joinpath('archive')
+        for cha in ['EHZ', 'EHN', 'EHE']:
+            archiveDir.joinpath(f'{cha}.D').mkdir(parents=True)
+            for doy in [45, 46, 60]:
+                dayStart = obspy.UTCDateTime(year=2023, julday=doy)
+                tr = obspy.Trace(np.zeros(1000, dtype=np.int32), header={'network':'AM', 'station':'RAC84', 'location':'00', 'channel':cha,
+                                                                          'starttime':dayStart + 3600, 'sampling_rate':100})
+                tr.write(str(archiveDir.joinpath(f'{cha}.D', f'AM.RAC84.00.{cha}.D.2023.{str(doy).zfill(3)}')), format='MSEED')
+        archiveDir.joinpath('EHZ.D', 'notes.txt').write_text('not a data file')
+        archiveFiles = sorted(archiveDir.rglob('*'))
+
+        # Catalogs are saved in the cache directory, not in the archive
+        cacheDir = sprit_hvsr.RS_CATALOG_DIR
+        sprit_hvsr.RS_CATALOG_DIR = pathlib.Path(tempDir).joinpath('cache')
+        catalog = sprit_hvsr.RSArchiveCatalog(archiveDir)
+        test_passed = len(catalog) == 9 and catalog.available_days() == [(2023, 45), (2023, 46), (2023, 60)]
+        test_passed = test_passed and catalog.catalog_path.parent == sprit_hvsr.RS_CATALOG_DIR and catalog.catalog_path.exists()
+        test_passed = test_passed and sorted(archiveDir.rglob('*')) == archiveFiles
+        for doy in [45, 46, 60, 61]:
+            test_passed = test_passed and catalog.find(date=(2023, doy)) == _walk_archive(archiveDir, 2023, doy)
+        test_passed = test_passed and [f.name for f in catalog.find(station='RAC84', date=(2023, 46), channels=['EHZ'])] == ['AM.RAC84.00.EHZ.D.2023.046']
+        test_passed = test_passed and catalog.find(station='OTHER', date=(2023, 46)) == []
+
+        # Time range lookups use the span of the data in each file
+        day46 = obspy.UTCDateTime(year=2023, julday=46)
+        test_passed = test_passed and len(catalog.find(station='RAC84', starttime=day46 + 3600, endtime=day46 + 3605)) == 3
+        test_passed = test_passed and catalog.find(station='RAC84', starttime=day46 + 7200, endtime=day46 + 7300) == []
+
+        # A saved catalog is reloaded, and new files are found when it is refreshed
+        reloaded = sprit_hvsr.RSArchiveCatalog(archiveDir)
+        test_passed = test_passed and reloaded.find(date=(2023, 60)) == catalog.find(date=(2023, 60))
+        tr.stats.starttime = obspy.UTCDateTime(year=2023, julday=61)
+        tr.write(str(archiveDir.joinpath('EHE.D', 'AM.RAC84.00.EHE.D.2023.061')), format='MSEED')
+        dirStat = archiveDir.joinpath('EHE.D').stat()
+        os.utime(archiveDir.joinpath('EHE.D'), ns=(dirStat.st_atime_ns, dirStat.st_mtime_ns + 10**9))  # In case of coarse file system timestamps
+        test_passed = test_passed and reloaded.refresh().find(date=(2023, 61)) == _walk_archive(archiveDir, 2023, 61)
+
+        # Catalogs used by fetch_data() are only refreshed (by the caller) when files are not found
+        sprit_hvsr.RS_CATALOGS.pop(archiveDir.resolve().as_posix(), None)
+        sharedCatalog = getattr(sprit_hvsr, '_get_rs_catalog')(archiveDir)
+        tr.stats.starttime = obspy.UTCDateTime(year=2023, julday=62)
+        tr.write(str(archiveDir.joinpath('EHE.D', 'AM.RAC84.00.EHE.D.2023.062')), format='MSEED')
+        os.utime(archiveDir.joinpath('EHE.D'), ns=(dirStat.st_atime_ns, dirStat.st_mtime_ns + 2 * 10**9))
+        test_passed = test_passed and getattr(sprit_hvsr, '_get_rs_catalog')(archiveDir) is sharedCatalog and sharedCatalog.find(date=(2023, 62)) == []
+        test_passed = test_passed and sharedCatalog.refresh().find(date=(2023, 62)) == _walk_archive(archiveDir, 2023, 62)
+        sprit_hvsr.RS_CATALOGS.pop(archiveDir.resolve().as_posix(), None)
+        sprit_hvsr.RS_CATALOG_DIR = cacheDir
+
+    assert test_passed
+
+def test_batch_release_site_data():
+    import pathlib
+    import tempfile
+    import pandas as pd
+
+    sampleDir = pathlib.Path(sprit.__file__).parent.joinpath('resources', 'sample_data')
+    batchDF = pd.read_csv(sampleDir.joinpath('Batch_SampleData.csv')).iloc[:2]
+    batchDF['input_data'] = [sampleDir.joinpath(f).as_posix() for f in batchDF['input_data']]
+    with tempfile.TemporaryDirectory() as tempDir:
+        batchCSV = pathlib.Path(tempDir).joinpath('batch.csv')
+        batchDF.to_csv(batchCSV, index=False)
+        # By default, all data of each site is kept, so the sites can still be plotted and reprocessed
+        hvBatch = sprit.run(batchCSV, source='batch', report_formats=['print'], show_plot=False)
+        # Otherwise, the large arrays of each site are removed once it has been processed
+        hvBatchReleased = sprit.run(batchCSV, source='batch', report_formats=['print'], show_plot=False, release_site_data=True)
+
+    test_passed = len(hvBatch.sites) == 2 and len(hvBatchReleased.sites) == 2
+    for site in hvBatch.sites:
+        siteKeys = hvBatch[site].keys()
+        test_passed = test_passed and 'stream' in siteKeys and 'psd_raw' in siteKeys
+        test_passed = test_passed and any(str(col).startswith('psd_values_') for col in hvBatch[site]['hvsr_windows_df'].columns)
+        hvsrFig = sprit.plot_hvsr(hvBatch[site], return_fig=True, show_plot=False)
+        test_passed = test_passed and hvsrFig is not None
+        outlierData = sprit.remove_outlier_curves(hvBatch[site], use_hv_curve=False, plot_engine=None)
+        test_passed = test_passed and 'RMSE_psd_values_Z' in outlierData['hvsr_windows_df'].columns
+
+    for site in hvBatchReleased.sites:
+        siteKeys = hvBatchReleased[site].keys()
+        test_passed = test_passed and 'stream' not in siteKeys and 'input_stream' not in siteKeys and 'stream_edited' not in siteKeys
+        test_passed = test_passed and 'hvsr_curve' in siteKeys and 'BestPeak' in siteKeys
+        test_passed = test_passed and not any(str(col).startswith('psd_values_') for col in hvBatchReleased[site]['hvsr_windows_df'].columns)
+
+    assert test_passed
+
+def test_decimation():
+    import warnings
+    import numpy as np
+    import obspy
+    from sprit import sprit_hvsr
+
+    hvData = sprit.fetch_data(sprit.input_params('sample'), target_sampling_rate=50)
+    test_passed = all(tr.stats.sampling_rate == 50 for tr in hvData['stream'])
+    decimationInfo = hvData['processing_parameters']['fetch_data'].get('decimation', {})
+    test_passed = test_passed and decimationInfo.get('original_sampling_rate') == 100 and decimationInfo.get('sampling_rate') == 50 and decimationInfo.get('factor') == 2
+
+    # Segments (e.g., between gaps) that are too short for the zero-phase filter are resampled instead
+    t0 = obspy.UTCDateTime(2024, 1, 1)
+    stream = obspy.Stream([obspy.Trace(np.random.default_rng(3).normal(size=npts), header={'channel':'EHZ', 'starttime':t0 + start, 'sampling_rate':100})
+                           for npts, start in [(10000, 0), (40, 200), (1, 300)]])
+    with warnings.catch_warnings(record=True) as caughtWarnings:
+        warnings.simplefilter('always')
+        stream, decimationInfo = getattr(sprit_hvsr, '__decimate_data')(stream, 20, [0.4, 8])
+    test_passed = test_passed and all(tr.stats.sampling_rate == 20 for tr in stream) and stream[0].stats.npts == 2000
+    test_passed = test_passed and decimationInfo['sampling_rate'] == 20 and any('too short' in str(w.message) for w in caughtWarnings)
+
+    # Segments after a gap are put on the same sample grid, so once merged they match the decimated data without the gap
+    x = np.arange(60000)
+    fullData = np.sin(2 * np.pi * 1.3 * x / 100) + 0.1 * np.random.default_rng(4).normal(size=x.size)
+    gapStream = obspy.Stream([obspy.Trace(np.ma.masked_array(fullData, mask=(x >= 20003) & (x < 20502)), header={'channel':'EHZ', 'starttime':t0, 'sampling_rate':100})]).split()
+    gapStream, decimationInfo = getattr(sprit_hvsr, '__decimate_data')(gapStream, 20, [0.4, 8])
+    test_passed = test_passed and all(((tr.stats.starttime - t0) * 20) % 1 == 0 for tr in gapStream)
+    fullStream, decimationInfo = getattr(sprit_hvsr, '__decimate_data')(obspy.Stream([obspy.Trace(fullData.copy(), header={'channel':'EHZ', 'starttime':t0, 'sampling_rate':100})]), 20, [0.4, 8])
+    mergedData = gapStream.merge(method=1)[0].data
+    test_passed = test_passed and mergedData.size == fullStream[0].stats.npts
+    # Away from the ends of each segment (where the filters differ)
+    for segSlice in [slice(200, 3800), slice(4300, 11800)]:
+        test_passed = test_passed and not np.ma.is_masked(mergedData[segSlice]) and np.allclose(mergedData[segSlice], fullStream[0].data[segSlice], atol=1e-6)
+
+    assert test_passed
+
+def test_read_tromino_files():
+    import pathlib
+    import struct
+    import tempfile
+    import numpy as np
+
+    # Value-by-value reader used before the file was mapped with numpy
+    def _struct_read(dPath, startByte=24576):
+        dataList = []
+        with open(dPath, 'rb') as f:
+            while True:
+                data = f.read(2)
+                if not data:
+                    break
+                dataList.append(struct.unpack('<H', data)[0])
+        dataArr = np.array(dataList)
+        medVal = np.nanmedian(dataArr[50000:100000])
+        return [dataArr[startByte + i::3] - medVal for i in range(3)]
+
+    rng = np.random.default_rng(11)
+    siteParams = [{'site':f'TromSite{i}', 'acq_date':f'2024-05-0{i+1}', 'starttime':f'0{i+1}:15:00', 'station':str(10 + i), 'instrument':'Tromino'} for i in range(2)]
+    with tempfile.TemporaryDirectory() as tempDir:
+        trcFiles = []
+        for i in range(len(siteParams)):
+            trcFile = pathlib.Path(tempDir).joinpath(f'TromSite{i}.trc')
+            # Header values, then interleaved (E, N, Z) data values
+            fileValues = np.concatenate([rng.integers(0, 2**16, 24576), 2**15 + rng.normal(0, 200, 128 * 300 * 3).astype(int)])
+            trcFile.write_bytes(fileValues.astype('<u2').tobytes())
+            trcFiles.append(trcFile)
+
+        paramsList = [sprit.input_params(input_data=f, **p) for f, p in zip(trcFiles, siteParams)]
+        streams = sprit.read_tromino_files(trcFiles, paramsList, n_workers=2)
+        test_passed = len(streams) == 2
+        for stream, trcFile, params in zip(streams, trcFiles, paramsList):
+            test_passed = test_passed and all(np.array_equal(tr.data, structData) for tr, structData in zip(stream, _struct_read(trcFile)))
+            test_passed = test_passed and all(tr.stats.starttime.date == params['acq_date'] and tr.stats.location == params['station'] for tr in stream)
+        test_passed = test_passed and streams[0][0].stats.starttime != streams[1][0].stats.starttime
+
+        # The same list of parameters is needed for each file
+        try:
+            sprit.read_tromino_files(trcFiles, paramsList[0])
+            test_passed = False
+        except ValueError:
+            pass
+
+        # Each site in a batch has its own start time and station
+        batchData = sprit.batch_data_read([str(f) for f in trcFiles], batch_type='filelist', batch_params=[dict(p) for p in siteParams], n_workers=2)
+        for params, stream in zip(paramsList, streams):
+            batchStream = batchData[params['site']]['stream']
+            test_passed = test_passed and all(tr.stats.starttime == stream[0].stats.starttime and tr.stats.location == params['station'] for tr in batchStream)
+
+    assert test_passed
+
+def test_detrend_data():
+    import numpy as np
+    import obspy
+    from sprit import sprit_hvsr
+    detrend_data = getattr(sprit_hvsr, '__detrend_data')
+
+    rng = np.random.default_rng(5)
+    t0 = obspy.UTCDateTime(2024, 1, 1)
+    x = np.arange(12345)
+    stream = obspy.Stream([obspy.Trace(rng.normal(size=x.size) + 1e-6 * (x - 4000.0)**2 + 30 * np.sin(x / 900), header={'channel':f'EH{comp}', 'starttime':t0, 'sampling_rate':100})
+                           for comp in 'ZEN'])
+
+    # Each detrend type (with the same options fetch_data() gives obspy) should give the same result as obspy
+    test_passed = True
+    for detrend, options, obspyArgs in [('simple', 2, {'type':'simple'}), ('linear', 2, {'type':'linear'}),
+                                        ('constant', 2, {'type':'constant'}), ('demean', 2, {'type':'demean'}),
+                                        ('polynomial', 3, {'type':'polynomial', 'order':3}), ('spline', 2, {'type':'spline', 'order':2, 'dspline':1000}),
+                                        (True, 3, {'type':'spline', 'order':3, 'dspline':1000})]:
+        obspyStream = stream.copy().detrend(**obspyArgs)
+        spritStream = detrend_data(stream, detrend, options, verbose=False, source='file')
+        test_passed = test_passed and all(np.allclose(spritTr.data, obspyTr.data, rtol=0, atol=1e-8) for spritTr, obspyTr in zip(spritStream, obspyStream))
+        test_passed = test_passed and all(spritTr.stats.processing == obspyTr.stats.processing for spritTr, obspyTr in zip(spritStream, obspyStream))
+
+    # Filtering is also recorded as obspy does
+    obspyStream = stream.copy().detrend('linear').filter('bandpass', freqmin=0.5, freqmax=20)
+    spritStream = detrend_data(stream, 'linear', 2, verbose=False, source='file', filter_type='bandpass', filter_options={'freqmin':0.5, 'freqmax':20})
+    test_passed = test_passed and all(np.allclose(spritTr.data, obspyTr.data, rtol=0, atol=1e-8) and spritTr.stats.processing == obspyTr.stats.processing
+                                      for spritTr, obspyTr in zip(spritStream, obspyStream))
+
+    # Masked traces keep their mask, and each unmasked segment is detrended as its own trace
+    maskedTr = stream[0].copy()
+    maskedTr.data = np.ma.masked_array(maskedTr.data, mask=(x >= 5000) & (x < 5100))
+    spritTr = detrend_data(obspy.Stream([maskedTr]), 'linear', 2, verbose=False, source='file')[0]
+    obspySegments = maskedTr.split().detrend('linear')
+    test_passed = test_passed and np.array_equal(np.ma.getmaskarray(spritTr.data), np.ma.getmaskarray(maskedTr.data))
+    test_passed = test_passed and np.allclose(spritTr.data[:5000], obspySegments[0].data, rtol=0, atol=1e-8) and np.allclose(spritTr.data[5100:], obspySegments[1].data, rtol=0, atol=1e-8)
+
+    # The input stream is not changed
+    test_passed = test_passed and not any('processing' in tr.stats for tr in stream) and not np.ma.is_masked(stream[0].data)
+
+    assert test_passed
+
+def test_batch_read_once():
+    import pathlib
+    import tempfile
+    import numpy as np
+    import pandas as pd
+
+    sampleFile = pathlib.Path(sprit.__file__).parent.joinpath('resources', 'sample_data', 'SampleHVSRSite1_AM.RAC84.00.2023.046_2023-02-15_1704-1734.MSEED')
+    batchDF = pd.DataFrame({'input_data':[sampleFile.as_posix()]*2, 'site':['Segment1', 'Segment2'], 'acq_date':['2023-02-15']*2,
+                            'starttime':['17:05', '17:15'], 'endtime':['17:14', '17:24'], 'detrend':[None]*2})
+    with tempfile.TemporaryDirectory() as tempDir:
+        batchCSV = pathlib.Path(tempDir).joinpath('segments.csv')
+        batchDF.to_csv(batchCSV, index=False)
+        sharedBatch = sprit.batch_data_read(batchCSV, read_once=True)
+        separateBatch = sprit.batch_data_read(batchCSV, read_once=False)
+
+    test_passed = True
+    for site in ['Segment1', 'Segment2']:
+        for key in ['stream', 'input_stream']:
+            test_passed = test_passed and all(np.array_equal(trShared.data, trSep.data) and trShared.stats.starttime == trSep.stats.starttime
+                                              for trShared, trSep in zip(sharedBatch[site][key], separateBatch[site][key]))
+        # The input stream of each segment is a view of the data that was read once, the stream is its own copy
+        test_passed = test_passed and all(tr.data.base is not None for tr in sharedBatch[site]['input_stream'])
+        test_passed = test_passed and not any(np.shares_memory(trIn.data, tr.data) for trIn, tr in zip(sharedBatch[site]['input_stream'], sharedBatch[site]['stream']))
+
+    assert test_passed
+
+def test_batch_read_workers():
+    import pathlib
+    import tempfile
+    import warnings
+    import numpy as np
+    import pandas as pd
+
+    sampleDir = pathlib.Path(sprit.__file__).parent.joinpath('resources', 'sample_data')
+    batchDF = pd.read_csv(sampleDir.joinpath('Batch_SampleData.csv')).iloc[:4]
+    batchDF['input_data'] = [sampleDir.joinpath(f).as_posix() for f in batchDF['input_data']]
+    warningFilters = list(warnings.filters)
+    with tempfile.TemporaryDirectory() as tempDir:
+        batchCSV = pathlib.Path(tempDir).joinpath('batch.csv')
+        batchDF.to_csv(batchCSV, index=False)
+        serialBatch = sprit.batch_data_read(batchCSV, n_workers=1)
+        threadedBatch = sprit.batch_data_read(batchCSV, n_workers=4)
+        prefetchSites = list(sprit.batch_data_read(batchCSV, n_workers=2, prefetch_depth=2))
+
+    # Sites are read in the same order with the same data, whether they are read one at a time or concurrently
+    test_passed = list(serialBatch.keys()) == list(threadedBatch.keys()) == [site for site, _ in prefetchSites] == list(batchDF['site'])
+    for site, prefetchData in prefetchSites:
+        for siteData in [threadedBatch[site], prefetchData]:
+            test_passed = test_passed and siteData['ProcessingStatus']['OverallStatus']
+            test_passed = test_passed and len(siteData['stream']) == len(serialBatch[site]['stream'])
+            test_passed = test_passed and all(tr.stats == trSerial.stats and np.array_equal(np.ma.getmaskarray(tr.data), np.ma.getmaskarray(trSerial.data))
+                                              and np.array_equal(np.ma.filled(tr.data, np.nan), np.ma.filled(trSerial.data, np.nan), equal_nan=True)
+                                              for tr, trSerial in zip(siteData['stream'], serialBatch[site]['stream']))
+    # Reading sites in threads does not leave any warning filters changed
+    test_passed = test_passed and list(warnings.filters) == warningFilters
+
+    assert test_passed
+
+def test_stream_edited_windows():
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    hvsrData = sprit.fetch_data(sprit.input_params('sample1'))
+    hvsrData = sprit.remove_noise(hvsrData, remove_method=['noise', 'saturation', 'warmup'], noise_percent=0.5, sat_percent=0.4, warmup_time=20)
+
+    # Only the removed windows are kept by remove_noise(), and the PSDs are calculated without masking a copy of the stream
+    test_passed = isinstance(hvsrData['removed_windows'], sprit_hvsr.IntervalSet) and len(hvsrData['removed_windows']) > 0
+    test_passed = test_passed and 'stream_edited' in hvsrData.keys() and hvsrData._stream_edited is None
+    hvsrData = sprit.generate_psds(hvsrData)
+    test_passed = test_passed and hvsrData._stream_edited is None
+    test_passed = test_passed and not hvsrData['hvsr_windows_df']['Use'].all() and hvsrData['hvsr_windows_df']['Use'].any()
+
+    # The masked stream is created when it is used, with the removed windows masked in every trace (and its data copied from the stream)
+    streamEdited = hvsrData['stream_edited']
+    test_passed = test_passed and hvsrData['stream_edited'] is streamEdited
+    test_passed = test_passed and sprit_hvsr.IntervalSet.from_stream(streamEdited).to_list('timestamp') == hvsrData['removed_windows'].to_list('timestamp')
+    test_passed = test_passed and [(t0, t1) for t0, t1 in hvsrData['removed_windows']] == hvsrData['x_gaps_obspyDT']
+    for trEdit, tr in zip(streamEdited, hvsrData['stream']):
+        test_passed = test_passed and np.ma.is_masked(trEdit.data) and np.array_equal(np.ma.getdata(trEdit.data), tr.data)
+        test_passed = test_passed and not np.shares_memory(np.ma.getdata(trEdit.data), tr.data)
+
+    # Sites that have been released no longer have a stream_edited
+    hvsrData = sprit_hvsr._release_site_data(hvsrData)
+    test_passed = test_passed and 'stream_edited' not in hvsrData.keys()
+
+    assert test_passed
+
+def test_spectral_azimuth():
+    import copy
+    import numpy as np
+
+    hvData = sprit.fetch_data(sprit.input_params('sample'))
+    test_passed = True
+    for azKwargs in [{'azimuth_angle':45}, {'azimuth_angle':60}, {'azimuth_angle':37, 'azimuth_type':'single'}]:
+        spectralPSDs = sprit.generate_psds(sprit.calculate_azimuth(copy.deepcopy(hvData), azimuth_domain='spectral', **azKwargs))['ppsds']
+        timePSDs = sprit.generate_psds(sprit.calculate_azimuth(copy.deepcopy(hvData), azimuth_domain='time', **azKwargs))['ppsds']
+        test_passed = test_passed and sorted(spectralPSDs.keys()) == sorted(timePSDs.keys()) and len(timePSDs) > 3
+        for comp in timePSDs.keys():
+            test_passed = test_passed and np.allclose(spectralPSDs[comp]['psd_values'], timePSDs[comp]['psd_values'], rtol=0, atol=1e-8)
+
+    assert test_passed
+
+def test_psd_hvsr_band():
+    # The psds are calculated at the frequencies they are labelled with, so the peak does not move when hvsr_band is changed
+    peakFreqs = []
+    for hvsrBand in [[0.4, 40], [1, 30]]:
+        hvData = sprit.fetch_data(sprit.input_params('sample', hvsr_band=hvsrBand))
+        hvData = sprit.check_peaks(sprit.process_hvsr(sprit.generate_psds(sprit.remove_noise(hvData))))
+        peakFreqs.append(hvData['BestPeak']['HV']['f0'])
+    test_passed = abs(peakFreqs[1] - peakFreqs[0]) < 0.02 * peakFreqs[0]
+
+    assert test_passed
+
+def test_nearest_window_peaks():
+    import numpy as np
+    from sprit import sprit_hvsr
+
+    flattenPeaks = getattr(sprit_hvsr, '__flatten_window_peaks')
+    nearestPeaks = getattr(sprit_hvsr, '__nearest_window_peaks')
+
+    def brute_force_nearest(windowPeaks, targets):
+        # Nearest peak in each non-empty window; ties go to the peak that comes first in the window's list
+        nearest = [[min(wp, key=lambda p: abs(p - t)) for wp in windowPeaks if len(wp) > 0] for t in targets]
+        return np.array(nearest, dtype=np.int64).reshape(len(targets), -1)
+
+    rng = np.random.default_rng(46)
+    test_passed = True
+    for trial in range(50):
+        # Ragged, unsorted peak lists, with some empty windows and some repeated/tied peaks
+        windowPeaks = [list(rng.integers(0, 60, rng.integers(0, 6))) for _ in range(rng.integers(1, 15))]
+        targets = rng.integers(-5, 65, rng.integers(1, 8))
+        sortedPeaks, sortOrder, offsets = flattenPeaks(windowPeaks)
+        test_passed = test_passed and np.array_equal(np.diff(offsets), [len(wp) for wp in windowPeaks])
+        test_passed = test_passed and np.array_equal(np.concatenate([[]] + windowPeaks)[sortOrder], sortedPeaks)
+        test_passed = test_passed and np.array_equal(nearestPeaks(sortedPeaks, sortOrder, offsets, targets), brute_force_nearest(windowPeaks, targets))
+
+    # Ties at equal distance on either side go to the first peak in the list, not the lower index
+    windowPeaks = [[12, 8], [], [8, 12], [10]]
+    sortedPeaks, sortOrder, offsets = flattenPeaks(windowPeaks)
+    test_passed = test_passed and np.array_equal(nearestPeaks(sortedPeaks, sortOrder, offsets, [10]), [[12, 8, 10]])
+
+    # All windows empty
+    sortedPeaks, sortOrder, offsets = flattenPeaks([[], []])
+    test_passed = test_passed and nearestPeaks(sortedPeaks, sortOrder, offsets, [3, 4]).shape == (2, 0)
+
+    assert test_passed
+
+def test_bootstrap_peak_ci():
+    import copy
+    import numpy as np
+
+    hvData = sprit.fetch_data(sprit.input_params('sample'))
+    hvData = sprit.calculate_azimuth(hvData, azimuth_angle=90, azimuth_domain='spectral')
+    hvData = sprit.process_hvsr(sprit.generate_psds(hvData))
+
+    ciRuns = [sprit.check_peaks(copy.deepcopy(hvData), bootstrap_resamples=200, bootstrap_seed=seed)['BestPeak'] for seed in [47, 47]]
+    bestPeak = ciRuns[0]['HV']
+    f0CI = bestPeak['f0_CI']
+    a0CI = bestPeak['A0_CI']
+    test_passed = f0CI[0] <= bestPeak['f0'] <= f0CI[1] and a0CI[0] <= a0CI[1]
+    # Same seed gives the same intervals
+    test_passed = test_passed and f0CI == ciRuns[1]['HV']['f0_CI'] and a0CI == ciRuns[1]['HV']['A0_CI']
+    # Only the main H/V curve is bootstrapped by default
+    test_passed = test_passed and len(ciRuns[0]) > 1 and all('f0_CI' not in bp for azKey, bp in ciRuns[0].items() if azKey != 'HV')
+    allAzPeaks = sprit.check_peaks(copy.deepcopy(hvData), bootstrap_resamples=200, bootstrap_seed=47, bootstrap_azimuths=True)['BestPeak']
+    test_passed = test_passed and all('f0_CI' in bp for bp in allAzPeaks.values() if bp != {})
+    test_passed = test_passed and allAzPeaks['HV']['f0_CI'] == f0CI
+
+    assert test_passed
+
+def test_track_peaks():
+    import numpy as np
+    import pandas as pd
+
+    # Synthetic per-window peaks: one drifting peak, one steady peak with a missing window that jumps to a new frequency,
+    #   two close steady peaks, an isolated peak, and a low-amplitude peak (which should not be tracked)
+    nWindows = 40
+    freqs = np.logspace(np.log10(20), np.log10(0.5), 200)
+    windowTimes = pd.date_range('2024-01-01', periods=nWindows, freq='60s')
+    expectedTracks = {'drift': [(w, 60+w) for w in range(nWindows)],
+                      'steady': [(w, 150) for w in range(20) if w != 10],
+                      'jump': [(w, 180) for w in range(20, nWindows)],
+                      'close1': [(w, 120) for w in range(nWindows)],
+                      'close2': [(w, 124) for w in range(nWindows)]}
+    windowPeaks = [[] for w in range(nWindows)]
+    curves = np.full((nWindows, freqs.shape[0]), 0.8)
+    for trackName, trackPeaks in expectedTracks.items():
+        for w, peakInd in trackPeaks:
+            windowPeaks[w].append(peakInd)
+            curves[w, peakInd] = 3 if trackName == 'drift' else 2
+    windowPeaks[30].append(5) # Isolated peak, shorter than min_track_length
+    curves[30, 5] = 2
+    for w in range(nWindows): # Low amplitude peak in every window
+        windowPeaks[w].insert(0, 100)
+
+    hvsrDF = pd.DataFrame({'Use': True, 'HV_Curves': list(curves), 'CurvesPeakIndices_HV': windowPeaks}, index=windowTimes)
+    hvData = sprit.HVSRData({'hvsr_windows_df': hvsrDF, 'x_freqs': {'Z': freqs}, 'site': 'SyntheticSite',
+                            'ProcessingStatus': {'OverallStatus': True}})
+    hvData = sprit.track_peaks(hvData, max_freq_change=0.1, max_gap=2, min_track_length=3, min_peak_amp=1, peak_freq_range=[0.4, 40])
+
+    peakTracks = hvData['peak_tracks']['HV']
+    trackStats = hvData['peak_track_stats']['HV']
+    offsets = peakTracks['track_offsets']
+    foundTracks = [list(zip(peakTracks['window_index'][offsets[i]:offsets[i+1]].tolist(), 
+                            np.searchsorted(-freqs, -peakTracks['frequency'][offsets[i]:offsets[i+1]]).tolist())) 
+                   for i in range(offsets.shape[0]-1)]
+    test_passed = sorted(foundTracks) == sorted(expectedTracks.values()) and trackStats.shape[0] == len(expectedTracks)
+
+    # Tracks are numbered in order of their first time window
+    test_passed = test_passed and np.all(np.diff(peakTracks['window_index'][offsets[:-1]]) >= 0)
+
+    for i, trackPeaks in enumerate(foundTracks):
+        trackWins = np.array([w for w, _ in trackPeaks])
+        trackFreqs = freqs[[peakInd for _, peakInd in trackPeaks]]
+        trackHours = (windowTimes[trackWins] - windowTimes[0]).total_seconds() / 3600
+        stats = trackStats.iloc[i]
+        test_passed = test_passed and stats['NumWindows'] == len(trackPeaks) and stats['StartTime'] == windowTimes[trackWins[0]]
+        test_passed = test_passed and np.isclose(stats['Coverage'], len(trackPeaks) / (trackWins[-1] - trackWins[0] + 1))
+        test_passed = test_passed and np.isclose(stats['f0_Median'], np.median(trackFreqs)) and np.isclose(stats['f0_StDev'], np.std(trackFreqs))
+        test_passed = test_passed and np.isclose(stats['A0_Median'], 3 if trackPeaks == expectedTracks['drift'] else 2)
+        test_passed = test_passed and np.isclose(stats['f0_Drift_Hz_per_hr'], np.polyfit(trackHours, trackFreqs, 1)[0], atol=1e-9)
+
+    assert test_passed
+
+def test_outlier_curves():
+    import numpy as np
+    import pandas as pd
+    from sprit import sprit_hvsr, sprit_plot
+
+    rng = np.random.default_rng(49)
+    nWindows = 50
+    freqs = np.logspace(np.log10(40), np.log10(0.4), 100)
+    baseCurve = np.sin(np.linspace(0, 3, freqs.shape[0]))
+
+    # One planted outlier window for each component
+    curveStack = baseCurve + rng.normal(0, 0.1, (nWindows, 3, freqs.shape[0]))
+    plantedWindows = [7, 21, 40]
+    for comp, win in enumerate(plantedWindows):
+        curveStack[win, comp] += 5
+    expectedKeep = np.ones(nWindows, dtype=bool)
+    expectedKeep[plantedWindows] = False
+
+    test_passed = True
+    for outlierMethod, absThresh in [('rmse', 1), ('mad', 3)]:
+        for thresh, usePercentile in [(98, True), (absThresh, False)]:
+            keepWindows, scores, thresholds, medCurves = sprit_hvsr._outlier_curve_scores(curveStack, rmse_thresh=thresh, use_percentile=usePercentile, 
+                                                                                          outlier_method=outlierMethod)
+            test_passed = test_passed and np.array_equal(keepWindows, expectedKeep) and scores.shape == (nWindows, 3) and medCurves.shape == (3, freqs.shape[0])
+            test_passed = test_passed and all(np.argmax(scores[:, comp]) == win for comp, win in enumerate(plantedWindows))
+
+    # Only the second iteration (with the median curve of the kept windows) removes the borderline window
+    iterStack = np.zeros((20, 1, 10))
+    iterStack[10] = 0.9
+    iterStack[11:] = 10
+    keepOnce = sprit_hvsr._outlier_curve_scores(iterStack, rmse_thresh=0.6, use_percentile=False, n_iterations=1)[0]
+    keepIter = sprit_hvsr._outlier_curve_scores(iterStack, rmse_thresh=0.6, use_percentile=False, n_iterations=3)[0]
+    test_passed = test_passed and np.count_nonzero(~keepOnce) == 9 and keepOnce[10]
+    test_passed = test_passed and np.count_nonzero(~keepIter) == 10 and not keepIter[10]
+
+    # remove_outlier_curves() and plot_outlier_curves() on HVSRData, with an azimuth curve
+    def make_hvsr_data():
+        hvCurves = baseCurve + 2 + rng.normal(0, 0.1, (2, nWindows, freqs.shape[0]))
+        hvCurves[0, 3] += 5
+        hvCurves[1, 12] += 5
+        psdCurves = baseCurve - 150 + rng.normal(0, 0.1, (4, nWindows, freqs.shape[0]))
+        for comp, win in enumerate([5, 9, 15, 30]):
+            psdCurves[comp, win] += 5
+        windowTimes = pd.date_range('2024-01-01', periods=nWindows, freq='30s')
+        hvsrDF = pd.DataFrame({'Use': True, 'HV_Curves': list(hvCurves[0]), 'HV_Curves_R045': list(hvCurves[1])}, index=windowTimes)
+        for comp, compName in enumerate(['Z', 'E', 'N', 'R045']):
+            hvsrDF['psd_values_'+compName] = list(psdCurves[comp])
+        return sprit.HVSRData({'hvsr_windows_df': hvsrDF, 'x_freqs': {k: freqs for k in ['Z', 'E', 'N', 'R045']}, 'site': 'SyntheticSite', 'batch': False,
+                               'ProcessingStatus': {'OverallStatus': True, 'PPSDStatus': True}})
+
+    for useHVCurve, expectedRemoved in [(True, [3, 12]), (False, [5, 9, 15, 30])]:
+        for outlierMethod, nIterations in [('rmse', 1), ('mad', 2)]:
+            outlierKwargs = {'rmse_thresh':98, 'use_percentile':True, 'use_hv_curve':useHVCurve, 'outlier_method':outlierMethod, 'n_iterations':nIterations}
+            hvData = make_hvsr_data()
+            outlierFig = sprit_plot.plot_outlier_curves(hvData, show_plot=False, **outlierKwargs)
+            hvData = sprit.remove_outlier_curves(hvData, plot_engine=None, **outlierKwargs)
+            removed = np.flatnonzero(~hvData['hvsr_windows_df']['Use'].to_numpy())
+            test_passed = test_passed and removed.tolist() == expectedRemoved
+            test_passed = test_passed and outlierFig.layout.annotations[-1].text == f"{len(removed)}/{nWindows} outlier windows removed"
+            scorePrefix = 'RMSE_' if outlierMethod == 'rmse' else 'MADScore_'
+            scoreCols = ['HV_Curves', 'HV_Curves_R045'] if useHVCurve else ['psd_values_'+c for c in ['Z', 'E', 'N', 'R045']]
+            test_passed = test_passed and all(scorePrefix+col in hvData['hvsr_windows_df'].columns for col in scoreCols)
+
+    assert test_passed
+
+def test_remove_noise_workers():
+    import copy
+    import numpy as np
+    import obspy
+
+    # Synthetic data with a large burst (removed by the antitrigger) and a plateau (saturation threshold depends on whether the burst was removed first)
+    rng = np.random.default_rng(26)
+    stream = obspy.Stream()
+    for comp in 'ZEN':
+        data = rng.normal(0, 1, 60000)
+        data[30000:30500] = 200 + rng.normal(0, 1, 500)
+        data[45000:45300] = 20 + rng.normal(0, 0.01, 300)
+        stream.append(obspy.Trace(data, header={'channel':f'EH{comp}', 'starttime':obspy.UTCDateTime(2024, 1, 1), 'sampling_rate':100}))
+    synthData = sprit.HVSRData({'stream':stream, 'input_stream':stream.copy(), 'site':'SyntheticSite', 'batch':False,
+                                'ProcessingStatus':{'OverallStatus':True}})
+    sampleData = sprit.fetch_data(sprit.input_params('sample'))
+
+    test_passed = True
+    for hvData, noiseKwargs in [(synthData, {'sat_percent':0.09, 'noise_percent':0.99}),
+                                (sampleData, {'stalta_thresh':[1, 3], 'noise_percent':0.5}),
+                                (sampleData, {'stalta_thresh':[2, 4], 'noise_percent':0.3, 'sat_percent':0.4, 'warmup_time':10, 'cooldown_time':20})]:
+        editedStreams = [sprit.remove_noise(copy.deepcopy(hvData), remove_method='auto', n_workers=nWorkers, **noiseKwargs)['stream_edited'] for nWorkers in [1, 4]]
+        serialMasks = [np.ma.getmaskarray(tr.data) for tr in editedStreams[0]]
+        threadedMasks = [np.ma.getmaskarray(tr.data) for tr in editedStreams[1]]
+        test_passed = test_passed and len(serialMasks) == len(threadedMasks) and any(m.any() for m in serialMasks)
+        test_passed = test_passed and all(np.array_equal(sm, tm) for sm, tm in zip(serialMasks, threadedMasks))
+
+    assert test_passed
@@ -36,8 +36,10 @@
     remove_outlier_curves,
     check_peaks,
     get_report,
+    track_peaks,
     HVSRData,
     HVSRBatch,
+    RSArchiveCatalog,
 )
 
 from sprit.sprit_utils import(
@@ -98,8 +100,10 @@
             'remove_outlier_curves',
             'check_peaks',
             'get_report',
+            'track_peaks',
             'HVSRData',
             'HVSRBatch',
+            'RSArchiveCatalog',
         'sprit_utils',
             'assert_check',
             'check_gui_requirements',
@@ -6,20 +6,23 @@
 See documentation for individual functions for more information.
 """
 import base64
+import collections
+import concurrent.futures
+import contextlib
 import copy
 import datetime
+import hashlib
 import inspect
 import io
 import json
 import math
-import operator
 import os
 import pathlib
 import pickle
 import pkg_resources
-import struct
 import sys
 import tempfile
+import threading
 import traceback
 import warnings
 import xml.etree.ElementTree as ET
@@ -32,6 +35,8 @@
 import numpy as np
 import obspy
 from obspy.signal import PPSD
+from obspy.core.compatibility import round_away
+from obspy.io.mseed.util import get_record_information
 import pandas as pd
 import plotly
 from pyproj import CRS, Transformer
@@ -42,17 +47,39 @@
     from sprit import sprit_tkinter_ui
     from sprit import sprit_jupyter_UI
     from sprit import sprit_plot
+    from sprit import sprit_jit
 except Exception:  # For testing
     import sprit_utils
     import sprit_tkinter_ui
     import sprit_jupyter_UI
     import sprit_plot
+    import sprit_jit
 
 # Constants, etc
 NOWTIME = datetime.datetime.now()
 DEFAULT_PLOT_STR = "HVSR p ann COMP+ p ann SPEC p ann"
 OBSPY_FORMATS = ['AH', 'ALSEP_PSE', 'ALSEP_WTH', 'ALSEP_WTN', 'CSS', 'DMX', 'GCF', 'GSE1', 'GSE2', 'KINEMETRICS_EVT', 'KNET', 'MSEED', 'NNSA_KB_CORE', 'PDAS', 'PICKLE', 'Q', 'REFTEK130', 'RG16', 'SAC', 'SACXY', 'SEG2', 'SEGY', 'SEISAN', 'SH_ASC', 'SLIST', 'SU', 'TSPAIR', 'WAV', 'WIN', 'Y']
 
+# Cache of miniseed record indices (see _get_mseed_record_index())
+MSEED_RECORD_INDEX_CACHE = {}
+MSEED_RECORD_INDEX_CACHE_SIZE = 64
+MSEED_RECORD_INDEX_LOCK = threading.Lock()
+
+# Catalogs of Raspberry Shake archive directories that have already been read (see RSArchiveCatalog)
+RS_CATALOGS = {}
+RS_CATALOGS_LOCK = threading.Lock()
+
+# Directory where catalogs of archive directories are saved (a user cache directory, so nothing is written to the archives themselves)
+if sys.platform.startswith('win'):
+    RS_CATALOG_DIR = pathlib.Path(os.environ.get('LOCALAPPDATA', pathlib.Path.home())).joinpath('sprit', 'Cache', 'rs_catalogs')
+elif sys.platform == 'darwin':
+    RS_CATALOG_DIR = pathlib.Path.home().joinpath('Library', 'Caches', 'sprit', 'rs_catalogs')
+else:
+    RS_CATALOG_DIR = pathlib.Path(os.environ.get('XDG_CACHE_HOME', pathlib.Path.home().joinpath('.cache'))).joinpath('sprit', 'rs_catalogs')
+
+# Maximum number of inventories kept in memory by INVENTORY_CACHE (see InventoryCache)
+INVENTORY_CACHE_SIZE = 32
+
 # Resources directory path, and the other paths as well
 RESOURCE_DIR = pathlib.Path(pkg_resources.resource_filename(__name__, 'resources/'))
 SAMPLE_DATA_DIR = RESOURCE_DIR.joinpath('sample_data')
@@ -348,6 +375,16 @@ def __setitem__(self, key, value):
     def __getitem__(self, key):
         return getattr(self, key)
 
+    def __getstate__(self):
+        # The component matrix and azimuth grid can be rebuilt from the stream and hvsr_az, so they are not pickled/copied
+        state = self.__dict__.copy()
+        state.pop('_component_matrix', None)
+        state.pop('_azimuth_grid', None)
+        # The outlier plot can be rebuilt from the outlier plot data (if it exists)
+        if state.get('_outlier_plot_data', None) is not None:
+            state.pop('_outlier_plot', None)
+        return state
+
     def __to_json(self, filepath):
         """Not yet supported, will export HVSRData object to json"""
         # open the file with the given filepath
@@ -391,6 +428,9 @@ def keys(self):
         for k in dir(self):
             if not k.startswith('_'):
                 keyList.append(k)
+        # stream_edited is a property, but it is only a key once remove_noise() (or something else) has set it
+        if getattr(self, '_stream_edited', None) is None and getattr(self, '_stream_edited_source', None) is None:
+            keyList.remove('stream_edited')
         return keyList
 
     def items(self):
@@ -574,6 +614,1515 @@ def ppsds(self, value):
             raise ValueError("ppsds dict with infomration from osbpy.PPSD (created by sprit.generate_psds())")                  
         self._ppsds=value
 
+    #Cache of sta/lta characteristic functions (dynamic)
+    @property
+    def stalta_cache(self):
+        """Cache of the sta/lta characteristic functions calculated by remove_noise() for the antitrigger method. 
+        
+        This allows remove_noise() to be run again with different stalta_thresh values (e.g., in the GUIs) without recalculating the characteristic functions.
+        Entries that no longer match the data in the stream are discarded automatically.
+
+        Returns
+        -------
+        STALTACache
+            STALTACache object (created the first time this is accessed)
+        """
+        if getattr(self, '_stalta_cache', None) is None:
+            self._stalta_cache = STALTACache()
+        return self._stalta_cache
+
+    @stalta_cache.setter
+    def stalta_cache(self, value):
+        if value is not None and not isinstance(value, STALTACache):
+            raise ValueError("stalta_cache must be a STALTACache object or None")
+        self._stalta_cache = value
+
+    #Stream with the data removed by remove_noise() masked (dynamic)
+    @property
+    def stream_edited(self):
+        """Copy of the stream with masked arrays where data has been removed by remove_noise().
+
+        remove_noise() only keeps the windows it removes (see removed_windows), so the masked copy of the stream is created the first time this is accessed 
+        (e.g., when it is plotted or exported) rather than each time remove_noise() is run.
+
+        Returns
+        -------
+        obspy.Stream
+            Obspy stream with masked arrays where data has been removed
+        """
+        if getattr(self, '_stream_edited', None) is None:
+            editSource = getattr(self, '_stream_edited_source', None)
+            if editSource is None:
+                raise AttributeError("'HVSRData' object has no attribute 'stream_edited'")
+            sourceStream, removeWindows = editSource
+            self._stream_edited = removeWindows.apply(sourceStream)
+            self._stream_edited_source = None
+        return self._stream_edited
+
+    @stream_edited.setter
+    def stream_edited(self, value):
+        self._stream_edited = value
+        self._stream_edited_source = None
+
+    @stream_edited.deleter
+    def stream_edited(self):
+        self._stream_edited = None
+        self._stream_edited_source = None
+
+    def _set_stream_edited_windows(self, stream, remove_windows):
+        """Sets stream_edited as stream with remove_windows (IntervalSet) masked, without masking a copy of stream until stream_edited is accessed"""
+        self._stream_edited = None
+        self._stream_edited_source = (stream, remove_windows)
+
+    #Aligned array of the data in the stream (dynamic)
+    @property
+    def component_matrix(self):
+        """Aligned (traces x samples) array of the data in the stream, with a shared time base and a mask for each trace. 
+        
+        This is used by the functions that need the data of each component (e.g., calculate_azimuth(), generate_psds(), process_hvsr()) instead of selecting and merging the stream each time.
+        It is created the first time it is accessed and rebuilt only when the traces in the stream change. It is not saved when the HVSRData object is exported or copied.
+
+        Returns
+        -------
+        ComponentMatrix or None
+            ComponentMatrix object of the stream (None if there is no stream)
+        """
+        stream = getattr(self, 'stream', None)
+        if not isinstance(stream, obspy.Stream) or len(stream) == 0:
+            return None
+        compMatrix = getattr(self, '_component_matrix', None)
+        if compMatrix is None or not compMatrix.matches(stream):
+            compMatrix = self._component_matrix = ComponentMatrix(stream)
+        return compMatrix
+
+    @component_matrix.setter
+    def component_matrix(self, value):
+        if value is not None and not isinstance(value, ComponentMatrix):
+            raise ValueError("component_matrix must be a ComponentMatrix object or None")
+        self._component_matrix = value
+
+    #Polar grid of the azimuthal H/V curves (dynamic)
+    @property
+    def azimuth_grid(self):
+        """Polar (azimuth x frequency) grid of the azimuthal H/V curves in hvsr_az, mirrored to 0-360 degrees, with its interpolated meshes.
+
+        This is used by plot_azimuth() (and the azimuth plot of get_report()) so the grid and interpolated meshes are only calculated once.
+        It is created the first time it is accessed and rebuilt only when hvsr_az changes. It is not saved when the HVSRData object is exported or copied.
+
+        Returns
+        -------
+        AzimuthPolarGrid or None
+            AzimuthPolarGrid object of hvsr_az (None if there are no azimuthal H/V curves)
+        """
+        hvsr_az = getattr(self, 'hvsr_az', None)
+        if not isinstance(hvsr_az, dict) or len(hvsr_az) == 0:
+            return None
+        azGrid = getattr(self, '_azimuth_grid', None)
+        if azGrid is None or not azGrid.matches(hvsr_az):
+            # The H/V curves have one less point than x_freqs (each point is between two frequencies)
+            curveLength = len(next(iter(hvsr_az.values())))
+            freqs = np.asarray(self.x_freqs['Z'])
+            azGrid = self._azimuth_grid = AzimuthPolarGrid(hvsr_az, freqs[freqs.size - curveLength:])
+        return azGrid
+
+    @azimuth_grid.setter
+    def azimuth_grid(self, value):
+        if value is not None and not isinstance(value, AzimuthPolarGrid):
+            raise ValueError("azimuth_grid must be an AzimuthPolarGrid object or None")
+        self._azimuth_grid = value
+
+    #Outlier curve plot from remove_outlier_curves() (dynamic)
+    @property
+    def OutlierPlot(self):
+        """Figure showing the curves removed by remove_outlier_curves() (matplotlib or plotly, depending on its plot_engine parameter).
+
+        The figure is created the first time it is accessed (or by remove_outlier_curves(), if show_plot=True), 
+        so it is not drawn if it is never used. It is not saved when the HVSRData object is exported or copied.
+
+        Returns
+        -------
+        matplotlib.figure.Figure, plotly.graph_objs.Figure, or None
+            Outlier curve figure (None if remove_outlier_curves() has not been run with a plot_engine)
+        """
+        outlierPlot = getattr(self, '_outlier_plot', None)
+        plotData = getattr(self, '_outlier_plot_data', None)
+        if outlierPlot is None and plotData is not None:
+            outlierPlot = self._outlier_plot = _build_outlier_plot(self, plotData)
+        elif outlierPlot is None:
+            # Data exported before the outlier plot was created when accessed
+            outlierPlot = self.__dict__.get('OutlierPlot', None)
+        return outlierPlot
+
+    @OutlierPlot.setter
+    def OutlierPlot(self, value):
+        self._outlier_plot = value
+
+
+# Class for caching sta/lta characteristic functions
+class STALTACache:
+    """STALTACache stores the sta/lta characteristic functions calculated for the antitrigger noise removal method.
+
+    Characteristic functions are stored using the trace identity (id, start time, sampling rate, number of samples, and the data array object and its mask) and the sta and lta values.
+    As with ComponentMatrix.matches(), the data array objects are compared (rather than the data itself), since sprit replaces the data of a trace rather than editing it in place.
+    Use clear() if the data of a trace has been changed in place.
+    Since only the trigger thresholds are needed after the characteristic function is calculated, 
+    changing only stalta_thresh does not require the characteristic functions to be recalculated.
+    The cache can be used from several threads at once.
+    """
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def trace_key(trace):
+        """Get a key that identifies the data in an obspy Trace
+
+        Parameters
+        ----------
+        trace : obspy.Trace
+            Trace to identify
+
+        Returns
+        -------
+        tuple
+            Tuple with the trace id, start time, sampling rate, number of samples, 
+            and the identity, shape, and dtype of the data array (and the identity of its mask)
+        """
+        data = np.ma.getdata(trace.data)
+        return (trace.id, str(trace.stats.starttime), float(trace.stats.sampling_rate), int(trace.stats.npts), 
+                id(data), data.shape, data.dtype.str, id(np.ma.getmask(trace.data)))
+
+    @staticmethod
+    def _trace_source(trace):
+        """Data array and mask objects of a trace, stored with each entry so the ids in its key stay valid"""
+        return (np.ma.getdata(trace.data), np.ma.getmask(trace.data))
+
+    def get(self, trace, sta, lta, calc_fun):
+        """Get the characteristic function for a trace, calculating (and storing) it using calc_fun if it has not already been calculated
+
+        Parameters
+        ----------
+        trace : obspy.Trace
+            Trace for which to get the characteristic function
+        sta : float
+            Short term average window (in seconds)
+        lta : float
+            Long term average window (in seconds)
+        calc_fun : function
+            Function that takes the trace as its only argument and returns the characteristic function
+
+        Returns
+        -------
+        numpy.ndarray
+            Characteristic function of trace
+        """
+        key = (self.trace_key(trace), float(sta), float(lta))
+        source = self._trace_source(trace)
+        with self._lock:
+            entry = self._cache.get(key, None)
+            if entry is not None and all([entryItem is srcItem for entryItem, srcItem in zip(entry[0], source)]):
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Calculated outside of the lock, so the characteristic functions of different traces can be calculated at the same time
+        cft = calc_fun(trace)
+        with self._lock:
+            self._cache[key] = (source, cft)
+        return cft
+
+    def prune(self, stream):
+        """Remove all entries that do not correspond to the data currently in stream. 
+        This is called by remove_noise() so that the cache does not keep growing as the data changes.
+
+        Parameters
+        ----------
+        stream : obspy.Stream
+            Stream with the data that should be kept in the cache
+        """
+        currentKeys = set([self.trace_key(tr) for tr in stream])
+        with self._lock:
+            for key in list(self._cache.keys()):
+                if key[0] not in currentKeys:
+                    del self._cache[key]
+
+    def clear(self):
+        """Remove all entries from the cache"""
+        with self._lock:
+            self._cache = {}
+
+    @property
+    def nbytes(self):
+        """Total memory (in bytes) used by the characteristic functions stored in the cache"""
+        with self._lock:
+            return int(sum([entry[1].nbytes for entry in self._cache.values()]))
+
+    def __getstate__(self):
+        # Entries are identified by the ids of data arrays, which do not match anything in a copy (or unpickled object), so only the counts are kept
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.hits = state['hits']
+        self.misses = state['misses']
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return f"STALTACache({len(self)} characteristic functions, {self.nbytes/1e6:.2f} MB, {self.hits} hits, {self.misses} misses)"
+
+
+# Class for caching instrument response inventories
+class InventoryCache:
+    """InventoryCache stores inventories (and information derived from them, such as paz dictionaries) read from metadata files, 
+    so that each metadata file only needs to be parsed once per session (e.g., for all the sites of a batch that use the same instrument response file).
+
+    Entries are identified by the resolved filepath, the modification time and size of the file (so entries are not used once a file is changed), 
+    and a dictionary of overrides (e.g., the station code and coordinates used to edit the inventory for a site).
+    The least recently used entries are removed once there are more than maxsize entries.
+    Copies of the stored objects are returned, so they can be changed without affecting the cache.
+    The module-level instance INVENTORY_CACHE is used by get_metadata().
+    """
+    def __init__(self, maxsize=INVENTORY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_key(filepath):
+        """Get a key that identifies a version of a file
+
+        Parameters
+        ----------
+        filepath : str or pathlib.Path
+            Path to file
+
+        Returns
+        -------
+        tuple
+            Tuple with the resolved filepath, modification time (in nanoseconds) and size (in bytes) of the file
+        """
+        filepath = pathlib.Path(filepath).resolve()
+        fileStat = filepath.stat()
+        return (filepath.as_posix(), fileStat.st_mtime_ns, fileStat.st_size)
+
+    def get(self, filepath, read_fun, overrides=None, copy_result=True):
+        """Get the object read from filepath (with overrides), reading it using read_fun if it is not already in the cache
+
+        Parameters
+        ----------
+        filepath : str or pathlib.Path
+            Path to metadata file
+        read_fun : function
+            Function that takes filepath as its only argument and returns the object to store (only called if the entry is not in the cache)
+        overrides : dict or None, optional
+            Values that were used to create the object (in addition to the file itself). Must be hashable once converted to strings, by default None
+        copy_result : bool, optional
+            Whether to return a (deep) copy of the cached object, by default True. 
+            Only set to False if the returned object will not be changed.
+
+        Returns
+        -------
+        object
+            Object returned by read_fun (or a copy of it)
+        """
+        if overrides is None:
+            overrideKey = None
+        else:
+            overrideKey = tuple(sorted([(str(k), str(v)) for k, v in overrides.items()]))
+        key = self.file_key(filepath) + (overrideKey,)
+
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                value = self._cache[key]
+            else:
+                self.misses += 1
+                value = read_fun(filepath)
+                self._cache[key] = value
+                while len(self._cache) > max(int(self.maxsize), 1):
+                    self._cache.popitem(last=False)
+
+        if copy_result:
+            return copy.deepcopy(value)
+        return value
+
+    def clear(self):
+        """Remove all entries from the cache (and reset the hit statistics)"""
+        with self._lock:
+            self._cache = collections.OrderedDict()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self):
+        """Dictionary with the number of hits, misses, and entries in the cache"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def __repr__(self):
+        return f"InventoryCache({len(self)}/{self.maxsize} entries, {self.hits} hits, {self.misses} misses)"
+
+
+# Inventories used by get_metadata()
+INVENTORY_CACHE = InventoryCache()
+
+
+# Class for sets of time windows
+class IntervalSet:
+    """IntervalSet is a sorted set of non-overlapping [start, end] time intervals.
+
+    It is used to represent the windows of data to remove from (or keep for) analysis, 
+    whether they come from manual window selection, the processing_window parameter, or one of the noise removal methods.
+    Intervals are stored as two numpy arrays of timestamps (seconds since 1970-01-01, UTC), 
+    so combining sets of windows and applying them to data is done with array operations rather than repeated stream trimming and merging.
+
+    Intervals are closed: samples at the start and end times of an interval are considered to be inside it.
+    """
+    def __init__(self, intervals=None, time_type='utc'):
+        """IntervalSet initializer
+
+        Parameters
+        ----------
+        intervals : list, numpy.ndarray, or None, optional
+            List of two-item lists [start, end] with start and end times of each interval (in any order, overlapping intervals are merged), by default None (empty IntervalSet)
+        time_type : str, {'utc', 'matplotlib', 'timestamp'}, optional
+            Format of the times in intervals. 'utc' can be obspy.UTCDateTime objects, datetime.datetime objects, or anything else that can be read by obspy.UTCDateTime(),
+            'matplotlib' is matplotlib dates (days since epoch), and 'timestamp' is seconds since 1970-01-01 (UTC), by default 'utc'
+        """
+        if intervals is None or len(intervals) == 0:
+            intArr = np.empty((0, 2), dtype=float)
+        elif time_type.lower() in ['timestamp', 'ts', 't']:
+            intArr = np.asarray(intervals, dtype=float).reshape(-1, 2)
+        elif time_type.lower() in ['matplotlib', 'mpl', 'm']:
+            intArr = (np.asarray(intervals, dtype=float).reshape(-1, 2) - mdates.date2num(datetime.datetime(1970, 1, 1))) * 86400
+        else:
+            intArr = np.array([[obspy.UTCDateTime(win[0]).timestamp, obspy.UTCDateTime(win[1]).timestamp] for win in intervals], dtype=float).reshape(-1, 2)
+
+        self.starts, self.ends = self._merge(intArr[:, 0], intArr[:, 1])
+
+    @staticmethod
+    def _merge(starts, ends):
+        """Sorts intervals and merges any that overlap (or touch)"""
+        starts = np.asarray(starts, dtype=float)
+        ends = np.asarray(ends, dtype=float)
+        keep = ends >= starts
+        starts = starts[keep]
+        ends = ends[keep]
+        if starts.size == 0:
+            return starts, ends
+        
+        order = np.argsort(starts, kind='stable')
+        starts = starts[order]
+        ends = ends[order]
+        
+        # A new interval starts wherever its start is after the latest end of all intervals before it
+        runningEnd = np.maximum.accumulate(ends)
+        newGroup = np.ones(starts.size, dtype=bool)
+        newGroup[1:] = starts[1:] > runningEnd[:-1]
+        groupStartInds = np.flatnonzero(newGroup)
+        return starts[groupStartInds], np.maximum.reduceat(ends, groupStartInds)
+
+    @staticmethod
+    def _mask_runs(mask):
+        """Gets the first and last index of each run of True values in a boolean array"""
+        mask = np.asarray(mask, dtype=bool)
+        edges = np.diff(np.concatenate([[0], mask.view(np.int8), [0]]))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+    @classmethod
+    def from_mask(cls, mask, starttime, delta):
+        """Create IntervalSet from a boolean array with one value per sample
+
+        Parameters
+        ----------
+        mask : numpy.ndarray or SampleMask
+            Boolean array (or SampleMask) that is True for samples that should be included in the IntervalSet
+        starttime : obspy.UTCDateTime
+            Time of the first sample
+        delta : float
+            Time between samples (in seconds)
+
+        Returns
+        -------
+        IntervalSet
+        """
+        if isinstance(mask, SampleMask):
+            runStarts, runEnds = mask.runs()
+        else:
+            runStarts, runEnds = cls._mask_runs(mask)
+        t0 = obspy.UTCDateTime(starttime).timestamp
+        return cls(np.column_stack([t0 + runStarts*delta, t0 + runEnds*delta]), time_type='timestamp')
+
+    @classmethod
+    def from_stream(cls, stream, intervals=None):
+        """Create IntervalSet from the masked (removed) samples of all the traces in an obspy.Stream
+
+        Parameters
+        ----------
+        stream : obspy.Stream
+            Stream with masked arrays where data has been removed
+        intervals : IntervalSet or None, optional
+            If specified, the samples within these intervals are also included (snapped to the samples of each trace), 
+            the same as IntervalSet.from_stream(intervals.apply(stream)), but without creating a masked copy of the stream, by default None
+
+        Returns
+        -------
+        IntervalSet
+        """
+        out = cls()
+        for tr in stream:
+            trMask = SampleMask.from_array(tr.data)
+            if intervals is not None and len(intervals) > 0:
+                trMask = trMask | intervals.to_sample_mask(tr.stats.starttime, tr.stats.npts, tr.stats.delta)
+            if trMask.any():
+                out = out | cls.from_mask(trMask, tr.stats.starttime, tr.stats.delta)
+        return out
+
+    def union(self, *others):
+        """Union of this IntervalSet with one or more others"""
+        starts = np.concatenate([self.starts] + [o.starts for o in others])
+        ends = np.concatenate([self.ends] + [o.ends for o in others])
+        return IntervalSet(np.column_stack([starts, ends]), time_type='timestamp')
+
+    def complement(self, starttime, endtime):
+        """Intervals between starttime and endtime that are not in this IntervalSet
+
+        Parameters
+        ----------
+        starttime : obspy.UTCDateTime
+            Start of the time range
+        endtime : obspy.UTCDateTime
+            End of the time range
+
+        Returns
+        -------
+        IntervalSet
+        """
+        t0 = obspy.UTCDateTime(starttime).timestamp
+        t1 = obspy.UTCDateTime(endtime).timestamp
+        clipped = self.intersection(IntervalSet([[t0, t1]], time_type='timestamp'))
+        compStarts = np.concatenate([[t0], clipped.ends])
+        compEnds = np.concatenate([clipped.starts, [t1]])
+        keep = compEnds > compStarts
+        return IntervalSet(np.column_stack([compStarts[keep], compEnds[keep]]), time_type='timestamp')
+
+    def intersection(self, other):
+        """Intersection of this IntervalSet with another"""
+        if len(self) == 0 or len(other) == 0:
+            return IntervalSet()
+        # For each interval in self, find the intervals of other that could overlap it, then clip
+        firstInd = np.searchsorted(other.ends, self.starts, side='left')
+        lastInd = np.searchsorted(other.starts, self.ends, side='right')
+        nPerInterval = np.clip(lastInd - firstInd, 0, None)
+        selfInd = np.repeat(np.arange(len(self)), nPerInterval)
+        otherInd = np.repeat(firstInd, nPerInterval) + (np.arange(nPerInterval.sum()) - np.repeat(np.cumsum(nPerInterval) - nPerInterval, nPerInterval))
+        starts = np.maximum(self.starts[selfInd], other.starts[otherInd])
+        ends = np.minimum(self.ends[selfInd], other.ends[otherInd])
+        return IntervalSet(np.column_stack([starts, ends]), time_type='timestamp')
+
+    def overlaps(self, starttimes, endtimes):
+        """Checks whether each [start, end] window overlaps with any interval in the IntervalSet
+
+        Parameters
+        ----------
+        starttimes : array-like
+            Start times of windows (obspy.UTCDateTime objects or timestamps)
+        endtimes : array-like
+            End times of windows (obspy.UTCDateTime objects or timestamps)
+
+        Returns
+        -------
+        numpy.ndarray
+            Boolean array that is True for windows that overlap any interval
+        """
+        starttimes = np.array([float(t) for t in starttimes], dtype=float)
+        endtimes = np.array([float(t) for t in endtimes], dtype=float)
+        if len(self) == 0:
+            return np.zeros(starttimes.shape, dtype=bool)
+        # Last interval that starts before the end of each window
+        lastInd = np.searchsorted(self.starts, endtimes, side='right') - 1
+        return (lastInd >= 0) & (self.ends[np.clip(lastInd, 0, None)] >= starttimes)
+
+    def sample_mask(self, starttime, npts, delta):
+        """Get boolean array (one value per sample) that is True for samples within the IntervalSet
+
+        Parameters
+        ----------
+        starttime : obspy.UTCDateTime
+            Time of first sample
+        npts : int
+            Number of samples
+        delta : float
+            Time between samples (in seconds)
+
+        Returns
+        -------
+        numpy.ndarray
+            Boolean array of length npts
+        """
+        t0 = obspy.UTCDateTime(starttime).timestamp
+        firstSample = np.clip(np.ceil(np.round((self.starts - t0) / delta, 6)), 0, npts).astype(np.int64)
+        lastSample = np.clip(np.floor(np.round((self.ends - t0) / delta, 6)) + 1, 0, npts).astype(np.int64)
+        return self._ranges_to_bool(firstSample, lastSample, npts)
+
+    @staticmethod
+    def _ranges_to_bool(firsts, stops, npts):
+        """Boolean array of length npts that is True within each sample range [firsts[i], stops[i]) (ranges must be sorted by firsts)"""
+        firsts = np.asarray(firsts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        keep = stops > firsts
+        firsts = firsts[keep]
+        stops = stops[keep]
+        if firsts.size == 0:
+            return np.zeros(npts, dtype=bool)
+
+        # Ranges that overlap or touch (after rounding to samples) are merged, so every range edge is at a different sample
+        runningStop = np.maximum.accumulate(stops)
+        newGroup = np.ones(firsts.size, dtype=bool)
+        newGroup[1:] = firsts[1:] > runningStop[:-1]
+        groupInds = np.flatnonzero(newGroup)
+        firsts = firsts[groupInds]
+        stops = np.maximum.reduceat(stops, groupInds)
+
+        # Mark the edges of each range, then the parity of the (uint8) cumulative sum is set for the samples inside
+        edges = np.zeros(npts + 1, dtype=np.uint8)
+        edges[firsts] = 1
+        edges[stops] = 1
+        inside = np.cumsum(edges[:-1], dtype=np.uint8)
+        inside &= 1
+        return inside.view(bool)
+
+    def to_sample_mask(self, starttime, npts, delta):
+        """Same as sample_mask(), but returns a (bit-packed) SampleMask object
+
+        Parameters
+        ----------
+        starttime : obspy.UTCDateTime
+            Time of first sample
+        npts : int
+            Number of samples
+        delta : float
+            Time between samples (in seconds)
+
+        Returns
+        -------
+        SampleMask
+        """
+        return SampleMask.from_bool(self.sample_mask(starttime, npts, delta))
+
+    def apply(self, stream, keep=False):
+        """Mask the data of every trace in stream that falls within (or, if keep=True, outside) the IntervalSet
+
+        Parameters
+        ----------
+        stream : obspy.Stream
+            Input stream. This is not modified.
+        keep : bool, optional
+            If True, the intervals are windows to keep and all data outside of them is masked, by default False
+
+        Returns
+        -------
+        obspy.Stream
+            Copy of stream with masked arrays where data has been removed
+        """
+        outStream = stream.copy()
+        for tr in outStream:
+            # The masked array is the output, so its (boolean) mask is built directly rather than through a SampleMask
+            removeMask = self.sample_mask(tr.stats.starttime, tr.stats.npts, tr.stats.delta)
+            if keep:
+                removeMask = ~removeMask
+            if np.ma.is_masked(tr.data):
+                removeMask |= np.ma.getmaskarray(tr.data)
+            if removeMask.any():
+                tr.data = np.ma.masked_array(np.ma.getdata(tr.data), mask=removeMask)
+            else:
+                tr.data = np.ma.getdata(tr.data)
+        return outStream
+
+    def to_list(self, time_type='utc'):
+        """Get intervals as a list of [start, end] lists
+
+        Parameters
+        ----------
+        time_type : str, {'utc', 'matplotlib', 'timestamp'}, optional
+            Format of output times, by default 'utc' (obspy.UTCDateTime)
+
+        Returns
+        -------
+        list
+        """
+        if time_type.lower() in ['timestamp', 'ts', 't']:
+            return np.column_stack([self.starts, self.ends]).tolist()
+        elif time_type.lower() in ['matplotlib', 'mpl', 'm']:
+            offset = mdates.date2num(datetime.datetime(1970, 1, 1))
+            return (np.column_stack([self.starts, self.ends])/86400 + offset).tolist()
+        return [[obspy.UTCDateTime(s), obspy.UTCDateTime(e)] for s, e in zip(self.starts, self.ends)]
+
+    @property
+    def duration(self):
+        """Total duration (in seconds) of all intervals"""
+        return float(np.sum(self.ends - self.starts))
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __len__(self):
+        return int(self.starts.size)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __repr__(self):
+        return f"IntervalSet({len(self)} intervals, {self.duration:.2f} s)"
+
+
+# Class for compact per-sample masks
+class SampleMask:
+    """SampleMask is a boolean value for each sample of a trace, stored as packed bits (np.packbits).
+
+    It is used for bookkeeping of removed (masked) samples during noise removal, azimuth calculation, and PSD windowing.
+    A SampleMask uses one bit per sample (1/8 of the memory of a numpy boolean mask).
+    It is only converted to a numpy masked array when data is given back to obspy (see to_masked_array()).
+    """
+    def __init__(self, npts, packed=None):
+        """SampleMask initializer
+
+        Parameters
+        ----------
+        npts : int
+            Number of samples
+        packed : numpy.ndarray or None, optional
+            Packed bits (as output by np.packbits()), by default None (no samples masked)
+        """
+        self.npts = int(npts)
+        nBytes = (self.npts + 7) // 8
+        if packed is None:
+            self.packed = np.zeros(nBytes, dtype=np.uint8)
+        else:
+            self.packed = np.asarray(packed, dtype=np.uint8)
+            if self.packed.size != nBytes:
+                raise ValueError(f"packed must have {nBytes} bytes for {self.npts} samples, not {self.packed.size}")
+
+    @classmethod
+    def from_bool(cls, mask):
+        """Create SampleMask from a boolean array with one value per sample"""
+        mask = np.asarray(mask, dtype=bool)
+        return cls(mask.size, np.packbits(mask))
+
+    @classmethod
+    def from_array(cls, data):
+        """Create SampleMask from the mask of a data array (numpy masked array or not)
+
+        Parameters
+        ----------
+        data : numpy.ndarray or numpy.ma.MaskedArray
+            Data array, usually trace.data. If this is not a masked array (or has no masked values), no samples are masked.
+
+        Returns
+        -------
+        SampleMask
+        """
+        if isinstance(data, np.ma.MaskedArray) and np.ma.getmask(data) is not np.ma.nomask:
+            return cls.from_bool(np.ma.getmask(data))
+        return cls(np.size(data))
+
+    @classmethod
+    def from_runs(cls, starts, ends, npts):
+        """Create SampleMask with samples masked in runs from starts[i] to ends[i] (inclusive)
+
+        Parameters
+        ----------
+        starts : array-like
+            Index of first sample in each run
+        ends : array-like
+            Index of last sample in each run
+        npts : int
+            Number of samples
+
+        Returns
+        -------
+        SampleMask
+        """
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, npts)
+        ends = np.clip(np.asarray(ends, dtype=np.int64) + 1, 0, npts)
+        order = np.argsort(starts, kind='stable')
+        return cls.from_bool(IntervalSet._ranges_to_bool(starts[order], ends[order], int(npts)))
+
+    def to_bool(self, start=0, stop=None):
+        """Get mask (or a slice of it) as a numpy boolean array
+
+        Parameters
+        ----------
+        start : int, optional
+            First sample, by default 0
+        stop : int or None, optional
+            Sample after the last sample (as in a python slice), by default None (to end of mask)
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+        stop = self.npts if stop is None else min(max(int(stop), 0), self.npts)
+        start = min(max(int(start), 0), stop)
+        # Only unpack the bytes needed for this slice
+        firstByte = start // 8
+        lastByte = (stop + 7) // 8
+        bits = np.unpackbits(self.packed[firstByte:lastByte], count=(stop - firstByte*8)).astype(bool)
+        return bits[start - firstByte*8:]
+
+    def runs(self, start=0, stop=None, masked=True):
+        """Get the first and last index of each run of masked (or, if masked=False, unmasked) samples
+
+        Parameters
+        ----------
+        start : int, optional
+            First sample to consider, by default 0
+        stop : int or None, optional
+            Sample after the last sample to consider, by default None (to end of mask)
+        masked : bool, optional
+            Whether to get runs of masked samples (True) or unmasked samples (False), by default True
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            Arrays with the first and last index of each run (relative to start)
+        """
+        bits = self.to_bool(start, stop)
+        if not masked:
+            bits = ~bits
+        return IntervalSet._mask_runs(bits)
+
+    def to_masked_array(self, data):
+        """Get data as a numpy masked array using this mask. If no samples are masked, data is returned as is.
+
+        Parameters
+        ----------
+        data : numpy.ndarray
+            Data array with npts samples
+
+        Returns
+        -------
+        numpy.ndarray or numpy.ma.MaskedArray
+        """
+        data = np.ma.getdata(data)
+        if not self.any():
+            return data
+        return np.ma.masked_array(data, mask=self.to_bool())
+
+    def count(self):
+        """Number of masked samples"""
+        return int(np.unpackbits(self.packed, count=self.npts).sum())
+
+    def any(self):
+        """Whether any samples are masked"""
+        return bool(self.packed.any())
+
+    @property
+    def nbytes(self):
+        """Memory (in bytes) used by the packed mask"""
+        return int(self.packed.nbytes)
+
+    def _check_other(self, other):
+        if not isinstance(other, SampleMask):
+            other = SampleMask.from_bool(other)
+        if other.npts != self.npts:
+            raise ValueError(f"SampleMask objects must have the same number of samples ({self.npts} != {other.npts})")
+        return other
+
+    def __and__(self, other):
+        other = self._check_other(other)
+        return SampleMask(self.npts, self.packed & other.packed)
+
+    def __or__(self, other):
+        other = self._check_other(other)
+        return SampleMask(self.npts, self.packed | other.packed)
+
+    def __invert__(self):
+        inverted = ~self.packed
+        # Padding bits at the end of the last byte should stay unset
+        if self.npts % 8:
+            inverted[-1] &= np.uint8((0xFF << (8 - self.npts % 8)) & 0xFF)
+        return SampleMask(self.npts, inverted)
+
+    def __len__(self):
+        return self.npts
+
+    def __repr__(self):
+        return f"SampleMask({self.count()} of {self.npts} samples masked, {self.nbytes} bytes)"
+
+
+# Class for an aligned (traces x samples) view of the data in a stream
+class ComponentMatrix:
+    """ComponentMatrix holds the data of a stream as one aligned (traces x samples) array with a shared time base.
+
+    Traces with the same id are merged (as with obspy.Stream.merge()), and each merged trace is placed in one row of the array, 
+    starting at the sample nearest to its start time. Masked samples (and samples not covered by a trace) are set to 0 and marked in the SampleMask of that row.
+    All traces must have the same sampling rate.
+
+    HVSRData.component_matrix builds a ComponentMatrix from HVSRData.stream the first time it is needed, and only rebuilds it when the traces in the stream change.
+    This way, functions that need the data of each component (e.g., calculate_azimuth(), generate_psds(), process_hvsr()) 
+    do not each need to select and merge the stream again.
+    """
+    def __init__(self, stream):
+        """ComponentMatrix initializer
+
+        Parameters
+        ----------
+        stream : obspy.Stream or obspy.Trace
+            Stream with the data. The stream is not changed.
+        """
+        if isinstance(stream, obspy.Trace):
+            stream = obspy.Stream([stream])
+        if len(stream) == 0:
+            raise ValueError("ComponentMatrix cannot be created from an empty stream")
+
+        # References to the traces (and their data) used, so changes to the stream can be detected (see matches())
+        self._sources = [self._trace_source(tr) for tr in stream]
+
+        # Merge traces with the same id (in order of first appearance), without changing the traces in stream
+        traceIDs = list(dict.fromkeys([tr.id for tr in stream]))
+        mergedTraces = []
+        for trID in traceIDs:
+            idTraces = [tr for tr in stream if tr.id == trID]
+            if len(idTraces) == 1:
+                mergedTraces.append(idTraces[0])
+            else:
+                mergedTraces.extend(obspy.Stream(idTraces).merge())
+
+        samplingRates = np.array([tr.stats.sampling_rate for tr in mergedTraces], dtype=np.float64)
+        if not np.allclose(samplingRates, samplingRates[0]):
+            raise ValueError(f"All traces must have the same sampling rate to create a ComponentMatrix, not {sorted(set(samplingRates.tolist()))}")
+
+        self.sampling_rate = float(samplingRates[0])
+        self.delta = 1.0 / self.sampling_rate
+        self.starttime = min([tr.stats.starttime for tr in mergedTraces])
+        endtime = max([tr.stats.endtime for tr in mergedTraces])
+        self.npts = int(round_away((endtime - self.starttime) * self.sampling_rate)) + 1
+
+        self.components = [tr.stats.component.upper() for tr in mergedTraces]
+        self.stats = [tr.stats for tr in mergedTraces]
+        self.offsets = np.array([int(round_away((tr.stats.starttime - self.starttime) * self.sampling_rate)) for tr in mergedTraces], dtype=np.int64)
+        self.row_npts = np.array([tr.stats.npts for tr in mergedTraces], dtype=np.int64)
+
+        # Fill the array (and masks) one row at a time
+        dtype = np.result_type(*[np.ma.getdata(tr.data).dtype for tr in mergedTraces])
+        self.data = np.zeros((len(mergedTraces), self.npts), dtype=dtype)
+        self.masks = []
+        for i, tr in enumerate(mergedTraces):
+            first = self.offsets[i]
+            last = first + self.row_npts[i]
+            self.data[i, first:last] = np.ma.getdata(tr.data)
+            if np.ma.is_masked(tr.data) or first > 0 or last < self.npts:
+                rowMask = np.ones(self.npts, dtype=bool)
+                rowMask[first:last] = np.ma.getmaskarray(tr.data)
+                self.masks.append(SampleMask.from_bool(rowMask))
+            else:
+                self.masks.append(SampleMask(self.npts))
+
+    @staticmethod
+    def _trace_source(trace):
+        """Identity of a trace and its data, used to check whether a stream has changed"""
+        return (trace, trace.data, np.ma.getmask(trace.data), str(trace.stats.starttime), float(trace.stats.sampling_rate), int(trace.stats.npts))
+
+    def matches(self, stream):
+        """Whether this ComponentMatrix was created from the current traces (and data) of stream.
+
+        Since sprit replaces the data of a trace (rather than editing it in place) when it changes it, 
+        this only compares the trace and data objects (and start time, sampling rate, and number of samples) rather than the data itself.
+        Use HVSRData.component_matrix = None to force the matrix to be rebuilt if the data of a trace has been changed in place.
+
+        Parameters
+        ----------
+        stream : obspy.Stream
+            Stream to compare
+
+        Returns
+        -------
+        bool
+        """
+        if stream is None or len(stream) != len(self._sources):
+            return False
+        for tr, source in zip(stream, self._sources):
+            currSource = self._trace_source(tr)
+            if any([currItem is not srcItem for currItem, srcItem in zip(currSource[:3], source[:3])]) or currSource[3:] != source[3:]:
+                return False
+        return True
+
+    def append_aligned(self, traces, masks):
+        """Adds traces that are already on the shared time base (e.g., the radial components created by calculate_azimuth()) as new rows.
+
+        The traces should also be appended (in the same order) to the end of the stream this ComponentMatrix was created from, 
+        so it still matches the stream and is not rebuilt (which would unpack the masked arrays of the new traces and pack them again).
+
+        Parameters
+        ----------
+        traces : list of obspy.Trace
+            Traces starting at the shared start time, with the same number of samples and sampling rate as the ComponentMatrix
+        masks : list of SampleMask
+            SampleMask of each trace
+        """
+        for tr, trMask in zip(traces, masks):
+            if tr.stats.starttime != self.starttime or tr.stats.npts != self.npts or not np.isclose(tr.stats.sampling_rate, self.sampling_rate):
+                raise ValueError(f"Trace {tr.id} is not aligned with the shared time base of the ComponentMatrix")
+            if len(trMask) != self.npts:
+                raise ValueError(f"SampleMask of trace {tr.id} must have {self.npts} samples, not {len(trMask)}")
+
+        # All the new rows are added at once, so the data array is only copied once
+        self.data = np.vstack([self.data] + [np.ma.getdata(tr.data)[np.newaxis, :] for tr in traces])
+        self.masks.extend(masks)
+        self.components.extend([tr.stats.component.upper() for tr in traces])
+        self.stats.extend([tr.stats for tr in traces])
+        self.offsets = np.concatenate([self.offsets, np.zeros(len(traces), dtype=np.int64)])
+        self.row_npts = np.concatenate([self.row_npts, np.full(len(traces), self.npts, dtype=np.int64)])
+        self._sources.extend([self._trace_source(tr) for tr in traces])
+
+    def rows(self, component):
+        """Indices of the rows of a component (e.g., 'Z', or 'R' for all the radial components calculated by calculate_azimuth())
+
+        Parameters
+        ----------
+        component : str
+            Component code (last character of the channel code)
+
+        Returns
+        -------
+        list
+            List of row indices (empty if component is not in the stream)
+        """
+        return [i for i, comp in enumerate(self.components) if comp == str(component).upper()]
+
+    def _row(self, component, index=0):
+        compRows = self.rows(component)
+        if len(compRows) <= index:
+            raise KeyError(f"Component {component} (index {index}) not in ComponentMatrix with components {self.components}")
+        return compRows[index]
+
+    def get_data(self, component, index=0):
+        """Data of a component (a view of its row), with masked samples set to 0"""
+        return self.data[self._row(component, index)]
+
+    def get_mask(self, component, index=0):
+        """SampleMask of a component"""
+        return self.masks[self._row(component, index)]
+
+    def get_stats(self, component, index=0):
+        """obspy Stats of the (merged) trace of a component"""
+        return self.stats[self._row(component, index)]
+
+    def get_id(self, component, index=0):
+        """Trace id of a component"""
+        return self.ids[self._row(component, index)]
+
+    def get_extent(self, component, index=0):
+        """First and last sample of the (merged) trace of a component"""
+        row = self._row(component, index)
+        return int(self.offsets[row]), int(self.offsets[row] + self.row_npts[row] - 1)
+
+    def combined_mask(self, components):
+        """SampleMask with the samples masked in any of the rows of components (e.g., ['N', 'E'])"""
+        combMask = SampleMask(self.npts)
+        for comp in components:
+            for row in self.rows(comp):
+                combMask = combMask | self.masks[row]
+        return combMask
+
+    def sample_of(self, time):
+        """Nearest sample to time (obspy.UTCDateTime), relative to the shared start time"""
+        return int(round_away((time - self.starttime) * self.sampling_rate))
+
+    @property
+    def ids(self):
+        """Trace id (network.station.location.channel) of each row"""
+        return [f"{st.network}.{st.station}.{st.location}.{st.channel}" for st in self.stats]
+
+    @property
+    def endtime(self):
+        """Time of the last sample of the shared time base"""
+        return self.starttime + (self.npts - 1) * self.delta
+
+    @property
+    def nbytes(self):
+        """Memory (in bytes) used by the data array and masks"""
+        return int(self.data.nbytes + sum([mask.nbytes for mask in self.masks]))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __repr__(self):
+        return f"ComponentMatrix({len(self)} traces {self.components} x {self.npts} samples, {self.nbytes/1e6:.2f} MB)"
+
+
+# Class for the polar (azimuth x frequency) grid of the azimuthal H/V curves
+class AzimuthPolarGrid:
+    """AzimuthPolarGrid holds the azimuthal H/V curves (hvsr_az) as one (azimuth x frequency) array, ready to be plotted on a polar chart.
+
+    Azimuths are only calculated between 0 and 180 degrees, so the grid is mirrored to cover 0-360 degrees (the H/V curve at azimuth+180 is the same as at azimuth).
+    The mesh interpolated along the azimuths (see interpolate_azimuths in plot_azimuth()) is calculated the first time it is needed and then reused.
+
+    HVSRData.azimuth_grid builds an AzimuthPolarGrid from HVSRData.hvsr_az the first time it is needed, and only rebuilds it when hvsr_az changes (e.g., process_hvsr() is run again).
+    This way, plot_azimuth() (with either plot engine) and the azimuth plot of get_report() can be redrawn (e.g., to show peaks or the grid) without rebuilding the data.
+    """
+    def __init__(self, hvsr_az, freqs):
+        """AzimuthPolarGrid initializer
+
+        Parameters
+        ----------
+        hvsr_az : dict
+            Dictionary with azimuth names (angle in degrees, e.g., '045' or '45.0') as keys and H/V curves as values (i.e., hvsr_data['hvsr_az'])
+        freqs : array-like
+            Frequencies of the H/V curves (one value per point of each curve)
+        """
+        if len(hvsr_az) == 0:
+            raise ValueError("AzimuthPolarGrid cannot be created without azimuthal H/V curves (hvsr_az is empty)")
+
+        # References to the curves used, so changes to hvsr_az can be detected (see matches())
+        self._sources = (hvsr_az, [hvsr_az[k] for k in hvsr_az.keys()])
+
+        # Sort azimuths by angle (not by name, since names may not be zero-padded)
+        azNames = list(hvsr_az.keys())
+        azDeg = np.array([float(k) for k in azNames], dtype=np.float64)
+        order = np.argsort(azDeg, kind='stable')
+        self.azimuth_names = [azNames[i] for i in order]
+        self.azimuths_deg = azDeg[order]
+        self.azimuths_rad = np.deg2rad(self.azimuths_deg)
+        self.freqs = np.asarray(freqs, dtype=np.float64)
+        self.values = np.array([np.asarray(hvsr_az[k], dtype=np.float64) for k in self.azimuth_names])
+        if self.values.shape[1] != self.freqs.size:
+            raise ValueError(f"Number of frequencies ({self.freqs.size}) does not match length of H/V curves ({self.values.shape[1]})")
+        self._meshes = {}
+
+    def matches(self, hvsr_az):
+        """Whether this AzimuthPolarGrid was created from the current curves of hvsr_az (compares objects, not values)"""
+        srcDict, srcCurves = self._sources
+        if hvsr_az is not srcDict or len(hvsr_az) != len(srcCurves):
+            return False
+        return all([hvsr_az[k] is srcCurve for k, srcCurve in zip(hvsr_az.keys(), srcCurves)])
+
+    @staticmethod
+    def _interp_rows(values, theta, new_theta):
+        """Linear interpolation (as numpy.interp) of each column of values from theta to new_theta, for all columns at once"""
+        if theta.size == 1:
+            return np.repeat(values, new_theta.size, axis=0)
+        ind = np.clip(np.searchsorted(theta, new_theta, side='right') - 1, 0, theta.size - 2)
+        weight = np.clip((new_theta - theta[ind]) / (theta[ind + 1] - theta[ind]), 0, 1)[:, np.newaxis]
+        return values[ind] * (1 - weight) + values[ind + 1] * weight
+
+    def grid(self, interpolate=True, n_theta=180):
+        """Azimuths (radians) and values of the half (0-180 degree) grid, interpolated along the azimuths if interpolate=True
+
+        Parameters
+        ----------
+        interpolate : bool, optional
+            Whether to interpolate the values to n_theta azimuths between 1 and 180 degrees, by default True
+        n_theta : int, optional
+            Number of azimuths to interpolate to, by default 180 (every degree)
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            (theta, values), with values having the shape (len(theta), len(freqs))
+        """
+        if not interpolate:
+            return self.azimuths_rad, self.values
+        key = ('grid', int(n_theta))
+        if key not in self._meshes:
+            newTheta = np.linspace(np.deg2rad(1), np.pi, int(n_theta))
+            self._meshes[key] = (newTheta, self._interp_rows(self.values, self.azimuths_rad, newTheta))
+        return self._meshes[key]
+
+    def mirrored(self, interpolate=True, n_theta=180):
+        """Azimuths (radians) and values of the full (0-360 degree) grid, with the values at azimuth+180 degrees the same as at azimuth
+
+        Parameters
+        ----------
+        interpolate : bool, optional
+            Whether to use the interpolated grid (see grid()), by default True
+        n_theta : int, optional
+            Number of azimuths (in each half) to interpolate to, by default 180
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            (theta, values), with theta having twice as many azimuths as grid()
+        """
+        key = ('mirrored', bool(interpolate), int(n_theta))
+        if key not in self._meshes:
+            theta, values = self.grid(interpolate=interpolate, n_theta=n_theta)
+            self._meshes[key] = (np.concatenate([theta, theta + np.pi]), np.concatenate([values, values]))
+        return self._meshes[key]
+
+    def mesh(self, interpolate=True, n_theta=180):
+        """Meshgrids for each half of the polar plot (e.g., for matplotlib.pyplot.pcolormesh())
+
+        Parameters
+        ----------
+        interpolate : bool, optional
+            Whether to use the interpolated grid (see grid()), by default True
+        n_theta : int, optional
+            Number of azimuths (in each half) to interpolate to, by default 180
+
+        Returns
+        -------
+        list of tuples
+            List with a (theta, freq, values) tuple of 2D arrays for 0-180 degrees and for 180-360 degrees
+        """
+        key = ('mesh', bool(interpolate), int(n_theta))
+        if key not in self._meshes:
+            theta, values = self.grid(interpolate=interpolate, n_theta=n_theta)
+            meshList = []
+            for halfTheta in [theta, theta + np.pi]:
+                r, th = np.meshgrid(self.freqs, halfTheta)
+                meshList.append((th, r, values))
+            self._meshes[key] = meshList
+        return self._meshes[key]
+
+    def clear(self):
+        """Remove the cached (interpolated) meshes"""
+        self._meshes = {}
+
+    @property
+    def nbytes(self):
+        """Memory (in bytes) used by the values and cached meshes"""
+        meshBytes = 0
+        for mesh in self._meshes.values():
+            for item in (mesh if isinstance(mesh, tuple) else [arr for tup in mesh for arr in tup]):
+                meshBytes += item.nbytes
+        return int(self.values.nbytes + meshBytes)
+
+    def __len__(self):
+        return len(self.azimuth_names)
+
+    def __repr__(self):
+        return f"AzimuthPolarGrid({len(self)} azimuths x {self.freqs.size} frequencies, {len(self._meshes)} cached meshes)"
+
+
+# Class for indexing Raspberry Shake archive directories
+class RSArchiveCatalog:
+    """RSArchiveCatalog is an index of the day files in a Raspberry Shake archive directory (or any directory with files named NET.STA.LOC.CHA.D.YEAR.DOY).
+
+    The archive is indexed (by network, station, location, channel, and day) the first time it is used, and the index is saved in a small JSON file 
+    (by default, in the user cache directory RS_CATALOG_DIR, so the archive itself is not changed) so that it does not need to be rebuilt later. 
+    When the catalog is refreshed, only directories whose modification time has changed are listed again, 
+    and only files that are new or whose modification time or size has changed are read again.
+    Files are then found for a given station and day (or time range) using a dictionary lookup, rather than by walking the archive.
+    """
+    CATALOG_VERSION = 1
+
+    def __init__(self, root, catalog_path=None, read_spans=True, auto_save=True, verbose=False):
+        """RSArchiveCatalog initializer. The catalog is loaded (if catalog_path exists) and refreshed.
+
+        Parameters
+        ----------
+        root : str or pathlib.Path
+            Root directory of archive
+        catalog_path : str, pathlib.Path, or None, optional
+            Path to JSON file where the catalog is stored. If None, a file named for the root directory in RS_CATALOG_DIR (a user cache directory), by default None
+        read_spans : bool, optional
+            Whether to read the first and last record of each file to get the start and end time of the data in each file. 
+            If False, each file is assumed to span its entire day, by default True
+        auto_save : bool, optional
+            Whether to save the catalog to catalog_path whenever it changes, by default True
+        verbose : bool, optional
+            Whether to print information about the catalog to terminal, by default False
+        """
+        self.root = pathlib.Path(root).resolve()
+        if catalog_path is None:
+            rootHash = hashlib.sha1(self.root.as_posix().encode('utf-8')).hexdigest()[:12]
+            catalog_path = RS_CATALOG_DIR.joinpath(f"{self.root.name}_{rootHash}.json")
+        self.catalog_path = pathlib.Path(catalog_path)
+        self.read_spans = read_spans
+        self.auto_save = auto_save
+
+        self._lock = threading.RLock()  # Catalog may be used by several threads when files are read concurrently
+        self._dirs = {}  # {relative dir: [mtime_ns, [subdirectory names]]}
+        self._files = {}  # {relative path: [net, sta, loc, cha, year, doy, mtime_ns, size, start timestamp, end timestamp]}
+        self._dayIndex = {}
+
+        self.load(verbose=verbose)
+        self.refresh(verbose=verbose)
+
+    @staticmethod
+    def parse_filename(filename):
+        """Get the network, station, location, channel, year, and day of year from the name of an archive file
+
+        Parameters
+        ----------
+        filename : str
+            Filename in the form NET.STA.LOC.CHA.D.YEAR.DOY (e.g., AM.RAC84.00.EHZ.D.2023.046)
+
+        Returns
+        -------
+        list or None
+            [network, station, location, channel, year, doy], or None if filename is not in that form
+        """
+        nameParts = str(filename).split('.')
+        if len(nameParts) != 7 or len(nameParts[4]) != 1:
+            return None
+        net, sta, loc, cha, _, year, doy = nameParts
+        if not (len(year) == 4 and year.isdigit() and len(doy) == 3 and doy.isdigit()):
+            return None
+        return [net, sta, loc, cha, int(year), int(doy)]
+
+    def _file_entry(self, relPath, fileStat):
+        """Catalog entry for a file (reads first and last record of file if self.read_spans=True)"""
+        net, sta, loc, cha, year, doy = self.parse_filename(pathlib.Path(relPath).name)
+        dayStart = obspy.UTCDateTime(year=year, julday=doy).timestamp
+        startTS = dayStart
+        endTS = dayStart + 86400
+        if self.read_spans and fileStat.st_size > 0:
+            filePath = str(self.root.joinpath(relPath))
+            try:
+                firstRecord = get_record_information(filePath)
+                lastRecord = get_record_information(filePath, offset=fileStat.st_size - firstRecord['record_length'])
+                startTS = firstRecord['starttime'].timestamp
+                endTS = lastRecord['endtime'].timestamp
+            except Exception:
+                pass
+        return [net, sta, loc, cha, year, doy, fileStat.st_mtime_ns, fileStat.st_size, startTS, endTS]
+
+    def _refresh_dir(self, relDir, changes, dirFiles):
+        """Update catalog for directory relDir (and its subdirectories), only listing directories that have changed"""
+        dirPath = self.root.joinpath(relDir)
+        try:
+            dirMtime = dirPath.stat().st_mtime_ns
+        except Exception:
+            return
+
+        if relDir in self._dirs and self._dirs[relDir][0] == dirMtime:
+            subDirs = self._dirs[relDir][1]
+        else:
+            subDirs = []
+            currentFiles = set()
+            for entry in os.scandir(dirPath):
+                if entry.is_dir():
+                    subDirs.append(entry.name)
+                elif entry.is_file() and self.parse_filename(entry.name) is not None:
+                    relPath = pathlib.Path(relDir).joinpath(entry.name).as_posix()
+                    currentFiles.add(relPath)
+                    fileStat = entry.stat()
+                    if relPath not in self._files or self._files[relPath][6:8] != [fileStat.st_mtime_ns, fileStat.st_size]:
+                        self._files[relPath] = self._file_entry(relPath, fileStat)
+                        changes[0] += 1
+
+            # Remove files that no longer exist
+            for relPath in dirFiles.get(relDir, set()) - currentFiles:
+                del self._files[relPath]
+                changes[0] += 1
+
+            # Remove subdirectories that no longer exist
+            if relDir in self._dirs:
+                for removedDir in set(self._dirs[relDir][1]) - set(subDirs):
+                    self._remove_dir(pathlib.Path(relDir).joinpath(removedDir).as_posix())
+                    changes[0] += 1
+            self._dirs[relDir] = [dirMtime, sorted(subDirs)]
+            changes[0] += 1
+
+        for sd in subDirs:
+            self._refresh_dir(pathlib.Path(relDir).joinpath(sd).as_posix(), changes, dirFiles)
+
+    def _remove_dir(self, relDir):
+        """Remove directory (and all files and subdirectories in it) from catalog"""
+        for d in [d for d in self._dirs if d == relDir or d.startswith(relDir+'/')]:
+            del self._dirs[d]
+        for f in [f for f in self._files if f.startswith(relDir+'/')]:
+            del self._files[f]
+
+    def _build_day_index(self):
+        """Build {(year, doy): {station: [relative paths]}} dictionary used for lookups"""
+        self._dayIndex = {}
+        for relPath, entry in self._files.items():
+            self._dayIndex.setdefault((entry[4], entry[5]), {}).setdefault(entry[1], []).append(relPath)
+
+    def refresh(self, verbose=False):
+        """Update the catalog with any files that have been added, removed, or changed in the archive since it was last refreshed
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            Whether to print information about the update to terminal, by default False
+
+        Returns
+        -------
+        RSArchiveCatalog
+        """
+        with self._lock:
+            changes = [0]
+            # Files currently in catalog, by directory
+            dirFiles = {}
+            for relPath in self._files:
+                dirFiles.setdefault(pathlib.Path(relPath).parent.as_posix(), set()).add(relPath)
+            self._refresh_dir('.', changes, dirFiles)
+            # If no directory has changed, only the directories have been checked (the index is still up to date)
+            if changes[0] > 0:
+                self._build_day_index()
+            if verbose:
+                print(f"\tCatalog of {self.root} refreshed ({changes[0]} updates): {len(self)} files")
+            if changes[0] > 0 and self.auto_save:
+                self.save(verbose=verbose)
+        return self
+
+    def find(self, station=None, date=None, starttime=None, endtime=None, network=None, channels=None):
+        """Get the paths of files in the archive for a station on a given day (or overlapping a time range)
+
+        Parameters
+        ----------
+        station : str or None, optional
+            Station name. If None, files for all stations are returned, by default None
+        date : datetime.date, datetime.datetime, obspy.UTCDateTime, tuple, or None, optional
+            Day of data. A tuple should be (year, day of year). If None, the days between starttime and endtime are used, by default None
+        starttime : obspy.UTCDateTime or None, optional
+            If specified, only files with data after starttime are returned, by default None
+        endtime : obspy.UTCDateTime or None, optional
+            If specified, only files with data before endtime are returned, by default None
+        network : str or None, optional
+            Network code. If None, files for all networks are returned, by default None
+        channels : list or None, optional
+            Channel codes (e.g., ['EHZ', 'EHN', 'EHE']). If None, files for all channels are returned, by default None
+
+        Returns
+        -------
+        list
+            List of pathlib.Path objects, sorted by filename
+        """
+        if date is None and starttime is None:
+            raise ValueError("Either date or starttime must be specified to find files in catalog")
+
+        if date is not None:
+            if isinstance(date, tuple):
+                dayKeys = [(int(date[0]), int(date[1]))]
+            else:
+                dateUTC = obspy.UTCDateTime(date)
+                dayKeys = [(dateUTC.year, dateUTC.julday)]
+        else:
+            firstDay = obspy.UTCDateTime(obspy.UTCDateTime(starttime).date)
+            lastDay = obspy.UTCDateTime(endtime) if endtime is not None else firstDay
+            dayKeys = []
+            currDay = firstDay
+            while currDay <= lastDay:
+                dayKeys.append((currDay.year, currDay.julday))
+                currDay += 86400
+
+        startTS = -np.inf if starttime is None else obspy.UTCDateTime(starttime).timestamp
+        endTS = np.inf if endtime is None else obspy.UTCDateTime(endtime).timestamp
+        channels = None if channels is None else [str(c).upper() for c in channels]
+
+        fileList = []
+        with self._lock:
+            for dk in dayKeys:
+                dayFiles = self._dayIndex.get(dk, {})
+                if station is None:
+                    relPaths = [f for staFiles in dayFiles.values() for f in staFiles]
+                else:
+                    relPaths = dayFiles.get(str(station), [])
+
+                for relPath in relPaths:
+                    net, sta, loc, cha, year, doy, mtime, size, fStart, fEnd = self._check_file(relPath)
+                    if relPath not in self._files:
+                        continue
+                    if network is not None and net != str(network):
+                        continue
+                    if channels is not None and cha.upper() not in channels:
+                        continue
+                    if fEnd < startTS or fStart > endTS:
+                        continue
+                    fileList.append(self.root.joinpath(relPath))
+        return sorted(fileList, key=lambda f: f.name)
+
+    def _check_file(self, relPath):
+        """Update catalog entry for a single file if it has changed (e.g., a day file that is still being written to)"""
+        try:
+            fileStat = self.root.joinpath(relPath).stat()
+        except Exception:
+            entry = self._files.pop(relPath)
+            self._build_day_index()
+            return entry
+        if self._files[relPath][6:8] != [fileStat.st_mtime_ns, fileStat.st_size]:
+            self._files[relPath] = self._file_entry(relPath, fileStat)
+            if self.auto_save:
+                self.save()
+        return self._files[relPath]
+
+    def available_days(self, year=None, station=None):
+        """Get the days with data in the archive
+
+        Parameters
+        ----------
+        year : int or None, optional
+            If specified, only days in this year are returned, by default None
+        station : str or None, optional
+            If specified, only days with data from this station are returned, by default None
+
+        Returns
+        -------
+        list
+            Sorted list of (year, day of year) tuples
+        """
+        return sorted([dk for dk, staDict in self._dayIndex.items() 
+                       if (year is None or dk[0] == int(year)) and (station is None or str(station) in staDict)])
+
+    def stations(self):
+        """Get sorted list of stations in the archive"""
+        return sorted(set([entry[1] for entry in self._files.values()]))
+
+    def save(self, verbose=False):
+        """Save catalog to self.catalog_path (JSON). If the file cannot be written, the catalog is only kept in memory.
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            Whether to print information to terminal, by default False
+        """
+        catalogDict = {'version': self.CATALOG_VERSION, 'root': self.root.as_posix(), 'read_spans': self.read_spans,
+                       'dirs': self._dirs, 'files': self._files}
+        try:
+            self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.catalog_path, 'w') as f:
+                json.dump(catalogDict, f)
+        except Exception as e:
+            if verbose:
+                print(f"\tCatalog could not be saved to {self.catalog_path} ({e}), it is only stored in memory")
+
+    def load(self, verbose=False):
+        """Load catalog from self.catalog_path, if it exists and was created for the same archive root and settings
+
+        Parameters
+        ----------
+        verbose : bool, optional
+            Whether to print information to terminal, by default False
+        """
+        if not self.catalog_path.exists():
+            return
+        try:
+            with open(self.catalog_path, 'r') as f:
+                catalogDict = json.load(f)
+        except Exception as e:
+            if verbose:
+                print(f"\tCatalog at {self.catalog_path} could not be read ({e}), the archive will be indexed again")
+            return
+        if catalogDict.get('version') != self.CATALOG_VERSION or catalogDict.get('root') != self.root.as_posix() or catalogDict.get('read_spans') != self.read_spans:
+            return
+        self._dirs = catalogDict['dirs']
+        self._files = catalogDict['files']
+        self._build_day_index()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __repr__(self):
+        return f"RSArchiveCatalog({self.root}, {len(self)} files, {len(self.stations())} stations, {len(self._dayIndex)} days)"
+
 
 def gui_test():
     import subprocess
@@ -703,7 +2252,7 @@ def on_gui_closing():
 
 # FUNCTIONS AND METHODS
 # The run function to rule them all (runs all needed for simply processing HVSR)
-def run(input_data, source='file', azimuth_calculation=False, noise_removal=False, outlier_curves_removal=False, verbose=False, **kwargs):
+def run(input_data, source='file', azimuth_calculation=False, noise_removal=False, outlier_curves_removal=False, release_site_data=False, verbose=False, **kwargs):
     """The sprit.run() is the main function that allows you to do all your HVSR processing in one simple step (sprit.run() is how you would call it in your code, but it may also be called using sprit.sprit_hvsr.run())
     
     The input_data parameter of sprit.run() is the only required parameter. This can be either a single file, a list of files (one for each component, for example), a directory (in which case, all obspy-readable files will be added to an HVSRBatch instance), a Rasp. Shake raw data directory, or sample data.
@@ -738,12 +2287,19 @@ def run(input_data, source='file', azimuth_calculation=False, noise_removal=Fals
         Whether to remove noise (before processing PPSDs)
     outlier_curves_removal : bool, default=False
         Whether to remove outlier curves from HVSR time windows
+    release_site_data : bool, default=False
+        Batch data only. Whether to remove the streams and other large arrays of each site once it has been processed and its results reported/exported 
+        (using hvsr_export_path, for example), so that memory use does not grow with the number of sites. 
+        In this case, only the results (HVSR curves, peaks, and reports) are retained in the output HVSRBatch object, 
+        so the sites can no longer be plotted or reprocessed (e.g., with plot_hvsr() or remove_outlier_curves()).
+        By default False, so all data is retained.
     show_plot : bool, default=True
         Whether to show plots. This does not affect whether the plots are created (and then inserted as an attribute of HVSRData), only whether they are shown.
     verbose : bool, optional
         _description_, by default False
     **kwargs
         Keyword arguments for the functions listed above. The keyword arguments are unique, so they will get parsed out and passed into the appropriate function.
+        For batch data, sites are read and processed one at a time: prefetch_depth (see batch_data_read(), by default 1 in sprit.run()) sets how many sites are read ahead of the site being processed.
 
     Returns
     -------
@@ -776,6 +2332,9 @@ def run(input_data, source='file', azimuth_calculation=False, noise_removal=Fals
     if str(source).lower() in batchlist and str('input_data').lower() not in SAMPLE_LIST:
         try:
             batch_data_read_kwargs = {k: v for k, v in kwargs.items() if k in tuple(inspect.signature(batch_data_read).parameters.keys())}
+            # Sites are read as they are processed (by default, the next site is read while the current one is processed)
+            if batch_data_read_kwargs.get('prefetch_depth', None) is None:
+                batch_data_read_kwargs['prefetch_depth'] = 1
             hvsrDataIN = batch_data_read(batch_data=input_data, verbose=verbose, **batch_data_read_kwargs)
         except Exception as e:
             raise RuntimeError(f'Batch data read in was not successful:\n{e}')
@@ -817,13 +2376,15 @@ def run(input_data, source='file', azimuth_calculation=False, noise_removal=Fals
             raise RuntimeError('Data not read correctly, see sprit.fetch_data() function and parameters for more details.')
     
     # BREAK OUT FOR BATCH PROCESSING
-    if isinstance(hvsrDataIN, HVSRBatch):
+    if isinstance(hvsrDataIN, HVSRBatch) or inspect.isgenerator(hvsrDataIN):
         
         # Create dictionary that will be used to create HVSRBatch object
         hvsrBatchDict = {}
+        if isinstance(hvsrDataIN, HVSRBatch):
+            hvsrDataIN = hvsrDataIN.items()
         
         # Loop through each site and run sprit.run() for each HVSRData object
-        for site_name, site_data in hvsrDataIN.items():
+        for site_name, site_data in hvsrDataIN:
             run_kwargs = {}#orig_args.copy()  # Make a copy so we don't accidentally overwrite
             print(f'\n\n**PROCESSING DATA FOR SITE {site_name.upper()}**\n')
             run_kwargs['input_data'] = site_data
@@ -856,6 +2417,11 @@ def run(input_data, source='file', azimuth_calculation=False, noise_removal=Fals
                 hvsrBatchDict[site_name] = site_data
                 hvsrBatchDict[site_name]['ProcessingStatus']['PPSDStatus']=False
                 hvsrBatchDict[site_name]['ProcessingStatus']['OverallStatus'] = False         
+
+            # Results have been reported/exported, so the large arrays of this site are no longer needed
+            if release_site_data:
+                _release_site_data(hvsrBatchDict[site_name])
+            del site_data, run_kwargs
             
         return HVSRBatch(hvsrBatchDict)
 
@@ -1075,7 +2641,10 @@ def run(input_data, source='file', azimuth_calculation=False, noise_removal=Fals
         for site_name in hvsr_results_interim.keys():  # This should work more or less the same for batch and regular data now
             # Check if data has azimuth data
             hasAz = False
-            if 'stream' in hvsr_results_interim[site_name].keys():
+            for azKey in ['spectral_azimuths', 'radial_azimuths']:
+                if azKey in hvsr_results_interim[site_name].keys() and len(hvsr_results_interim[site_name][azKey]) > 0:
+                    hasAz = True
+            if not hasAz and 'stream' in hvsr_results_interim[site_name].keys():
                 for tr in hvsr_results_interim[site_name]['stream']:
                     if tr.stats.component == 'R':
                         hasAz = True
@@ -1140,7 +2709,7 @@ def run(input_data, source='file', azimuth_calculation=False, noise_removal=Fals
 
 
 # Read data as batch
-def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params=None, verbose=False, **readcsv_getMeta_fetch_kwargs):
+def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params=None, n_workers=1, prefetch_depth=None, read_once=True, verbose=False, **readcsv_getMeta_fetch_kwargs):
     """Function to read data in data as a batch of multiple data files. This is best used through sprit.fetch_data(*args, source='batch', **other_kwargs).
 
     Parameters
@@ -1155,6 +2724,19 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
         Name of parameter column from batch information file. Only used if a batch_type='table' and single parameter column is used, rather than one column per parameter (for single parameter column, parameters are formatted with = between keys/values and , between item pairs), by default None
     batch_params : list, dict, or None, default = None
         Parameters to be used if batch_type='filelist'. If it is a list, needs to be the same length as batch_data. If it is a dict, will be applied to all files in batch_data and will combined with extra keyword arguments caught by **readcsv_getMeta_fetch_kwargs.
+    n_workers : int, optional
+        Number of sites to read at the same time (using a thread pool), by default 1. 
+        Sites are always added to the HVSRBatch object in the order they are listed in batch_data, and the time taken to read each site is printed if verbose=True.
+    prefetch_depth : int or None, optional
+        If None, all sites are read before returning an HVSRBatch object, by default None.
+        If an integer, a generator is returned instead that yields (site_name, HVSRData) tuples in the order listed in batch_data. 
+        Sites are only read as they are needed: up to prefetch_depth sites are read in the background while the current site is being used (if 0, each site is read when it is requested). 
+        This means only a few sites need to be held in memory at once, regardless of the number of sites in the batch (this is how sprit.run() processes batch data).
+    read_once : bool, optional
+        Whether to read each data file only once when several sites (e.g., different time segments of one long record) use the same input_data file, by default True.
+        If True, the file is read (and decoded) when the first of these sites is read, and each site gets the part of the data between its own starttime and endtime 
+        as a slice of the data read from the file (the data is not copied). The data read from the file is released once all the sites that use it have been read.
+        This only applies to sites read with source='file' from a single (obspy-readable) file.
     verbose : bool, optional
         Whether to print information to terminal during batch read, by default False
     **readcsv_getMeta_fetch_kwargs
@@ -1162,8 +2744,9 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
 
     Returns
     -------
-    hvsrBatch
-        HVSRBatch object with each item representing a different HVSRData object
+    hvsrBatch or generator
+        HVSRBatch object with each item representing a different HVSRData object. 
+        If prefetch_depth is specified, a generator of (site_name, HVSRData) tuples is returned instead.
 
     Raises
     ------
@@ -1343,10 +2926,61 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
 
     hvsr_metaDict = {}
     zfillDigs = len(str(len(param_dict_list)))  # Get number of digits of length of param_dict_list
-    i = 0
-    for i, param_dict in enumerate(param_dict_list):
-        # Read the data file into a Stream object
-        input_params_kwargs = {k: v for k, v in locals()['readcsv_getMeta_fetch_kwargs'].items() if k in inspect.signature(input_params).parameters}
+
+    # Get the keyword arguments for a function for a site (values in batch_data override those specified as keyword arguments)
+    def _site_kwargs(fun, param_dict):
+        funKwargs = {k: v for k, v in readcsv_getMeta_fetch_kwargs.items() if k in inspect.signature(fun).parameters}
+        funKwargs.update({k: v for k, v in param_dict.items() if k in inspect.signature(fun).parameters})
+        return funKwargs
+
+    # Find sites that use the same data file, so each of those files only needs to be read once
+    sharedReads = {}
+    siteReadKeys = [None] * len(param_dict_list)
+    if read_once:
+        readKeyCounts = {}
+        for i, param_dict in enumerate(param_dict_list):
+            inputData = _site_kwargs(input_params, param_dict).get('input_data', None)
+            fetchKwargs = _site_kwargs(fetch_data, param_dict)
+            readKwargs = {k: v for k, v in {**readcsv_getMeta_fetch_kwargs, **param_dict}.items() 
+                          if k in inspect.getfullargspec(obspy.read)[0] and k not in ['pathname_or_url', 'starttime', 'endtime', 'nearest_sample']}
+            if str(fetchKwargs.get('source', 'file')).lower() != 'file' or isinstance(inputData, (list, tuple, obspy.Stream, obspy.Trace, HVSRData)):
+                continue
+            inputPath = pathlib.Path(str(inputData))
+            if not inputPath.is_file() or inputPath.suffix.lower() == '.trc':
+                continue
+            readKey = (inputPath.resolve().as_posix(), tuple(sorted([(k, str(v)) for k, v in readKwargs.items()])))
+            siteReadKeys[i] = readKey
+            readKeyCounts[readKey] = readKeyCounts.get(readKey, 0) + 1
+            sharedReads[readKey] = {'read_kwargs': readKwargs, 'lock': threading.Lock(), 'stream': None, 'sites_left': readKeyCounts[readKey]}
+        # Files used by only one site are read as usual
+        for i, readKey in enumerate(siteReadKeys):
+            if readKey is not None and readKeyCounts[readKey] < 2:
+                siteReadKeys[i] = None
+                sharedReads.pop(readKey, None)
+        if verbose and len(sharedReads) > 0:
+            print(f"  {len(sharedReads)} file(s) used by more than one site will only be read once")
+
+    # Get the data read from the file of a site (reading the file if this is the first site that uses it)
+    def _get_shared_stream(readKey):
+        sharedRead = sharedReads[readKey]
+        with sharedRead['lock']:
+            if sharedRead['stream'] is None:
+                sharedRead['stream'] = obspy.read(readKey[0], **sharedRead['read_kwargs'])
+            return sharedRead['stream']
+
+    # Release the data read from a file once all the sites that use it have been read
+    def _release_shared_stream(readKey):
+        sharedRead = sharedReads[readKey]
+        with sharedRead['lock']:
+            sharedRead['sites_left'] -= 1
+            if sharedRead['sites_left'] <= 0:
+                sharedRead['stream'] = None
+
+    # Read each site (this is done concurrently if n_workers > 1)
+    def _read_batch_site(param_dict, read_key=None, site_stream=None):
+        readStart = datetime.datetime.now()
+        siteStatements = []
+        input_params_kwargs = {k: v for k, v in readcsv_getMeta_fetch_kwargs.items() if k in inspect.signature(input_params).parameters}
         input_params_kwargs2 = {k: v for k, v in param_dict.items() if k in inspect.signature(input_params).parameters}
         input_params_kwargs.update(input_params_kwargs2)
 
@@ -1363,13 +2997,20 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
         except Exception as e:
             params['ProcessingStatus']['InputParamsStatus'] = False
             params['ProcessingStatus']['OverallStatus'] = False 
-            verboseStatement.append(f"\t{e}")
+            siteStatements.append(f"\t{e}")
 
-        fetch_data_kwargs = {k: v for k, v in locals()['readcsv_getMeta_fetch_kwargs'].items() if k in inspect.signature(fetch_data).parameters}
+        fetch_data_kwargs = {k: v for k, v in readcsv_getMeta_fetch_kwargs.items() if k in inspect.signature(fetch_data).parameters}
         fetch_data_kwargs2 = {k: v for k, v in param_dict.items() if k in inspect.signature(fetch_data).parameters}
         fetch_data_kwargs.update(fetch_data_kwargs2)
+        if n_workers > 1:
+            # Sites are already being read concurrently
+            fetch_data_kwargs['n_workers'] = 1
         
         try:
+            if read_key is not None:
+                fetch_data_kwargs['shared_stream'] = _get_shared_stream(read_key)
+            elif site_stream is not None:
+                fetch_data_kwargs['shared_stream'] = site_stream
             fdverboseString = '\tfetch_data: <No parameters specified>, '
             for arg, value in fetch_data_kwargs.items():
                 fdverboseString = fdverboseString.replace('<No parameters specified>, ', '')
@@ -1379,15 +3020,35 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
                 
             hvsrData = fetch_data(params=params, **fetch_data_kwargs)
         except Exception as e:
+            hvsrData = params
             hvsrData['ProcessingStatus']['FetchDataStatus'] = False
             hvsrData['ProcessingStatus']['OverallStatus'] = False
-            verboseStatement.append(f"\t{e}")
+            siteStatements.append(f"\t{e}")
+        finally:
+            if read_key is not None:
+                _release_shared_stream(read_key)
+        return hvsrData, ipverboseString, fdverboseString, siteStatements, (datetime.datetime.now() - readStart).total_seconds()
+
+    # Sites cannot be read concurrently if input streams are being plotted (matplotlib is not thread-safe)
+    if readcsv_getMeta_fetch_kwargs.get('plot_input_stream', False):
+        n_workers = 1
+        if prefetch_depth is not None:
+            prefetch_depth = 0
+
+    # Add batch information and processing parameters to a site that has been read
+    def _finish_batch_site(i, param_dict, siteResult):
+        hvsrData, ipverboseString, fdverboseString, siteStatements, siteReadTime = siteResult
+        if siteStatements != []:
+            if len(verboseStatement) > i and isinstance(verboseStatement[i], list):
+                verboseStatement[i].extend(siteStatements)
+            else:
+                verboseStatement.append(siteStatements)
     
         if verbose and hvsrData['ProcessingStatus']['OverallStatus']:
-            print(f"  {hvsrData['site']}")
+            print(f"  {hvsrData['site']} (read in {siteReadTime:.2f} s)")
             print(ipverboseString)
             print(fdverboseString)
-            if verboseStatement != []:
+            if verboseStatement != [] and len(verboseStatement) > i:
                 for item in verboseStatement[i]:
                     print(item)
         elif verbose and not hvsrData['ProcessingStatus']['OverallStatus']:
@@ -1399,7 +3060,7 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
             print(f"  {sitename}")
             print(ipverboseString)
             print(fdverboseString)
-            if verboseStatement != []:
+            if verboseStatement != [] and len(verboseStatement) > i:
                 for item in verboseStatement[i]:
                     print(item)
             print(f"     *{sitename} not read correctly. Processing will not be carried out.")
@@ -1409,7 +3070,6 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
         # This may be redundant
         if hvsrData['site'] == default_dict['site']:  # If site was not designated
             hvsrData['site'] = "{}_{}".format(hvsrData['site'], str(i).zfill(zfillDigs))
-            i += 1
             
         # Get processing parameters for other functions in sprit.run() besides input_params and fetch_data
         if 'processing_parameters' in hvsrData.keys():
@@ -1424,7 +3084,64 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
         hvsrData['processing_parameters'] = processing_parameters
         if 'source' not in hvsrData['processing_parameters']['fetch_data'].keys():
             hvsrData['processing_parameters']['fetch_data']['source'] = 'file'
-        
+        return hvsrData
+
+    # Read sites only as they are needed, keeping up to prefetch_depth sites read ahead of the current site
+    def _iter_batch_sites():
+        if prefetch_depth <= 0:
+            for i, param_dict in enumerate(param_dict_list):
+                hvsrData = _finish_batch_site(i, param_dict, _read_batch_site(param_dict, siteReadKeys[i]))
+                yield hvsrData['site'], hvsrData
+        else:
+            siteQueue = collections.deque()
+            siteIter = enumerate(param_dict_list)
+            # Warning filters are set here rather than in fetch_data() for each site, since they are not thread-safe
+            with _rs_read_warning_filters(), concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(n_workers, prefetch_depth))) as executor:
+                def _submit_next_site():
+                    for i, param_dict in siteIter:
+                        siteQueue.append((i, param_dict, executor.submit(_read_batch_site, param_dict, siteReadKeys[i])))
+                        break
+
+                for _ in range(prefetch_depth):
+                    _submit_next_site()
+
+                while len(siteQueue) > 0:
+                    i, param_dict, siteFuture = siteQueue.popleft()
+                    _submit_next_site()
+                    hvsrData = _finish_batch_site(i, param_dict, siteFuture.result())
+                    del siteFuture
+                    yield hvsrData['site'], hvsrData
+        print()
+        print('Finished reading input data for batch processing')
+
+    if prefetch_depth is not None:
+        return _iter_batch_sites()
+
+    # Tromino files are read together (concurrently, if n_workers > 1), each with the parameters (e.g., start time and station) of its own site
+    trominoSites = []
+    for i, param_dict in enumerate(param_dict_list):
+        inputData = _site_kwargs(input_params, param_dict).get('input_data', None)
+        if str(_site_kwargs(fetch_data, param_dict).get('source', 'file')).lower() != 'file' or isinstance(inputData, (list, tuple, obspy.Stream, obspy.Trace, HVSRData)):
+            continue
+        if 'trc' in pathlib.Path(str(inputData)).suffix and pathlib.Path(str(inputData)).is_file():
+            trominoSites.append(i)
+    trominoStreams = {}
+    if len(trominoSites) > 0:
+        try:
+            trominoParams = [input_params(**_site_kwargs(input_params, param_dict_list[i])) for i in trominoSites]
+            trominoStreams = dict(zip(trominoSites, read_tromino_files([p['input_data'] for p in trominoParams], trominoParams, 
+                                                                       n_workers=n_workers, verbose=verbose)))
+        except Exception:
+            # Each of these sites is then read (and any errors are reported) in fetch_data(), as usual
+            trominoStreams = {}
+
+    # Warning filters are set here rather than in fetch_data() for each site, since they are not thread-safe
+    with _rs_read_warning_filters():
+        siteResults = _threaded_map(lambda i: _read_batch_site(param_dict_list[i], siteReadKeys[i], trominoStreams.get(i, None)), 
+                                    range(len(param_dict_list)), n_workers=n_workers)
+    del trominoStreams
+    for i, param_dict in enumerate(param_dict_list):
+        hvsrData = _finish_batch_site(i, param_dict, siteResults[i])
         hvsr_metaDict[hvsrData['site']] = hvsrData
 
     hvsrBatch = HVSRBatch(hvsr_metaDict)
@@ -1435,8 +3152,10 @@ def batch_data_read(batch_data, batch_type='table', param_col=None, batch_params
 
 
 # Function to generate azimuthal readings from the horizontal components
-def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azimuth_unit='degrees', show_az_plot=False, verbose=False, **plot_azimuth_kwargs):
-    """Function to calculate azimuthal horizontal component at specified angle(s). Adds each new horizontal component as a radial component to obspy.Stream object at hvsr_data['stream']
+def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azimuth_unit='degrees', azimuth_domain='time', add_radial_traces=False, show_az_plot=False, verbose=False, **plot_azimuth_kwargs):
+    """Function to calculate azimuthal horizontal component at specified angle(s). 
+    By default, the azimuths are stored and each radial component is calculated from the N and E data when it is needed (see add_radial_traces).
+    Since the per-azimuth work is done later, this does not use threads (including for HVSRBatch objects); use n_workers in generate_psds() and process_hvsr() instead.
 
     Parameters
     ----------
@@ -1453,6 +3172,19 @@ def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azim
         Angular unit used to specify `azimuth_angle` parameter. By default 'degrees'.
         If 'degrees' (or {'deg', 'd'}), will use degrees.
         If 'radians' (or {'rad', 'r'}), will use radians.
+    azimuth_domain : str, default='time'
+        How the azimuthal (radial) components are calculated, by default 'time'.
+        If 'time', the psds of each radial component (N*cos(azimuth) + E*sin(azimuth)) are calculated from its data in the time domain.
+        If 'spectral' (or {'spectrum', 'frequency', 'freq', 'f'}), no traces are added. Instead, the azimuths are stored in hvsr_data['spectral_azimuths'] 
+        and generate_psds() calculates the N, E, and N-E cross spectra once for each window, then the power of each radial component as
+        cos(az)^2*Pnn + sin(az)^2*Pee + 2*sin(az)*cos(az)*Re(Pne). This gives the same psds (and HV_Curves_<azimuth>/hvsr_az outputs) 
+        at almost no extra cost for each azimuth, so many azimuths (e.g., azimuth_angle=1) can be used.
+        This is only used by generate_psds() with obspy_ppsds=False (the default).
+    add_radial_traces : bool, default=False
+        Only used if azimuth_domain='time'. If False (default), the radial components are not stored. 
+        Instead, the azimuths are stored in hvsr_data['radial_azimuths'] and generate_psds() calculates the radial data of each window from the N and E data,
+        so the stream stays as Z/E/N and memory use does not increase with the number of azimuths.
+        If True, a radial trace is added to hvsr_data['stream'] for each azimuth (always the case if hvsr_data is an obspy.Stream).
     show_az_plot : bool, default=False
         Whether to show azimuthal plot, by default False.
     verbose : bool, default=False
@@ -1461,8 +3193,10 @@ def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azim
     Returns
     -------
     HVSRData
-        Updated HVSRData object specified in hvsr_data with hvsr_data['stream'] attribute containing additional components (EHR-***),
-        with *** being zero-padded (3 digits) azimuth angle in degrees.
+        Updated HVSRData object specified in hvsr_data with hvsr_data['radial_azimuths'] attribute, a dictionary with the names (***) of each azimuth as keys
+        and the azimuth angles in degrees as values, with *** being zero-padded (3 digits) azimuth angle in degrees.
+        If azimuth_domain='spectral', this is stored in hvsr_data['spectral_azimuths'] instead.
+        If add_radial_traces=True, hvsr_data['stream'] contains additional components (EHR-***) instead.
     """
     # Get intput paramaters
     orig_args = locals().copy()
@@ -1482,6 +3216,8 @@ def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azim
                                      
     azimuth_angle = orig_args['azimuth_angle']
     azimuth_unit = orig_args['azimuth_unit']
+    azimuth_domain = orig_args['azimuth_domain']
+    add_radial_traces = orig_args['add_radial_traces']
     show_az_plot = orig_args['show_az_plot']
     verbose = orig_args['verbose']
 
@@ -1577,64 +3313,58 @@ def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azim
             warnings.warn(f"azimuth_type={azimuth_type} not supported. Try 'multiple' or 'single'. No azimuthal analysis run.")
             return hvsr_data
 
-        if isinstance(hvsr_data, (HVSRData, dict)):
-            zComp = hvsr_data['stream'].select(component='Z').merge()
-            eComp = hvsr_data['stream'].select(component='E').merge()
-            nComp = hvsr_data['stream'].select(component='N').merge()
-        elif isinstance(hvsr_data, obspy.Stream):
-            zComp = hvsr_data.select(component='Z').merge()
-            eComp = hvsr_data.select(component='E').merge()
-            nComp = hvsr_data.select(component='N').merge()          
+        # Aligned data of all components (see HVSRData.component_matrix)
+        compMatrix = _get_component_matrix(hvsr_data)
+        zStats = compMatrix.get_stats('Z')
+        eStats = compMatrix.get_stats('E')
+        nStats = compMatrix.get_stats('N')
 
         # Reset stats for original data too
-        zComp[0].stats['azimuth_deg'] = 0
-        eComp[0].stats['azimuth_deg'] = 90
-        nComp[0].stats['azimuth_deg'] = 0
-
-        zComp[0].stats['azimuth_rad'] = 0
-        eComp[0].stats['azimuth_rad'] = np.pi/2
-        nComp[0].stats['azimuth_rad'] = 0
-
-        zComp[0].stats['location'] = '000'
-        eComp[0].stats['location'] = '090'
-        nComp[0].stats['location'] = '000'
-
-        statsDict = {}
-        for key, value in eComp[0].stats.items():
-            statsDict[key] = value
-
+        zStats['azimuth_deg'] = 0
+        eStats['azimuth_deg'] = 90
+        nStats['azimuth_deg'] = 0
+
+        zStats['azimuth_rad'] = 0
+        eStats['azimuth_rad'] = np.pi/2
+        nStats['azimuth_rad'] = 0
+
+        zStats['location'] = '000'
+        eStats['location'] = '090'
+        nStats['location'] = '000'
+
+        # Name of each azimuth (zero-padded angle in degrees), used as the location code of each radial component
+        azimuth_names = [f"{str(round(az_deg,0)).zfill(3)}" for az_deg in azimuth_list_deg]
+
+        spectralDomainList = ['spectral', 'spectrum', 'frequency', 'freq', 'f']
+        if str(azimuth_domain).lower() in spectralDomainList and isinstance(hvsr_data, obspy.Stream):
+            warnings.warn("azimuth_domain='spectral' requires an HVSRData object, time domain radial components will be calculated instead.")
+            azimuth_domain = 'time'
+
+        if str(azimuth_domain).lower() in spectralDomainList:
+            # Radial components are not created here; their psds are calculated from the N/E (cross) spectra in generate_psds()
+            hvsr_data['spectral_azimuths'] = {azName: float(az_deg) for azName, az_deg in zip(azimuth_names, azimuth_list_deg)}
+            azimuth_list = []
+        elif str(azimuth_domain).lower() != 'time':
+            warnings.warn(f"azimuth_domain={azimuth_domain} not supported. Try 'time' or 'spectral'. Time domain radial components will be calculated.")
+
+        if len(azimuth_list) > 0 and not add_radial_traces and not isinstance(hvsr_data, obspy.Stream):
+            # Radial components are not stored; generate_psds() calculates them from the N/E data of each window when they are needed
+            hvsr_data['radial_azimuths'] = {azName: float(az_deg) for azName, az_deg in zip(azimuth_names, azimuth_list_deg)}
+            azimuth_list = []
+
+        # Get combined (bit-packed) mask of horizontal components once for all azimuths
+        if len(azimuth_list) > 0:
+            radialMask = compMatrix.combined_mask(['N', 'E'])
+
+        radialTraces = []
         for i, az_rad in enumerate(azimuth_list):
-            az_deg = azimuth_list_deg[i]
-            statsDict['location'] = f"{str(round(az_deg,0)).zfill(3)}" #Change location name
-            statsDict['channel'] = f"EHR"#-{str(round(az_deg,0)).zfill(3)}" #Change channel name
-            statsDict['azimuth_deg'] = az_deg
-            statsDict['azimuth_rad'] = az_rad
-
-            hasMask = [False, False]
-            if np.ma.is_masked(nComp[0].data):
-                nData = nComp[0].data.data
-                nMask = nComp[0].data.mask
-                hasMask[0] = True
-            else:
-                nData = nComp[0].data
-                nMask = [True] * len(nData)
-
-            if np.ma.is_masked(eComp[0].data):
-                eData = eComp[0].data.data
-                eMask = eComp[0].data.mask
-                hasMask[1] = True
-            else:
-                eData = eComp[0].data
-                eMask = [True] * len(eData)
-
-            # From hvsrpy: horizontal = self.ns._amp * math.cos(az_rad) + self.ew._amp*math.sin(az_rad)
-            if True in hasMask:
-                radial_comp_data = np.ma.array(np.add(nData * np.cos(az_rad), eData * np.sin(az_angle_rad)), mask=list(map(operator.and_, nMask, eMask)))
-            else:
-                radial_comp_data = np.add(nData * np.cos(az_rad), eData * np.sin(az_rad))
-
-            radial_trace = obspy.Trace(data=radial_comp_data, header=statsDict)
+            radial_trace = _radial_trace(compMatrix, azimuth_names[i], azimuth_list_deg[i], azimuth_rad=az_rad, radial_mask=radialMask)
             hvsr_data['stream'].append(radial_trace)
+            radialTraces.append(radial_trace)
+
+        # The radial traces (and their packed mask) are added to the aligned data directly, rather than rebuilding it from the stream
+        if len(radialTraces) > 0 and isinstance(hvsr_data, HVSRData) and compMatrix is getattr(hvsr_data, '_component_matrix', None):
+            compMatrix.append_aligned(radialTraces, [radialMask] * len(radialTraces))
     
     # Verbose printing
     if verbose and not isinstance(hvsr_data, HVSRBatch):
@@ -1653,7 +3383,8 @@ def calculate_azimuth(hvsr_data, azimuth_angle=30, azimuth_type='multiple', azim
 
 # Quality checks, stability tests, clarity tests
 # def check_peaks(hvsr, x, y, index_list, peak, peakm, peakp, hvsr_peaks, stdf, hvsr_log_std, rank, hvsr_band=[0.4, 40], do_rank=False):
-def check_peaks(hvsr_data, hvsr_band=[0.4, 40], peak_selection='max', peak_freq_range=[0.4, 40], azimuth='HV', verbose=False):
+def check_peaks(hvsr_data, hvsr_band=[0.4, 40], peak_selection='max', peak_freq_range=[0.4, 40], azimuth='HV',
+                bootstrap_resamples=0, bootstrap_ci=95, bootstrap_fast=True, bootstrap_seed=None, bootstrap_azimuths=False, verbose=False):
     """Function to run tests on HVSR peaks to find best one and see if it passes quality checks
 
         Parameters
@@ -1668,6 +3399,23 @@ def check_peaks(hvsr_data, hvsr_band=[0.4, 40], peak_selection='max', peak_freq_
             If a numeric value is used (e.g., int or float), this should be a frequency value to manually select as the peak of interest.
         peak_freq_range : tuple or list, default=[0.4, 40];
             The frequency range within which to check for peaks. If there is an HVSR curve with multiple peaks, this allows the full range of data to be processed while limiting peak picks to likely range.
+        bootstrap_resamples : int, default=0
+            Number of bootstrap resamples of the used time windows to use for confidence intervals of the best peak's frequency and amplitude (f0 and A0).
+            For each resample, the median of the resampled H/V curves is calculated and its peak is picked. 
+            If 0 (default), confidence intervals are not calculated. 
+            Otherwise, the confidence intervals are added to the BestPeak of the H/V curve (see bootstrap_azimuths) as 'f0_CI' and 'A0_CI'.
+            With 1000 resamples, this takes roughly 0.1-0.4 seconds per curve on the sample data, depending on the machine.
+        bootstrap_ci : float, default=95
+            Confidence level (in percent) of the bootstrap confidence intervals.
+        bootstrap_fast : bool, default=True
+            If True, the peak of each resample is only picked among the frequencies around the best peak 
+            where the H/V curve is greater than A0/2 (within f0/2 and 2*f0), which is much faster.
+            If False, the peak of each resample is picked within the full peak_freq_range.
+        bootstrap_seed : int or None, default=None
+            Seed for the random number generator used for the bootstrap resamples, for reproducible confidence intervals.
+        bootstrap_azimuths : bool, default=False
+            If False (default), bootstrap confidence intervals are only calculated for the main H/V curve ('HV').
+            If True, they are also calculated for the curve of each azimuth, which takes proportionally longer.
         verbose : bool, default=False
             Whether to print results and inputs to terminal.
         
@@ -1693,6 +3441,11 @@ def check_peaks(hvsr_data, hvsr_band=[0.4, 40], peak_selection='max', peak_freq_
     hvsr_band = orig_args['hvsr_band']
     peak_selection = orig_args['peak_selection']
     peak_freq_range = orig_args['peak_freq_range']
+    bootstrap_resamples = orig_args['bootstrap_resamples']
+    bootstrap_ci = orig_args['bootstrap_ci']
+    bootstrap_fast = orig_args['bootstrap_fast']
+    bootstrap_seed = orig_args['bootstrap_seed']
+    bootstrap_azimuths = orig_args['bootstrap_azimuths']
     verbose = orig_args['verbose']
 
     #if (verbose and 'input_params' not in hvsr_data.keys()) or (verbose and not hvsr_data['batch']):
@@ -1855,6 +3608,16 @@ def check_peaks(hvsr_data, hvsr_band=[0.4, 40], peak_selection='max', peak_freq_
                     bestPeak = {}
                     print(f"No Best Peak identified for {hvsr_data['site']} (azimuth {col_id})")
 
+                # Get bootstrap confidence intervals of f0 and A0, if specified
+                doBootstrap = bootstrap_resamples and (bootstrap_azimuths or col_id == 'HV')
+                if doBootstrap and bestPeak != {} and col_id in hvsr_data['ind_hvsr_curves'].keys():
+                    f0CI, a0CI = __bootstrap_peak_ci(x, y, hvsr_data['ind_hvsr_curves'][col_id], bestPeak,
+                                                     n_resamples=bootstrap_resamples, ci=bootstrap_ci, 
+                                                     peak_freq_range=peak_freq_range, fast=bootstrap_fast, seed=bootstrap_seed)
+                    bestPeak['f0_CI'] = f0CI
+                    bestPeak['A0_CI'] = a0CI
+                    bestPeak['Report']['CI'] = f"{bootstrap_ci:g}% CI (bootstrap, {int(bootstrap_resamples)} resamples): f0 = {f0CI[0]:0.3f}-{f0CI[1]:0.3f} Hz; A0 = {a0CI[0]:0.2f}-{a0CI[1]:0.2f}"
+
                 hvsr_data['BestPeak'][col_id] = bestPeak
         else:
             for i, col_id in enumerate(HVColIDList):
@@ -2241,7 +4004,7 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
                detrend='spline', detrend_options=2, filter_type=None, filter_options={},
                update_metadata=True, 
                plot_input_stream=False, plot_engine='matplotlib', show_plot=True, 
-               verbose=False, **kwargs):
+               target_sampling_rate=None, n_workers=1, verbose=False, **kwargs):
     """Fetch ambient seismic data from a source to read into obspy stream
     
     Parameters
@@ -2284,10 +4047,23 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
         Whether to plot the raw input stream. This plot includes a spectrogram (Z component) and the raw (with decimation for speed) plots of each component signal.
     plot_engine : str, default='matplotlib'
         Which plotting library/engine to use for plotting the Input stream. Options are 'matplotlib', 'plotly', or 'obspy' (not case sensitive).
+    target_sampling_rate : None, float, or 'auto', default=None
+        If None, the data is used at its original sampling rate.
+        If 'auto', the data is decimated (with a zero-phase anti-alias FIR filter) by the largest integer factor that keeps the sampling rate at least 2.5 times the upper limit of hvsr_band.
+        If a number, the data is decimated to that sampling rate (or resampled, with an anti-alias filter, if it is not an integer factor of the original sampling rate).
+        Data is never upsampled. Decimation is done once, after detrending and filtering, so all later processing steps use the lower sampling rate. 
+        The original and new sampling rates are saved in processing_parameters['fetch_data']['decimation'].
+    n_workers : int, default=1
+        Maximum number of files (or, for source='batch', sites) to read at the same time, using a thread pool. 
+        This is used when several files are read: source='raw' and source='dir', a list of files with source='file', and source='batch'.
+        Files are always combined in the same (sorted or input) order, regardless of the order in which they finish reading.
+        The time taken to read each file is stored in the file_read_times attribute ({filepath: seconds}) of the output.
     verbose : bool, default=False
         Whether to print outputs and inputs to the terminal
     **kwargs
-        Keywords arguments, primarily for 'batch' and 'dir' sources
+        Keywords arguments, primarily for 'batch' and 'dir' sources.
+        If shared_stream (obspy.Stream) is specified with source='file', it is used as the data already read from input_data (only the part between starttime and endtime is used), 
+        so the file is not read again. This is used by batch_data_read() when several sites use the same file, and for Tromino (.trc) files, which it reads together.
         
     Returns
     -------
@@ -2297,6 +4073,9 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
     # Get intput paramaters
     orig_args = locals().copy()
     start_time = datetime.datetime.now()
+
+    # Data that has already been read from input_data (see batch_data_read()); this is not saved with the processing parameters
+    sharedStream = kwargs.pop('shared_stream', None)
     
     # Keep track of any updates made to raw input along the way
     update_msg = []
@@ -2324,6 +4103,8 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
     update_metadata=orig_args['update_metadata']
     plot_input_stream=orig_args['plot_input_stream']
     plot_engine=orig_args['plot_engine']
+    target_sampling_rate=orig_args['target_sampling_rate']
+    n_workers=orig_args['n_workers']
     verbose=orig_args['verbose']
     kwargs=orig_args['kwargs']
 
@@ -2443,6 +4224,17 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
         if argName in kwargs.keys():
             obspyReadKwargs[argName] = kwargs[argName]
 
+    # Only read the data between starttime and endtime (if they have been specified) from files
+    readStarttime = readEndtime = None
+    if 'starttime' in obspyReadKwargs.keys() or 'endtime' in obspyReadKwargs.keys():
+        readStarttime = obspyReadKwargs.get('starttime', None)
+        readEndtime = obspyReadKwargs.get('endtime', None)
+    else:
+        if str(params['starttime']) != str(inspect.signature(input_params).parameters['starttime'].default):
+            readStarttime = params['starttime']
+        if str(params['endtime']) != str(inspect.signature(input_params).parameters['endtime'].default):
+            readEndtime = params['endtime']
+
     # Select how reading will be done
     if isinstance(params['input_data'], obspy.Stream):
         rawDataIN = params['input_data'].copy()
@@ -2462,7 +4254,7 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
         if source=='raw':
             try:
                 if inst.lower() in raspShakeInstNameList:
-                    rawDataIN = __read_RS_file_struct(dPath, source, year, doy, inv, params, verbose=verbose)
+                    rawDataIN = __read_RS_file_struct(dPath, source, year, doy, inv, params, n_workers=n_workers, verbose=verbose)
                 elif inst.lower() in trominoNameList:
                     params['instrument'] = 'Tromino'
                     params['params']['instrument'] = 'Tromino'                    
@@ -2473,19 +4265,28 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
             rawDataIN = params['input_data'].copy()
         elif source=='dir':
             if inst.lower() in raspShakeInstNameList:
-                rawDataIN = __read_RS_file_struct(dPath, source, year, doy, inv, params, verbose=verbose)
+                rawDataIN = __read_RS_file_struct(dPath, source, year, doy, inv, params, n_workers=n_workers, verbose=verbose)
             else:
-                obspyFiles = {}
-                for obForm in OBSPY_FORMATS:
-                    temp_file_glob = pathlib.Path(dPath.as_posix().lower()).glob('.'+obForm.lower())
-                    for f in temp_file_glob:
-                        currParams = params
-                        currParams['input_data'] = f
-
-                        curr_data = fetch_data(params, source='file', #all the same as input, except just reading the one file using the source='file'
-                                    data_export_path=data_export_path, data_export_format=data_export_format, detrend=detrend, detrend_options=detrend_options, update_metadata=update_metadata, verbose=verbose, **kwargs)
-                        curr_data.merge()
-                        obspyFiles[f.stem] = curr_data  #Add path object to dict, with filepath's stem as the site name
+                # Each file with an obspy-readable extension is read as a separate site (sorted so the order does not depend on the filesystem)
+                dirFiles = sorted([f for f in pathlib.Path(dPath).iterdir() if f.is_file() and f.suffix[1:].upper() in OBSPY_FORMATS])
+
+                def _fetch_dir_file(f):
+                    currParams = params.copy(type='deep')
+                    currParams['input_data'] = f
+                    currParams['site'] = f.stem
+                    if 'processing_parameters' in currParams.keys():
+                        # Otherwise source='dir' would be read back from processing_parameters
+                        currParams['processing_parameters'].pop('fetch_data', None)
+                    #all the same as input, except just reading the one file using the source='file'
+                    return fetch_data(currParams, source='file', data_export_path=data_export_path, data_export_format=data_export_format, 
+                                      detrend=detrend, detrend_options=detrend_options, filter_type=filter_type, filter_options=filter_options, 
+                                      update_metadata=update_metadata, plot_input_stream=plot_input_stream, plot_engine=plot_engine, show_plot=show_plot, 
+                                      target_sampling_rate=target_sampling_rate, verbose=verbose, **kwargs)
+
+                siteData, readTimes = _read_files(dirFiles, _fetch_dir_file, n_workers=(1 if plot_input_stream else n_workers), verbose=verbose)
+                obspyFiles = {f.stem: sd for f, sd in zip(dirFiles, siteData)}  #Add path object to dict, with filepath's stem as the site name
+                for f, sd in zip(dirFiles, siteData):
+                    sd['file_read_times'] = {str(f): readTimes[str(f)]}
                 return HVSRBatch(obspyFiles)
         elif source == 'file' and str(params['input_data']).lower() not in SAMPLE_LIST:
             # Read the file specified by input_data
@@ -2494,7 +4295,11 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
                 params['instrument'] = 'Tromino'
                 params['params']['instrument'] = 'Tromino'
                 if 'trc' in dPath.suffix:
-                    rawDataIN = read_tromino_files(dPath, params, verbose=verbose, **kwargs)
+                    if isinstance(sharedStream, obspy.Stream):
+                        # The file has already been read for this site (see batch_data_read())
+                        rawDataIN = sharedStream
+                    else:
+                        rawDataIN = read_tromino_files(dPath, params, verbose=verbose, **kwargs)
                 else:
                     try:
                         rawDataIN = obspy.read(dPath)
@@ -2502,10 +4307,8 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
                         raise ValueError(f"{dPath.suffix} is not a a filetype that can be read by SpRIT (via ObsPy)")
             else:
                 if isinstance(dPath, list) or isinstance(dPath, tuple):
-                    rawStreams = []
-                    for datafile in dPath:
-                        rawStream = obspy.read(datafile, **obspyReadKwargs)
-                        rawStreams.append(rawStream) #These are actually streams, not traces
+                    rawStreams, params['file_read_times'] = _read_files(dPath, lambda datafile: obspy.read(datafile, **obspyReadKwargs), 
+                                                                        n_workers=n_workers, verbose=verbose) #These are actually streams, not traces
                     for i, stream in enumerate(rawStreams):
                         if i == 0:
                             rawDataIN = obspy.Stream(stream) #Just in case
@@ -2513,8 +4316,16 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
                             rawDataIN = rawDataIN + stream #This adds a stream/trace to the current stream object
                 elif str(dPath)[:6].lower()=='sample':
                     pass
+                elif isinstance(sharedStream, obspy.Stream):
+                    # The file has already been read; use a slice of it (new traces, but views of the shared data)
+                    rawDataIN = sharedStream.slice(starttime=readStarttime, endtime=readEndtime, nearest_sample=True)
+                    if len(rawDataIN) == 0:
+                        rawDataIN = sharedStream.slice()
                 else:
-                    rawDataIN = obspy.read(dPath, **obspyReadKwargs)#, starttime=obspy.core.UTCDateTime(params['starttime']), endttime=obspy.core.UTCDateTime(params['endtime']), nearest_sample =True)
+                    rawDataIN = _read_data_window(dPath, starttime=readStarttime, endtime=readEndtime, nearest_sample=True, **obspyReadKwargs)
+                    if len(rawDataIN) == 0:
+                        # Times may not have been set to the acquisition date yet; read whole file and trim later
+                        rawDataIN = obspy.read(dPath, **obspyReadKwargs)
                 #import warnings # For some reason not being imported at the start
                 #with warnings.catch_warnings():
                     #warnings.simplefilter(action='ignore', category=UserWarning)
@@ -2523,19 +4334,19 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
             if verbose:
                 print('\nFetching data (fetch_data())')
             batch_data_read_kwargs = {k: v for k, v in kwargs.items() if k in tuple(inspect.signature(batch_data_read).parameters.keys())}
-            params = batch_data_read(batch_data=params['input_data'], verbose=verbose, **batch_data_read_kwargs)
+            params = batch_data_read(batch_data=params['input_data'], n_workers=n_workers, verbose=verbose, **batch_data_read_kwargs)
             params = HVSRBatch(params)
             return params
         elif str(params['input_data']).lower() in SAMPLE_LIST or f"sample{params['input_data'].lower()}" in SAMPLE_LIST:
             SAMPLE_DATA_DIR = pathlib.Path(pkg_resources.resource_filename(__name__, 'resources/sample_data/'))
             if source=='batch':
                 params['input_data'] = SAMPLE_DATA_DIR.joinpath('Batch_SampleData.csv')
-                params = batch_data_read(batch_data=params['input_data'], batch_type='sample', verbose=verbose)
+                params = batch_data_read(batch_data=params['input_data'], batch_type='sample', n_workers=n_workers, verbose=verbose)
                 params = HVSRBatch(params)
                 return params
             elif source=='dir':
                 params['input_data'] = SAMPLE_DATA_DIR.joinpath('Batch_SampleData.csv')
-                params = batch_data_read(batch_data=params['input_data'], batch_type='sample', verbose=verbose)
+                params = batch_data_read(batch_data=params['input_data'], batch_type='sample', n_workers=n_workers, verbose=verbose)
                 params = HVSRBatch(params)
                 return params
             elif source=='file':
@@ -2547,7 +4358,9 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
                     params['input_data'] = SAMPLE_DATA_DIR.joinpath('SampleHVSRSite1_AM.RAC84.00.2023.046_2023-02-15_1704-1734.MSEED')
 
                 dPath = params['input_data']
-                rawDataIN = obspy.read(dPath)#, starttime=obspy.core.UTCDateTime(params['starttime']), endttime=obspy.core.UTCDateTime(params['endtime']), nearest_sample =True)
+                rawDataIN = _read_data_window(dPath, starttime=readStarttime, endtime=readEndtime, nearest_sample=True)
+                if len(rawDataIN) == 0:
+                    rawDataIN = obspy.read(dPath)
                 #import warnings
                 #with warnings.catch_warnings():
                 #    warnings.simplefilter(action='ignore', category=UserWarning)
@@ -2562,7 +4375,11 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
     #Get metadata from the data itself, if not reading raw data
     try:
         # If the data already exists (not reading in raw from RS, for example), get the parameters from the data
-        dataIN = rawDataIN.copy()
+        if isinstance(sharedStream, obspy.Stream) and source == 'file':
+            # Slices of the shared stream are already separate traces, and the shared data itself is never changed in place
+            dataIN = rawDataIN
+        else:
+            dataIN = rawDataIN.copy()
         if source != 'raw':           
             # Use metadata from file for updating: 
             # site
@@ -2648,7 +4465,7 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
                     if verbose:
                         print(f"\t\tStarttime updated to {params['starttime']}")
 
-            # endttime
+            # endtime
             today_Endtime = obspy.UTCDateTime(datetime.datetime(year=datetime.date.today().year, month=datetime.date.today().month,
                                                                  day = datetime.date.today().day,
                                                                 hour=23, minute=59, second=59, microsecond=999999))
@@ -2683,8 +4500,9 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
             params['hvsr_id'] = f"{proj_id}{params['acq_date'].strftime('%Y%m%d')}-{params['starttime'].strftime('%H%M')}-{params['station']}"
             params['params']['hvsr_id'] = f"{proj_id}{params['acq_date'].strftime('%Y%m%d')}-{params['starttime'].strftime('%H%M')}-{params['station']}"
 
-            # Clean up
-            dataIN = dataIN.split()
+            # Clean up (Stream.split() copies the data of every trace, so it is only used if there are gaps)
+            if any(isinstance(tr.data, np.ma.masked_array) for tr in dataIN):
+                dataIN = dataIN.split()
             dataIN = dataIN.trim(starttime=params['starttime'], endtime=params['endtime'])
             dataIN.merge()
     except Exception as e:
@@ -2712,19 +4530,19 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
             #Splits entire stream if any trace is masked_array
             break
 
-    # Detrend data
+    # Detrend and filter data (all components at once)
     if isinstance(params, HVSRBatch):
         pass
     else:
-        dataIN =  __detrend_data(input=dataIN, detrend=detrend, detrend_options=detrend_options, verbose=verbose, source=source)
+        dataIN =  __detrend_data(input=dataIN, detrend=detrend, detrend_options=detrend_options, verbose=verbose, source=source, 
+                                 filter_type=filter_type, filter_options=filter_options)
 
-    # Filter data
+    # Decimate data to the sampling rate needed for the analysis (done once here so later steps use less data)
+    decimationInfo = None
     if isinstance(params, HVSRBatch):
         pass
-    elif filter_type is None:
-        pass
-    else:
-        dataIN.filter_type(type=filter_type, **filter_options)
+    elif target_sampling_rate is not None:
+        dataIN, decimationInfo = __decimate_data(dataIN, target_sampling_rate=target_sampling_rate, hvsr_band=params['hvsr_band'], verbose=verbose)
 
     # Remerge data
     dataIN = dataIN.merge(method=1)
@@ -2762,12 +4580,6 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
     else:
         params['InputPlot'] = None
 
-    # Sort channels (make sure Z is first, makes things easier later)
-    if isinstance(params, HVSRBatch):
-        pass
-    else:
-        dataIN = _sort_channels(input=dataIN, source=source, verbose=verbose)
-
     # Clean up the ends of the data unless explicitly specified to do otherwise (this is a kwarg, not a parameter)
     if 'clean_ends' not in kwargs.keys():
         clean_ends = True 
@@ -2795,14 +4607,26 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
 
         maxStarttime = obspy.UTCDateTime(maxStarttime)
         minEndtime = obspy.UTCDateTime(minEndtime)
-        dataIN = dataIN.split()
+        if any(isinstance(tr.data, np.ma.masked_array) for tr in dataIN):
+            dataIN = dataIN.split()
         for tr in dataIN:
             tr.trim(starttime=maxStarttime, endtime=minEndtime)
             pass
         dataIN.merge()
+
+    # Sort channels (make sure Z is first, makes things easier later)
+    #   This is done after merge(), which restores the trace order using id(), so newly merged traces could otherwise end up in any order
+    if isinstance(params, HVSRBatch):
+        pass
+    else:
+        dataIN = _sort_channels(input=dataIN, source=source, verbose=verbose)
     
     params['batch'] = False # Set False by default, will get corrected later if batch
-    params['input_stream'] = dataIN.copy() # Original stream as read
+    if isinstance(sharedStream, obspy.Stream) and source == 'file':
+        # dataIN is already separate from the shared data (or, if it was not detrended/filtered/decimated, a view of it that is never changed in place)
+        params['input_stream'] = dataIN # Original stream as read
+    else:
+        params['input_stream'] = dataIN.copy() # Original stream as read
     params['stream'] = dataIN.copy() # Stream that may be modified later
     
     if 'processing_parameters' not in params.keys():
@@ -2810,6 +4634,8 @@ def fetch_data(params, source='file', data_export_path=None, data_export_format=
     params['processing_parameters']['fetch_data'] = {}
     for key, value in orig_args.items():
         params['processing_parameters']['fetch_data'][key] = value
+    if decimationInfo is not None:
+        params['processing_parameters']['fetch_data']['decimation'] = decimationInfo
 
     # Attach response data to stream and get paz (for PPSD later)
     # Check if response can be attached
@@ -2915,7 +4741,7 @@ def generate_ppsds(hvsr_data, **gen_psds_kwargs):
 # Generate PSDs for each channel
 def generate_psds(hvsr_data, window_length=30.0, overlap_pct=0.5, 
                    window_type='hann', window_length_method='length', skip_on_gaps=True, num_freq_bins=500, 
-                   obspy_ppsds=False, azimuthal_ppsds=False, verbose=False, plot_psds=False, **obspy_ppsd_kwargs):
+                   obspy_ppsds=False, azimuthal_ppsds=False, n_workers=1, verbose=False, plot_psds=False, **obspy_ppsd_kwargs):
     """Generates PPSDs for each channel
 
         Channels need to be in Z, N, E order
@@ -2927,6 +4753,11 @@ def generate_psds(hvsr_data, window_length=30.0, overlap_pct=0.5,
             Data object containing all the parameters and other data of interest (stream and paz, for example)
         azimuthal_ppsds : bool, default=False
             Whether to generate PPSDs for azimuthal data
+        n_workers : int, default=1
+            Number of threads to use. If hvsr_data is an HVSRBatch object, sites are processed concurrently (unless plot_psds=True), 
+            and any remaining threads are used within each site. Within a site (with obspy_ppsds=False), the psds of the Z, E, and N components are calculated concurrently, 
+            and the windows of azimuths stored by calculate_azimuth() are split between the threads, which all use the same (read-only) N/E data.
+            By default 1 (no concurrency)
         verbose : bool, default=True
             Whether to print inputs and results to terminal
         **obspy_ppsd_kwargs : dict
@@ -2993,6 +4824,7 @@ def generate_psds(hvsr_data, window_length=30.0, overlap_pct=0.5,
                     orig_args[k] = v
 
     azimuthal_ppsds = orig_args['azimuthal_ppsds']
+    n_workers = orig_args['n_workers']
     verbose = orig_args['verbose']
     obspy_ppsd_kwargs = orig_args['obspy_ppsd_kwargs']
 
@@ -3016,21 +4848,31 @@ def generate_psds(hvsr_data, window_length=30.0, overlap_pct=0.5,
 
     if isinstance(hvsr_data, HVSRBatch):
         #If running batch, we'll loop through each one
-        for site_name in hvsr_data.keys():
+        siteNames = list(hvsr_data.keys())
+
+        # Sites are processed concurrently if n_workers > 1 (but not if psds are plotted, since matplotlib is not thread-safe)
+        #   Threads not needed for the sites are used within each site
+        siteWorkers = 1 if plot_psds else max(1, min(int(n_workers), len(siteNames)))
+        def _generate_site_psds(site_name):
             args = orig_args.copy() #Make a copy so we don't accidentally overwrite
             individual_params = hvsr_data[site_name] #Get what would normally be the "hvsr_data" variable for each site
             args['hvsr_data'] = individual_params #reset the hvsr_data parameter we originally read in to an individual site hvsr_data
+            args['n_workers'] = max(1, int(n_workers) // siteWorkers)
             #args['hvsr_data']['batch'] = False #Set to false, since only running this time
-            if hvsr_data[site_name]['ProcessingStatus']['OverallStatus']:
+            if individual_params['ProcessingStatus']['OverallStatus']:
                 try:
-                    hvsr_data[site_name] = __generate_ppsds_batch(**args) #Call another function, that lets us run this function again
+                    return __generate_ppsds_batch(**args) #Call another function, that lets us run this function again
                 except:
-                    hvsr_data[site_name]['ProcessingStatus']['PPSDStatus']=False
-                    hvsr_data[site_name]['ProcessingStatus']['OverallStatus'] = False                     
+                    individual_params['ProcessingStatus']['PPSDStatus']=False
+                    individual_params['ProcessingStatus']['OverallStatus'] = False                     
             else:
-                hvsr_data[site_name]['ProcessingStatus']['PPSDStatus']=False
-                hvsr_data[site_name]['ProcessingStatus']['OverallStatus'] = False                
-            
+                individual_params['ProcessingStatus']['PPSDStatus']=False
+                individual_params['ProcessingStatus']['OverallStatus'] = False                
+            return individual_params
+
+        siteResults = _threaded_map(_generate_site_psds, siteNames, n_workers=siteWorkers)
+        for site_name, site_result in zip(siteNames, siteResults):
+            hvsr_data[site_name] = site_result
             try:
                 sprit_tkinter_ui.update_progress_bars(prog_percent=5)
             except Exception as e:
@@ -3072,6 +4914,16 @@ def _get_obspy_ppsds(hvsr_data,**obspy_ppsd_kwargs):
                 ppsdName = curr_trace.stats.location
                 ppsd_curr.add(rStream)
                 ppsds[ppsdName] = ppsd_curr
+
+        # Radial components stored by calculate_azimuth() as azimuths are created one at a time, only while their PPSD is calculated
+        if 'radial_azimuths' in hvsr_data.keys() and len(hvsr_data['radial_azimuths']) > 0:
+            compMatrix = _get_component_matrix(hvsr_data)
+            radialMask = compMatrix.combined_mask(['N', 'E'])
+            for azName, azDeg in hvsr_data['radial_azimuths'].items():
+                radialTrace = _radial_trace(compMatrix, azName, azDeg, radial_mask=radialMask)
+                ppsd_curr = PPSD(radialTrace.stats, paz['E'], **obspy_ppsd_kwargs)
+                ppsd_curr.add(obspy.Stream([radialTrace]))
+                ppsds[azName] = ppsd_curr
         
         # Add to the input dictionary, so that some items can be manipulated later on, and original can be saved
         hvsr_data['ppsds_obspy'] = ppsds
@@ -3163,35 +5015,36 @@ def _get_obspy_ppsds(hvsr_data,**obspy_ppsd_kwargs):
         return hvsr_data, dfList, colList, common_times
 
     if obspy_ppsds:
+        if 'spectral_azimuths' in hvsr_data.keys() and len(hvsr_data['spectral_azimuths']) > 0:
+            warnings.warn("Azimuths calculated with calculate_azimuth(azimuth_domain='spectral') are only used with obspy_ppsds=False; they will not be included.")
         hvsr_data, dfList, colList, common_times = _get_obspy_ppsds(hvsr_data,**obspy_ppsd_kwargs)
     else:
-        psdDict, common_times = __single_psd_from_raw_data(hvsr_data, window_length=window_length, overlap=overlap_pct, show_psd_plot=False)
+        psdDict, common_times = __single_psd_from_raw_data(hvsr_data, window_length=window_length, overlap=overlap_pct, num_freq_bins=num_freq_bins, show_psd_plot=False, n_workers=n_workers)
 
         #x_freqs, common_times, psdDict = _get_psd_dict(hvsr_data=hvsr_data, window=window_length, overlap=overlap_pct, 
         #                                               num_freq_bins=num_freq_bins, 
         #                                               window_length_method=window_length_method, window_type=window_type, verbose=verbose)
         x_freqs = np.flip(np.logspace(np.log10(hvsr_data['hvsr_band'][0]), np.log10(hvsr_data['hvsr_band'][1]), num_freq_bins))
-        psdDictUpdate = {"Z":np.array([list(np.flip(arr)) for time, arr in psdDict['Z'].items()]),
-                         "E":np.array([list(np.flip(arr)) for time, arr in psdDict['E'].items()]),
-                         "N":np.array([list(np.flip(arr)) for time, arr in psdDict['N'].items()]),
-                         }
+        # Includes radial components, if calculate_azimuth() stored azimuths rather than radial traces
+        psdDictUpdate = {key: np.array([list(np.flip(arr)) for time, arr in psdDict[key].items()]) for key in psdDict.keys()}
 
         hvsr_data['ppsds'] = {'Z':{}, 'E':{}, 'N':{}}
-        for key, item in psdDict.items():
-            currSt = hvsr_data.stream.select(component=key).merge()
+        compMatrix = _get_component_matrix(hvsr_data)
+        for key in ['Z', 'E', 'N']:
+            currStats = compMatrix.get_stats(key)
                       
-            hvsr_data['ppsds'][key]['channel'] = currSt[0].stats.channel
+            hvsr_data['ppsds'][key]['channel'] = currStats.channel
             hvsr_data['ppsds'][key]['current_times_used'] = common_times
-            hvsr_data['ppsds'][key]['delta'] = float(currSt[0].stats.delta)
+            hvsr_data['ppsds'][key]['delta'] = float(currStats.delta)
             #hvsr_data['ppsds'][key]['get_mean'] = np.nanmean(item)
             #hvsr_data['ppsds'][key]['mean'] = np.nanmean(item)
             #hvsr_data['ppsds'][key]['get_mode'] = scipy.stats.mode(item)
             #hvsr_data['ppsds'][key]['mode'] = scipy.stats.mode(item)
-            hvsr_data['ppsds'][key]['id'] = currSt[0].id
+            hvsr_data['ppsds'][key]['id'] = compMatrix.get_id(key)
             hvsr_data['ppsds'][key]['len'] = int(window_length / hvsr_data['ppsds'][key]['delta'])
-            hvsr_data['ppsds'][key]['location'] = currSt[0].stats.location
-            hvsr_data['ppsds'][key]['metadata'] = [currSt[0].stats.response if hasattr(currSt[0].stats, 'response') else None][0]
-            hvsr_data['ppsds'][key]['network'] = currSt[0].stats.network
+            hvsr_data['ppsds'][key]['location'] = currStats.location
+            hvsr_data['ppsds'][key]['metadata'] = [currStats.response if hasattr(currStats, 'response') else None][0]
+            hvsr_data['ppsds'][key]['network'] = currStats.network
             hvsr_data['ppsds'][key]['nfft'] = int(window_length / hvsr_data['ppsds'][key]['delta'])
             hvsr_data['ppsds'][key]['nlap'] = int(overlap_pct*window_length / hvsr_data['ppsds'][key]['delta'])
             hvsr_data['ppsds'][key]['overlap'] = overlap_pct
@@ -3205,13 +5058,22 @@ def _get_obspy_ppsds(hvsr_data,**obspy_ppsd_kwargs):
             hvsr_data['ppsds'][key]['psd_frequencies'] = x_freqs
             hvsr_data['ppsds'][key]['psd_periods'] = 1/x_freqs
             hvsr_data['ppsds'][key]['psd_values'] = psdDictUpdate[key]
-            hvsr_data['ppsds'][key]['sampling_rate'] = currSt[0].stats.sampling_rate
+            hvsr_data['ppsds'][key]['sampling_rate'] = currStats.sampling_rate
             hvsr_data['ppsds'][key]['skip_on_gaps'] = skip_on_gaps
-            hvsr_data['ppsds'][key]['station'] = currSt[0].stats.station
+            hvsr_data['ppsds'][key]['station'] = currStats.station
             hvsr_data['ppsds'][key]['step'] = window_length * (1-overlap_pct)
             hvsr_data['ppsds'][key]['times_data'] = common_times
             hvsr_data['ppsds'][key]['times_gaps'] = [[None, None]]
             hvsr_data['ppsds'][key]['times_processed'] = [[None, None]]
+
+        # Radial components calculated from the N/E data (same information as N, except for the names and psd values)
+        for key in psdDictUpdate.keys():
+            if key not in ['Z', 'E', 'N']:
+                hvsr_data['ppsds'][key] = hvsr_data['ppsds']['N'].copy()
+                hvsr_data['ppsds'][key]['channel'] = hvsr_data['ppsds']['N']['channel'][:-1] + 'R'
+                hvsr_data['ppsds'][key]['location'] = key
+                hvsr_data['ppsds'][key]['id'] = '.'.join([hvsr_data['ppsds'][key]['network'], hvsr_data['ppsds'][key]['station'], key, hvsr_data['ppsds'][key]['channel']])
+                hvsr_data['ppsds'][key]['psd_values'] = psdDictUpdate[key]
             
         hvsr_data['ppsds_obspy'] = {}
         dfList = []
@@ -3329,9 +5191,11 @@ def get_metadata(params, write_path='', update_metadata=True, source=None, **rea
     raspShakeInstNameList = ['raspberry shake', 'shake', 'raspberry', 'rs', 'rs3d', 'rasp. shake', 'raspshake']
     trominoNameList = ['tromino', 'trom', 'trm', 't']
     if params['instrument'].lower() in raspShakeInstNameList:
+        # Metadata files are read using INVENTORY_CACHE, unless an inventory has already been specified
+        invFromMetapath = update_metadata or 'inv' not in params.keys()
         if update_metadata:
             params = _update_shake_metadata(filepath=invPath, params=params, write_path=write_path)
-        params = _read_RS_Metadata(params, source=source)
+        params = _read_RS_Metadata(params, source=source, use_cache=invFromMetapath)
     elif params['instrument'].lower() in trominoNameList:
         params['paz'] = {'Z':{}, 'E':{}, 'N':{}}
         #THESE VALUES ARE PLACEHOLDERS, taken from RASPBERRY SHAKE! (Needed for PPSDs)
@@ -3405,7 +5269,10 @@ def get_metadata(params, write_path='', update_metadata=True, source=None, **rea
                 readInvKwargs[argName] = read_inventory_kwargs[argName]
 
         readInvKwargs['path_or_file_object'] = invPath
-        params['inv'] = obspy.read_inventory(invPath)
+        if invPath and pathlib.Path(invPath).is_file():
+            params['inv'] = INVENTORY_CACHE.get(invPath, read_fun=obspy.read_inventory)
+        else:
+            params['inv'] = obspy.read_inventory(invPath)
         if 'params' in params.keys():
             params['params']['inv'] = params['inv']
 
@@ -4088,7 +5955,7 @@ def input_params(input_data,
 
 
 # Plot Azimuth data
-def plot_azimuth(hvsr_data, fig=None, ax=None, show_azimuth_peaks=False, interpolate_azimuths=True, show_azimuth_grid=False, show_plot=True, **plot_azimuth_kwargs):
+def plot_azimuth(hvsr_data, fig=None, ax=None, show_azimuth_peaks=False, interpolate_azimuths=True, show_azimuth_grid=False, show_plot=True, plot_engine='matplotlib', **plot_azimuth_kwargs):
     """Function to plot azimuths when azimuths are calculated
 
     Parameters
@@ -4103,11 +5970,16 @@ def plot_azimuth(hvsr_data, fig=None, ax=None, show_azimuth_peaks=False, interpo
         It takes a lot of time to process the data, but interpolation for vizualization can happen fairly fast. By default True.
     show_azimuth_grid : bool, optional
         Whether to display the grid on the chart, by default False
+    show_plot : bool, optional
+        Whether to show the plot, by default True
+    plot_engine : str, optional
+        Which engine to use for plotting, "matplotlib" (default) or "plotly" (or 'plty', 'p'). 
+        Both use the polar grid cached in hvsr_data.azimuth_grid, so it is only calculated the first time the azimuths are plotted.
 
     Returns
     -------
     matplotlib.Figure, matplotlib.Axis
-        Figure and axis of resulting azimuth plot
+        Figure and axis of resulting azimuth plot (if plot_engine is plotly, a plotly Figure and None)
     """
     orig_args = locals().copy() #Get the initial arguments
 
@@ -4122,56 +5994,26 @@ def plot_azimuth(hvsr_data, fig=None, ax=None, show_azimuth_peaks=False, interpo
                     hvsr_data['Azimuth_Fig'] = __plot_azimuth_batch(**args) #Call another function, that lets us run this function again
                 except:
                     print(f"ERROR: {site_name} will not have azimuths plotted.")
+    elif isinstance(hvsr_data, HVSRData) and str(plot_engine).lower() in ['plotly', 'plty', 'p']:
+        fig = sprit_plot.plot_azimuth(hvsr_data, fig=fig, show_azimuth_peaks=show_azimuth_peaks, interpolate_azimuths=interpolate_azimuths, 
+                                      show_azimuth_grid=show_azimuth_grid, show_plot=show_plot)
+        hvsr_data['AzimuthFig'] = fig
+        ax = None
     elif isinstance(hvsr_data, HVSRData):
         if fig is None:
             fig = plt.figure()
 
         hvsr_band = hvsr_data.hvsr_band
 
-        azDataList = []
-        azExtraDataList = []
-
-        for k in sorted(hvsr_data.hvsr_az.keys()):
-            currData = hvsr_data.hvsr_az[k]
-            azDataList.append(currData)
-            azExtraDataList.append(currData)
-        
-            
-        freq = hvsr_data.x_freqs['Z'].tolist()[1:]
-        a = np.deg2rad(np.array(sorted(hvsr_data.hvsr_az.keys())).astype(float))
-        b = a + np.pi
-
-        z = np.array(azDataList)
-        z2 =np.array(azExtraDataList)
-
-        def interp_along_theta(orig_array, orig_ind):
-            newArrayList = []
-            for a1 in orig_array.T:
-                # Resample the array along the first dimension using numpy.interp
-                newZ = np.interp(
-                    np.linspace(np.pi/180, np.pi, 180),  # New indices
-                    orig_ind,  # Original indices
-                    a1)
-                newArrayList.append(newZ)
-            return np.array(newArrayList).T
-
         if 'plot_type' in plot_azimuth_kwargs.keys():
             if 'i' in plot_azimuth_kwargs['plot_type']:
                 interpolate_azimuths = True
             if '-i' in plot_azimuth_kwargs['plot_type']:
                 interpolate_azimuths = False
 
-
-        if interpolate_azimuths:
-            z = interp_along_theta(z, a)
-            z2 = interp_along_theta(z2, a)
-
-            a =  np.linspace(np.deg2rad(1), np.pi, 180)
-            b = (a + np.pi).tolist()
-            a = a.tolist()
-
-        r, th = np.meshgrid(freq, a)
-        r2, th2 = np.meshgrid(freq, b)
+        # Polar grid (and interpolated meshes) are cached on hvsr_data, so they are only calculated the first time the azimuths are plotted
+        azGrid = hvsr_data.azimuth_grid
+        (th, r, z), (th2, r2, z2) = azGrid.mesh(interpolate=interpolate_azimuths)
 
         # Set up plot
         if ax is None:
@@ -4210,11 +6052,8 @@ def interp_along_theta(orig_array, orig_ind):
             show_azimuth_grid = True
 
         if show_azimuth_peaks:
-            peakVals = []
-            peakThetas = []
-            for k in sorted(hvsr_data.hvsr_az.keys()):
-                peakVals.append(hvsr_data.BestPeak[k]['f0'])
-                peakThetas.append(int(k))
+            peakVals = [hvsr_data.BestPeak[k]['f0'] for k in azGrid.azimuth_names]
+            peakThetas = azGrid.azimuths_deg.tolist()
             peakThetas = peakThetas + (180 + np.array(peakThetas)).tolist()
             peakThetas = np.deg2rad(peakThetas).tolist()
             peakVals = peakVals + peakVals
@@ -4654,7 +6493,7 @@ def plot_stream(stream, params, fig=None, axes=None, show_plot=False, ylim_std=0
 
 
 # Main function for processing HVSR Curve
-def process_hvsr(hvsr_data, horizontal_method=None, smooth=True, freq_smooth='konno ohmachi', f_smooth_width=40, resample=True, outlier_curve_rmse_percentile=False, azimuth=None, verbose=False):
+def process_hvsr(hvsr_data, horizontal_method=None, smooth=True, freq_smooth='konno ohmachi', f_smooth_width=40, resample=True, outlier_curve_rmse_percentile=False, azimuth=None, n_workers=1, verbose=False):
     """Process the input data and get HVSR data
     
     This is the main function that uses other (private) functions to do 
@@ -4699,6 +6538,11 @@ def process_hvsr(hvsr_data, horizontal_method=None, smooth=True, freq_smooth='ko
         Otherwise, float of percentile used as rmse_thresh of remove_outlier_curve().
     azimuth : float, default = None
         The azimuth angle to use when method is single azimuth.
+    n_workers : int, default = 1
+        Number of threads to use, by default 1. 
+        The resampling/smoothing of each component (Z, E, N, and each azimuth) is done in a separate thread, 
+        so this mostly helps when many azimuths have been calculated.
+        If hvsr_data is an HVSRBatch object, up to this many sites are processed concurrently, and any remaining threads are used within each site.
     verbose : bool, defualt=False
         Whether to print output to terminal
 
@@ -4729,6 +6573,7 @@ def process_hvsr(hvsr_data, horizontal_method=None, smooth=True, freq_smooth='ko
     f_smooth_width = orig_args['f_smooth_width']
     resample = orig_args['resample']
     outlier_curve_rmse_percentile = orig_args['outlier_curve_rmse_percentile']
+    n_workers = orig_args['n_workers']
     verbose = orig_args['verbose']
 
     if (verbose and isinstance(hvsr_data, HVSRBatch)) or (verbose and not hvsr_data['batch']):
@@ -4754,22 +6599,24 @@ def process_hvsr(hvsr_data, horizontal_method=None, smooth=True, freq_smooth='ko
     # PROCESSING STARTS HERE (SEPARATE LOOP FOR BATCH)
     #Site is in the keys anytime it's not batch
     if isinstance(hvsr_data, HVSRBatch):
-        #If running batch, we'll loop through each site
-        hvsr_out = {}
-        for site_name in hvsr_data.keys():
+        #If running batch, we'll loop through each site (concurrently, if n_workers > 1)
+        #   Threads not needed for the sites are used within each site
+        siteNames = list(hvsr_data.keys())
+        siteWorkers = max(1, min(int(n_workers), len(siteNames)))
+        def _process_site(site_name):
             args = orig_args.copy() #Make a copy so we don't accidentally overwrite
             args['hvsr_data'] = hvsr_data[site_name] #Get what would normally be the "hvsr_data" variable for each site
+            args['n_workers'] = max(1, int(n_workers) // siteWorkers)
             if hvsr_data[site_name]['ProcessingStatus']['OverallStatus']:
                 try:
-                    hvsr_out[site_name] = __process_hvsr_batch(**args) #Call another function, that lets us run this function again
+                    return __process_hvsr_batch(**args) #Call another function, that lets us run this function again
                 except:
-                    hvsr_out = hvsr_data
-                    hvsr_out[site_name]['ProcessingStatus']['HVStatus']=False
-                    hvsr_out[site_name]['ProcessingStatus']['OverallStatus'] = False                    
-            else:
-                hvsr_out = hvsr_data
-                hvsr_out[site_name]['ProcessingStatus']['HVStatus']=False
-                hvsr_out[site_name]['ProcessingStatus']['OverallStatus'] = False
+                    pass
+            hvsr_data[site_name]['ProcessingStatus']['HVStatus']=False
+            hvsr_data[site_name]['ProcessingStatus']['OverallStatus'] = False
+            return hvsr_data[site_name]
+
+        hvsr_out = dict(zip(siteNames, _threaded_map(_process_site, siteNames, n_workers=siteWorkers)))
         hvsr_out = HVSRBatch(hvsr_out)
         hvsr_out = _check_processing_status(hvsr_out, start_time=start_time, func_name=inspect.stack()[0][3], verbose=verbose)
         return hvsr_out
@@ -4803,65 +6650,77 @@ def move_avg(y, box_pts):
         y_smooth = np.convolve(y, box, mode='same') / sum(box)
         return y_smooth
 
-    for k in ppsds.keys():
+    xValMin_per = np.round(1/hvsr_data['hvsr_band'][1], 4)
+    xValMax_per = np.round(1/hvsr_data['hvsr_band'][0], 4)
+
+    #if reasmpling has been selected
+    doResample = resample is True or type(resample) is int or type(resample) is float
+    if doResample:
+        if resample is True:
+            resample = 1000 #Default smooth value
+
+        if smooth or isinstance(smooth, (int, float)):
+            if smooth:
+                smooth = 51 #Default smoothing window
+                padVal = 25
+            elif smooth % 2==0:
+                smooth +1 #Otherwise, needs to be odd
+                padVal = smooth//2
+                if padVal %2 == 0:
+                    padVal += 1
+
+    # Each component/azimuth is resampled independently, so they can be done in separate threads
+    def resample_component(k):
         #input_ppsds = ppsds[k]['psd_values'] #original, not used anymore
         input_ppsds = np.stack(hvsrDF['psd_values_'+k].values)
 
         #currPPSDs = hvsrDF['psd_values_'+k][hvsrDF['Use']].values
         #used_ppsds = np.stack(currPPSDs)
 
-        xValMin_per = np.round(1/hvsr_data['hvsr_band'][1], 4)
-        xValMax_per = np.round(1/hvsr_data['hvsr_band'][0], 4)
-        
-        #if reasmpling has been selected
-        if resample is True or type(resample) is int or type(resample) is float:
-            if resample is True:
-                resample = 1000 #Default smooth value
-
+        if doResample:
             #xValMin_per = min(ppsds[k]['period_bin_centers'])
             #xValMax_per = max(ppsds[k]['period_bin_centers'])
 
             #Resample period bin values
-            #print('resample, prelogspace', x_periods[k].shape)
-            x_periods[k] = np.logspace(np.log10(xValMin_per), np.log10(xValMax_per), num=resample)
-            if smooth or isinstance(smooth, (int, float)):
-                if smooth:
-                    smooth = 51 #Default smoothing window
-                    padVal = 25
-                elif smooth % 2==0:
-                    smooth +1 #Otherwise, needs to be odd
-                    padVal = smooth//2
-                    if padVal %2 == 0:
-                        padVal += 1
+            xPeriods = np.logspace(np.log10(xValMin_per), np.log10(xValMax_per), num=resample)
 
             #Resample raw ppsd values
             for i, ppsd_t in enumerate(input_ppsds):
                 if i==0:
-                    psdRaw[k] = np.interp(x_periods[k], ppsds[k]['period_bin_centers'], ppsd_t)
+                    kPSDRaw = np.interp(xPeriods, ppsds[k]['period_bin_centers'], ppsd_t)
                     if smooth is not False:
-                        padRawKPad = np.pad(psdRaw[k], [padVal, padVal], mode='reflect')
+                        padRawKPad = np.pad(kPSDRaw, [padVal, padVal], mode='reflect')
                         #padRawKPadSmooth = scipy.signal.savgol_filter(padRawKPad, smooth, 3)
                         padRawKPadSmooth = move_avg(padRawKPad, smooth)
-                        psdRaw[k] = padRawKPadSmooth[padVal:-padVal]
+                        kPSDRaw = padRawKPadSmooth[padVal:-padVal]
 
                 else:
-                    psdRaw[k] = np.vstack((psdRaw[k], np.interp(x_periods[k], ppsds[k]['period_bin_centers'], ppsd_t)))
+                    kPSDRaw = np.vstack((kPSDRaw, np.interp(xPeriods, ppsds[k]['period_bin_centers'], ppsd_t)))
                     if smooth is not False:
-                        padRawKiPad = np.pad(psdRaw[k][i], [padVal, padVal], mode='reflect')
+                        padRawKiPad = np.pad(kPSDRaw[i], [padVal, padVal], mode='reflect')
                         #padRawKiPadSmooth = scipy.signal.savgol_filter(padRawKiPad, smooth, 3)
                         padRawKiPadSmooth = move_avg(padRawKiPad, smooth)
-                        psdRaw[k][i] = padRawKiPadSmooth[padVal:-padVal]
+                        kPSDRaw[i] = padRawKiPadSmooth[padVal:-padVal]
 
         else:
             #If no resampling desired
             #x_periods[k] = np.array(ppsds[k]['period_bin_centers'])
-            x_periods[k] =  np.array(ppsds[k]['period_bin_centers'])#[:-1]#np.round([1/p for p in hvsr_data['ppsds'][k]['period_xedges'][:-1]], 3)
+            xPeriods =  np.array(ppsds[k]['period_bin_centers'])#[:-1]#np.round([1/p for p in hvsr_data['ppsds'][k]['period_xedges'][:-1]], 3)
 
             # Clean up edge freq. values
-            x_periods[k][0] = 1/hvsr_data['hvsr_band'][1]
-            x_periods[k][-1] = 1/hvsr_data['hvsr_band'][0]
-            psdRaw[k] = np.array(input_ppsds)
-        
+            xPeriods[0] = 1/hvsr_data['hvsr_band'][1]
+            xPeriods[-1] = 1/hvsr_data['hvsr_band'][0]
+            kPSDRaw = np.array(input_ppsds)
+
+        return xPeriods, kPSDRaw
+
+    componentKeys = list(ppsds.keys())
+    resampledComponents = _threaded_map(resample_component, componentKeys, n_workers=n_workers)
+
+    # Results are written back in key order, so output does not depend on n_workers
+    for k, (xPeriods, kPSDRaw) in zip(componentKeys, resampledComponents):
+        x_periods[k] = xPeriods
+        psdRaw[k] = kPSDRaw
         hvsrDF['psd_values_'+k] = list(psdRaw[k])
         use = hvsrDF['Use'].astype(bool)
 
@@ -4882,7 +6741,11 @@ def move_avg(y, box_pts):
         horizontal_method = 3 # Geometric mean is used as default if nothing is specified
 
     # If an azimuth has been calculated and it's only one, automatically use the single azimuth method
-    if len(hvsr_data.stream.merge().select(component='R')) == 1:
+    numAzimuths = len(_get_component_matrix(hvsr_data).rows('R'))
+    for azKey in ['spectral_azimuths', 'radial_azimuths']:
+        if azKey in hvsr_data.keys():
+            numAzimuths += len(hvsr_data[azKey])
+    if numAzimuths == 1:
         horizontal_method = 8 # Single azimuth
 
     # horizontal_method needs to be str or int
@@ -4944,13 +6807,11 @@ def move_avg(y, box_pts):
             warnings.warn('No frequency smoothing is being applied. This is not recommended for noisy datasets.')
     elif freq_smooth is True or (freq_smooth.lower() in freq_smooth_ko and (not not f_smooth_width and not not freq_smooth)):
         from obspy.signal import konnoohmachismoothing
-        for k in hvsr_out['psd_raw']:
-            colName = f'psd_values_{k}'
 
-            psd_data = np.stack(hvsr_out['hvsr_windows_df'][colName])
+        # Smoothing of each component/azimuth is independent, so it can be done in separate threads
+        def ko_smooth_component(k):
             psd_data = hvsr_out['psd_raw'][k]
 
-
             freqs = hvsr_out['x_freqs'][k]
             padding_length = int(f_smooth_width)
 
@@ -4968,18 +6829,24 @@ def move_avg(y, box_pts):
             right_padding = [freqs[-1] * (ratio ** i) for i in range(1, padding_length + 1)]
             padded_freqs = np.concatenate([left_padding, freqs, right_padding])
             
-            #Filter out UserWarning for just this method, since it throws up a UserWarning that doesn't really matter about dtypes often
-            with warnings.catch_warnings():
-                #warnings.simplefilter('ignore', category=UserWarning)
-                padded_ppsd_data = padded_ppsd_data.astype(padded_freqs.dtype) # Make them the same datatype
-                padded_ppsd_data = np.round(padded_ppsd_data, 12) # Prevent overflows
-                padded_freqs = np.round(padded_freqs, 9)
+            padded_ppsd_data = padded_ppsd_data.astype(padded_freqs.dtype) # Make them the same datatype
+            padded_ppsd_data = np.round(padded_ppsd_data, 12) # Prevent overflows
+            padded_freqs = np.round(padded_freqs, 9)
 
-                smoothed_ppsd_data = konnoohmachismoothing.konno_ohmachi_smoothing(padded_ppsd_data, padded_freqs, 
-                                                    bandwidth=f_smooth_width, normalize=True)
+            smoothed_ppsd_data = konnoohmachismoothing.konno_ohmachi_smoothing(padded_ppsd_data, padded_freqs, 
+                                                bandwidth=f_smooth_width, normalize=True)
             
             # Only use the original, non-padded data
-            smoothed_ppsd_data = smoothed_ppsd_data[:,padding_length:-1*padding_length]
+            return smoothed_ppsd_data[:,padding_length:-1*padding_length]
+
+        componentKeys = list(hvsr_out['psd_raw'].keys())
+        #Filter out UserWarning for just this method, since it throws up a UserWarning that doesn't really matter about dtypes often
+        # (warning filters are process-wide, so they are set here rather than in each thread)
+        with warnings.catch_warnings():
+            #warnings.simplefilter('ignore', category=UserWarning)
+            smoothedComponents = _threaded_map(ko_smooth_component, componentKeys, n_workers=n_workers)
+        for k, smoothed_ppsd_data in zip(componentKeys, smoothedComponents):
+            colName = f'psd_values_{k}'
             hvsr_out['psd_raw'][k] = smoothed_ppsd_data
             hvsr_out['hvsr_windows_df'][colName] = pd.Series(list(smoothed_ppsd_data), index=hvsr_out['hvsr_windows_df'].index)
     elif freq_smooth.lower() in freq_smooth_constant:
@@ -5109,63 +6976,69 @@ def move_avg(y, box_pts):
 
 
 # Read data from Tromino
-def read_tromino_files(input_data, params, struct_format='H', sampling_rate=128, start_byte=24576, verbose=False, **kwargs):
+def read_tromino_files(input_data, params, struct_format='H', sampling_rate=128, start_byte=24576, n_workers=1, verbose=False, **kwargs):
     """Function to read data from tromino. Specifically, this has been lightly tested on Tromino 3G+ machines
 
     Parameters
     ----------
-    input_data : str, pathlib.Path()
-        The input parameter _datapath_ from sprit.input_params()
-    params : HVSRData or HVSRBatch
-        The parameters as read in from input_params() and and fetch_data()
+    input_data : str, pathlib.Path(), or list
+        The input parameter _datapath_ from sprit.input_params(). 
+        If a list or tuple of filepaths, each file is read (concurrently, if n_workers > 1) and a list of obspy.Stream objects is returned, in the same order as input_data.
+    params : HVSRData, HVSRBatch, or list
+        The parameters as read in from input_params() and and fetch_data(). 
+        If input_data is a list, this must be a list of the same length, with the parameters (e.g., acq_date, starttime, and station) of each file.
+    struct_format : str, optional
+        Format character (as used by the struct module or numpy.dtype) of each value in the file, by default 'H' (unsigned short, 2 bytes). 
+        Values are read as little-endian, unless a byte order character (e.g., '>H') is included.
+    sampling_rate : int, optional
+        Sampling rate of the data, by default 128
+    start_byte : int, optional
+        Index of the first value (not byte) in the file that is data, rather than header information, by default 24576
+    n_workers : int, optional
+        Number of threads to use to read files, if input_data is a list of files, by default 1
     verbose : bool, optional
         Whether to print results to terminal, by default False
 
     Returns
     -------
-    obspy.Stream
-        An obspy.Stream object containing the trace data from the Tromino instrument
+    obspy.Stream or list
+        An obspy.Stream object containing the trace data from the Tromino instrument (or a list of obspy.Stream objects, if input_data is a list)
     """
-    dPath = input_data
+    if isinstance(input_data, (list, tuple)):
+        # Each file has its own start time (and station), so each file needs its own parameters
+        if not isinstance(params, (list, tuple)) or len(params) != len(input_data):
+            raise ValueError(f"If input_data is a list of files, params must be a list of the same length (one for each file), not {type(params)}")
+        return _threaded_map(lambda fileParams: read_tromino_files(fileParams[0], fileParams[1], struct_format=struct_format, sampling_rate=sampling_rate, 
+                                                                   start_byte=start_byte, verbose=verbose, **kwargs),
+                             list(zip(input_data, params)), n_workers=n_workers)
 
-    strucSizes = {'c':1, 'b':1,'B':1, '?':1,
-                'h':2,'H':2,'e':2,
-                'i':4,'I':4,'l':4,'L':4,'f':4,
-                'q':8,'Q':8,'d':8,
-                'n':8,'N':8,'s':16,'p':16,'P':16,'x':16}
+    dPath = input_data
 
     #H (pretty sure it's Q) I L or Q all seem to work (probably not Q?)
+    # Values are little-endian unless struct_format specifies the byte order, so files are read the same way on any machine
     structFormat = struct_format
-    structSize = strucSizes[structFormat]
-
-    dataList = []
-    with open(dPath, 'rb') as f:
-        while True:
-            data = f.read(structSize)  # Read 4 bytes
-            if not data:  # End of file
-                break
-            value = struct.unpack(structFormat, data)[0]  # Interpret as a float
-            dataList.append(value)
-     
-    import numpy as np
-    dataArr = np.array(dataList)
-    import matplotlib.pyplot as plt
+    if structFormat[0] not in '<>=!@':
+        structFormat = '<' + structFormat
+    dataType = np.dtype(structFormat.replace('!', '>').replace('@', '='))
+
+    # Map file to array of values (no data is read into memory until it is used); any incomplete value at end of file is ignored
+    nValues = os.path.getsize(dPath) // dataType.itemsize
+    if nValues > 0:
+        dataArr = np.memmap(dPath, dtype=dataType, mode='r', offset=0, shape=(nValues,))
+    else:
+        dataArr = np.empty(0, dtype=dataType)
 
     medVal = np.nanmedian(dataArr[50000:100000])
 
     if 'start_byte' in kwargs.keys():
         start_byte = kwargs['start_byte']
 
+    # Data values are interleaved (comp1, comp2, comp3, comp1,...): de-interleave using strided views of the mapped file
     startByte = start_byte
     comp1 = dataArr[startByte::3] - medVal
     comp2 = dataArr[startByte+1::3] - medVal
     comp3 = dataArr[startByte+2::3] - medVal
-    headerBytes = dataArr[:startByte]
-
-    #fig, ax = plt.subplots(3, sharex=True, sharey=True)
-    #ax[0].plot(comp1, linewidth=0.1, c='k')
-    #ax[1].plot(comp2, linewidth=0.1, c='k')
-    #ax[2].plot(comp3, linewidth=0.1, c='k')
+    del dataArr
 
     if 'sampling_rate' in kwargs.keys():
         sampling_rate = kwargs['sampling_rate']
@@ -5207,7 +7080,7 @@ def remove_noise(hvsr_data, remove_method=None,
                  sta=2, lta=30, stalta_thresh=[8, 16], 
                  std_ratio_thresh=2.0, std_window_size=20.0, min_std_win=5.0,
                  warmup_time=0, cooldown_time=0, min_win_size=1,
-                 remove_raw_noise=False, show_stalta_plot=False, verbose=False):
+                 remove_raw_noise=False, show_stalta_plot=False, n_workers=1, verbose=False):
     """Function to remove noisy windows from data, using various methods.
     
     Methods include 
@@ -5255,13 +7128,21 @@ def remove_noise(hvsr_data, remove_method=None,
         The minumum size a window must be over specified threshold (in seconds) for it to be removed
     remove_raw_noise : bool, default=False
         If remove_raw_noise=True, will perform operation on raw data ('input_stream'), rather than potentially already-modified data ('stream').
+    n_workers : int, default=1
+        Number of threads to use for noise removal. If greater than 1, the components of the stream are evaluated concurrently by each method
+        and, for remove_method='auto', the antitrigger, noise threshold, and warmup/cooldown methods are evaluated at the same time on the input data 
+        (the saturation threshold method is evaluated afterwards, since it depends on the data removed by the antitrigger and noise threshold methods).
+        The windows identified by each method are then combined and removed from the data in a single step, which gives the same result as n_workers=1.
+        If show_stalta_plot is not False, the methods in 'auto' are run one after another, as with n_workers=1.
     verbose : bool, default=False
         Whether to print status of remove_noise
 
     Returns
     -------
     output : dict
-        Dictionary similar to hvsr_data, but containing modified data with 'noise' removed
+        Dictionary similar to hvsr_data, but containing modified data with 'noise' removed.
+        The removed windows are stored in output['removed_windows'] (IntervalSet), and output['stream_edited'] is the stream with those windows masked
+        (for HVSRData objects, this masked stream is only created when it is first accessed).
     """
     #Get intput paramaters
     orig_args = locals().copy()
@@ -5290,6 +7171,7 @@ def remove_noise(hvsr_data, remove_method=None,
     cooldown_time = orig_args['cooldown_time']
     min_win_size = orig_args['min_win_size']
     remove_raw_noise = orig_args['remove_raw_noise']
+    n_workers = orig_args['n_workers']
     verbose = orig_args['verbose']
 
     if (verbose and isinstance(hvsr_data, HVSRBatch)) or (verbose and not hvsr_data['batch']):
@@ -5352,15 +7234,31 @@ def remove_noise(hvsr_data, remove_method=None,
     # Which stream to use (input, or current)
     if isinstance(hvsr_data, (HVSRData, dict)):
         if remove_raw_noise:
-            inStream = hvsr_data['input_stream'].copy()
+            sourceStream = hvsr_data['input_stream']
         else:
-            inStream = hvsr_data['stream'].copy()
+            sourceStream = hvsr_data['stream']
+        # The traces are copied, but their data arrays are shared, since the noise removal methods return new (masked) arrays rather than changing them.
+        #   This way, cached characteristic functions (see STALTACache) can be found for the same data in later calls
+        inStream = obspy.Stream([obspy.Trace(data=tr.data, header=tr.stats.copy()) for tr in sourceStream])
         output = hvsr_data#.copy()
     else:
         inStream = hvsr_data.copy()
         output = inStream.copy()
 
-    outStream = inStream
+    # The windows removed by each method are combined, rather than masking a copy of the stream for each method.
+    #   The stream is only masked for a method if data has already been removed (some methods depend on the data that is left), 
+    #   and the masked stream_edited is only created when it is used (see HVSRData.stream_edited)
+    removeWindows = IntervalSet()
+    def _edited_stream():
+        if len(removeWindows) == 0:
+            return inStream
+        return removeWindows.apply(inStream)
+
+    # Characteristic functions for the antitrigger method are cached on the HVSRData object (see HVSRData.stalta_cache)
+    cftCache = None
+    if isinstance(output, HVSRData):
+        cftCache = output.stalta_cache
+        cftCache.prune(inStream)  # Discard anything not calculated from the current data
 
     # Get remove_method into consistent format (list)
     if isinstance(remove_method, str):
@@ -5437,7 +7335,7 @@ def remove_noise(hvsr_data, remove_method=None,
                     else:
                         output = _select_windows(output)
                     window_list = output['x_windows_out']
-                if isinstance(outStream, obspy.core.stream.Stream):
+                if isinstance(inStream, obspy.core.stream.Stream):
                     if window_list is not None:
                         output['stream'] = __remove_windows(inStream, window_list, warmup_time)
                     else:
@@ -5447,24 +7345,40 @@ def remove_noise(hvsr_data, remove_method=None,
                 else:
                     RuntimeError("Only obspy.core.stream.Stream data type is currently supported for manual noise removal method.")     
             elif rem_kind.lower() in autoList:
-                outStream = __remove_anti_stalta(outStream, sta=sta, lta=lta, thresh=stalta_thresh, show_stalta_plot=show_stalta_plot, verbose=verbose)
-                outStream = __remove_noise_thresh(outStream, noise_percent=noise_percent, lta=lta, min_win_size=min_win_size, verbose=verbose)
-                outStream = __remove_noise_saturate(outStream, sat_percent=sat_percent, min_win_size=min_win_size, verbose=verbose)
-                outStream = __remove_warmup_cooldown(stream=outStream, warmup_time=warmup_time, cooldown_time=cooldown_time, verbose=verbose)
+                # The antitrigger, noise threshold, and warmup/cooldown windows do not depend on data removed by the other methods,
+                #   so they are evaluated on the same data (at the same time, if n_workers > 1). 
+                # The saturation threshold depends on the maximum of the data that has not been removed yet, 
+                #   so (as when the methods are run one after another) it is evaluated after the antitrigger and noise threshold windows are removed.
+                currStream = _edited_stream()
+                detectorList = [(__remove_anti_stalta, dict(sta=sta, lta=lta, thresh=stalta_thresh, show_stalta_plot=show_stalta_plot, n_workers=n_workers, cft_cache=cftCache, verbose=verbose)),
+                                (__remove_noise_thresh, dict(noise_percent=noise_percent, lta=lta, min_win_size=min_win_size, n_workers=n_workers, verbose=verbose)),
+                                (__remove_warmup_cooldown, dict(warmup_time=warmup_time, cooldown_time=cooldown_time, verbose=verbose))]
+                # matplotlib is not thread-safe, so the methods are run one after another if the sta/lta plot is shown
+                staltaWins, noiseWins, warmCoolWins = _threaded_map(lambda det: det[0](currStream, return_windows=True, **det[1]), detectorList, 
+                                                                    n_workers=(1 if show_stalta_plot is not False else n_workers))
+                satWins = __remove_noise_saturate((staltaWins | noiseWins).apply(currStream), sat_percent=sat_percent, min_win_size=min_win_size, 
+                                                  n_workers=n_workers, return_windows=True, verbose=verbose)
+                removeWindows = removeWindows.union(staltaWins, noiseWins, satWins, warmCoolWins)
                 # Break for-loop, since all the rest are already done as part of auto
                 break
             elif rem_kind.lower() in antitrigger:
-                outStream = __remove_anti_stalta(outStream, sta=sta, lta=lta, thresh=stalta_thresh, show_stalta_plot=show_stalta_plot, verbose=verbose)
+                removeWindows = removeWindows | __remove_anti_stalta(_edited_stream(), sta=sta, lta=lta, thresh=stalta_thresh, show_stalta_plot=show_stalta_plot, 
+                                                                     n_workers=n_workers, return_windows=True, cft_cache=cftCache, verbose=verbose)
             elif rem_kind.lower() in movingstdList:
-                outStream = __remove_moving_std(stream=outStream, std_ratio_thresh=std_ratio_thresh, std_window_s=std_window_size, min_win_size=min_std_win)
+                removeWindows = removeWindows | __remove_moving_std(stream=_edited_stream(), std_ratio_thresh=std_ratio_thresh, std_window_s=std_window_size, 
+                                                                    min_win_size=min_std_win, return_windows=True)
             elif rem_kind.lower() in saturationThresh:
-                outStream = __remove_noise_saturate(outStream, sat_percent=sat_percent, min_win_size=min_win_size, verbose=verbose)
+                removeWindows = removeWindows | __remove_noise_saturate(_edited_stream(), sat_percent=sat_percent, min_win_size=min_win_size, 
+                                                                        n_workers=n_workers, return_windows=True, verbose=verbose)
             elif rem_kind.lower() in noiseThresh:
-                outStream = __remove_noise_thresh(outStream, noise_percent=noise_percent, lta=lta, min_win_size=min_win_size, verbose=verbose)
+                removeWindows = removeWindows | __remove_noise_thresh(_edited_stream(), noise_percent=noise_percent, lta=lta, min_win_size=min_win_size, 
+                                                                      n_workers=n_workers, return_windows=True, verbose=verbose)
             elif rem_kind.lower() in warmup_cooldown:
-                outStream = __remove_warmup_cooldown(stream=outStream, warmup_time=warmup_time, cooldown_time=cooldown_time, verbose=verbose)
+                removeWindows = removeWindows | __remove_warmup_cooldown(stream=_edited_stream(), warmup_time=warmup_time, cooldown_time=cooldown_time, 
+                                                                         return_windows=True, verbose=verbose)
             elif rem_kind.lower() in procWinList:
-                outStream = _keep_processing_windows(stream=outStream, processing_window=processing_window, verbose=verbose)
+                removeWindows = removeWindows | _keep_processing_windows(stream=_edited_stream(), processing_window=processing_window, 
+                                                                         return_windows=True, verbose=verbose)
             else:
                 if len(remove_method)==1:
                     warnings.warn(f"Input value remove_method={remove_method} is not recognized. No noise removal will be carried out. Please choose one of the following: 'manual', 'auto', 'antitrigger', 'noise threshold', 'warmup_cooldown'.")
@@ -5476,10 +7390,13 @@ def remove_noise(hvsr_data, remove_method=None,
     
     # Add output
     if isinstance(output, (HVSRData, dict)):
-        if isinstance(outStream, (obspy.Stream, obspy.Trace)):
-            output['stream_edited'] = outStream
+        # Removed windows (and any data already masked in the stream), at the samples of the stream
+        output['removed_windows'] = IntervalSet.from_stream(inStream, removeWindows)
+        if isinstance(output, HVSRData):
+            output._set_stream_edited_windows(inStream, removeWindows)
         else:
-            output['stream_edited'] = outStream['stream']
+            # IntervalSet.apply() copies the stream, so stream_edited never shares its data with the input stream
+            output['stream_edited'] = removeWindows.apply(inStream)
         output['input_stream'] = hvsr_data['input_stream']
         
         if 'processing_parameters' not in output.keys():
@@ -5518,7 +7435,7 @@ def remove_noise(hvsr_data, remove_method=None,
         #    output['stream_edited'] = outStream
                 
     elif isinstance(hvsr_data, obspy.Stream) or isinstance(hvsr_data, obspy.Trace):
-        output = outStream
+        output = _edited_stream()
     else:
         warnings.warn(f"Output of type {type(output)} for this function will likely result in errors in other processing steps. Returning hvsr_data data.")
         return hvsr_data
@@ -5530,7 +7447,7 @@ def remove_noise(hvsr_data, remove_method=None,
 
 
 # Remove outlier ppsds
-def remove_outlier_curves(hvsr_data, rmse_thresh=98, use_percentile=True, use_hv_curve=False, plot_engine='matplotlib', show_plot=False, verbose=False):
+def remove_outlier_curves(hvsr_data, rmse_thresh=98, use_percentile=True, use_hv_curve=False, outlier_method='rmse', n_iterations=1, plot_engine='matplotlib', show_plot=False, verbose=False):
     """Function used to remove outliers curves using Root Mean Square Error to calculate the error of each windowed
     Probabilistic Power Spectral Density (PPSD) curve against the median PPSD value at each frequency step for all times.
     It calculates the RMSE for the PPSD curves of each component individually. All curves are removed from analysis.
@@ -5550,6 +7467,18 @@ def remove_outlier_curves(hvsr_data, rmse_thresh=98, use_percentile=True, use_hv
         Whether rmse_thresh should be interepreted as a raw RMSE value or as a percentile of the RMSE values.
     use_hv_curve : bool, default=False
         Whether to use the calculated HV Curve or the individual components. This can only be True after process_hvsr() has been run.
+    outlier_method : str, default='rmse'
+        How to score each curve against the median curve of its component. 
+        'rmse' uses the Root Mean Square Error (stored in the 'RMSE_' columns of hvsr_windows_df). 
+        'mad' scales the difference from the median at each frequency by the Median Absolute Deviation (MAD, scaled to a standard deviation) 
+        and uses the root mean square of the scaled differences (stored in the 'MADScore_' columns of hvsr_windows_df).
+        A window is removed if the score of any of its components is above the threshold.
+    n_iterations : int, default=1
+        Maximum number of times to score the curves. After the first iteration, the median curve (and MAD) are calculated using only the curves that have not been removed.
+        Percentile thresholds are calculated on the first iteration. Iterations stop early if no more curves are removed.
+    plot_engine : {'matplotlib', 'plotly', None}, default='matplotlib'
+        Plotting library used for the plot of the removed data. 
+        Unless show_plot=True, the plot is only created when it is first accessed (hvsr_data['OutlierPlot']).
     show_plot : bool, default=False
         Whether to show a plot of the removed data
     verbose : bool, default=False
@@ -5581,6 +7510,8 @@ def remove_outlier_curves(hvsr_data, rmse_thresh=98, use_percentile=True, use_hv
     use_percentile = orig_args['use_percentile']
     rmse_thresh = orig_args['rmse_thresh']
     use_hv_curve = orig_args['use_hv_curve']
+    outlier_method = orig_args['outlier_method']
+    n_iterations = orig_args['n_iterations']
     show_plot = orig_args['show_plot']
     verbose = orig_args['verbose']
 
@@ -5629,128 +7560,42 @@ def remove_outlier_curves(hvsr_data, rmse_thresh=98, use_percentile=True, use_hv
         return hvsr_out
 
     #Create plot if designated        
-    if not use_hv_curve:
-        compNames = ['Z', 'E', 'N']
-        for col_name in hvsr_data['hvsr_windows_df'].columns:
-            if 'psd_values' in col_name and 'RMSE' not in col_name:
-                cName = col_name.split('_')[2]
-                if cName not in compNames:
-                    compNames.append(cName)
-        col_prefix = 'psd_values_'
-        colNames = [col_prefix+cn for cn in compNames]
-    else:
-        compNames = []
-        for col_name in hvsr_data['hvsr_windows_df'].columns:
-            if col_name.startswith('HV_Curves') and "Log10" not in col_name:
-                compNames.append(col_name)
-        colNames = compNames
-        col_prefix = 'HV_Curves'
-    if plot_engine.lower() == 'matplotlib':
-        spMosaic = []
-        if use_hv_curve:
-            spMosaic.append(['HV Curve'])
-            fSize=(8.5, 6)
-        else:
-            for c in compNames:
-                spMosaic.append([c])
-            fSize = (8.5, len(compNames) * 2)
-
-        fig, ax = plt.subplot_mosaic(spMosaic, sharex=True, figsize=fSize)
-        fig.suptitle(f"{hvsr_data['site']}\nOutlier Curves to be Removed")
-        fig.set_layout_engine('constrained')
-    
-    # Loop through each component, and determine which curves are outliers
-    bad_rmse=[]
+    compNames, colNames = _outlier_curve_columns(hvsr_data['hvsr_windows_df'], use_hv_curve=use_hv_curve)
+    # Get outlier scores for all components at once (array is windows x components x frequencies)
+    #   Use all windows, just in case
+    curveStack = np.stack([np.stack(hvsr_data['hvsr_windows_df'][column]) for column in colNames], axis=1)
+    keepWindows, outlierScores, scoreThresholds, medCurves = _outlier_curve_scores(curveStack, rmse_thresh=rmse_thresh, use_percentile=use_percentile,
+                                                                                   outlier_method=outlier_method, n_iterations=n_iterations)
+    bad_rmse = np.flatnonzero(~keepWindows)
+    scorePrefix = 'RMSE_' if str(outlier_method).lower() == 'rmse' else 'MADScore_'
     for i, column in enumerate(colNames):
-        if column in compNames:
-            if use_hv_curve == False:
-                column = col_prefix+column
-            else:
-                column = column
-            
-        # Retrieve data from dataframe (use all windows, just in case)
-        curr_data = np.stack(hvsr_data['hvsr_windows_df'][column])
-        
-        # Calculate a median curve, and reshape so same size as original
-        medCurve = np.nanmedian(curr_data, axis=0)
-        medCurveArr = np.tile(medCurve, (curr_data.shape[0], 1))
-        
-        # Calculate RMSE
-        rmse = np.sqrt(((np.subtract(curr_data, medCurveArr)**2).sum(axis=1))/curr_data.shape[1])
-        hvsr_data['hvsr_windows_df']['RMSE_'+column] = rmse
-        if use_percentile is True:
-            rmse_threshold = np.percentile(rmse[~np.isnan(rmse)], rmse_thresh)
-            if verbose:
-                print(f'\tRMSE at {rmse_thresh}th percentile for {column} calculated at: {rmse_threshold:.2f}')
-        else:
-            rmse_threshold = rmse_thresh
-        
-        # Retrieve index of those RMSE values that lie outside the threshold
-        for j, curve in enumerate(curr_data):
-            if rmse[j] > rmse_threshold:
-                bad_rmse.append(j)
-
-        # Show plot of removed/retained data
-        if use_hv_curve == False:
-            if plot_engine.lower() == 'matplotlib':
-                # Intialize to only get unique labels
-                rem_label_got = False
-                keep_label_got = False
-                
-                # Iterate through each curve to determine if it's rmse is outside threshold, for plot
-                for j, curve in enumerate(curr_data):
-                    label=None
-                    if rmse[j] > rmse_threshold:
-                        linestyle = 'dashed'
-                        linecolor='darkred'
-                        alpha = 1
-                        linewidth = 1
-                        if not rem_label_got:
-                            label='Removed Curve'
-                            rem_label_got=True
-                    else:
-                        linestyle='solid'
-                        linecolor = 'rosybrown'
-                        alpha = 0.25
-                        linewidth=0.5
-                        if not keep_label_got:
-                            keep_label_got=True
-                            label='Retained Curve'
-
-                    # Plot each individual curve
-                    if 'x_freqs' in hvsr_data.keys():
-                        ax[compNames[i]].plot(hvsr_data.x_freqs[compNames[i]], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
-                    else:
-                        ax[compNames[i]].plot(1/hvsr_data.ppsds[compNames[i]]['period_bin_centers'], curve, linewidth=linewidth, c=linecolor, linestyle=linestyle, alpha=alpha, label=label)
-                
-                # Plot the median curve
-                if 'x_freqs' in hvsr_data.keys():
-                    ax[compNames[i]].plot(hvsr_data.x_freqs[compNames[i]], medCurve, linewidth=1, color='k', label='Median Curve')
-                else:
-                    ax[compNames[i]].plot(1/hvsr_data.ppsds[compNames[i]]['period_bin_centers'],medCurve, linewidth=1, color='k', label='Median Curve')
-                
-                # Format axis
-                ax[compNames[i]].set_ylabel(f"{compNames[i]}")
-                ax[compNames[i]].legend(fontsize=10, labelspacing=0.1)
-                ax[compNames[i]].semilogx()             
-    
-    if plot_engine.lower() == 'matplotlib':
-        hvsr_data['OutlierPlot'] = fig
-        if show_plot:
-            plt.show()
-        else:
-            plt.close()
-    elif plot_engine.lower() == 'plotly':
-        hvsr_data['OutlierPlot'] = sprit_plot.plot_outlier_curves(hvsr_data, rmse_thresh=rmse_thresh, use_percentile=use_percentile, use_hv_curve=use_hv_curve, from_roc=True, show_plot=show_plot, verbose=verbose)
+        hvsr_data['hvsr_windows_df'][scorePrefix+column] = outlierScores[:, i]
+        if use_percentile is True and verbose:
+            print(f'\t{scorePrefix[:-1]} at {rmse_thresh}th percentile for {column} calculated at: {scoreThresholds[i]:.2f}')
+
+    # The outlier plot is only created when it is shown or accessed (hvsr_data['OutlierPlot'])
+    if str(plot_engine).lower() in ['matplotlib', 'plotly']:
+        outlierPlotData = {'plot_engine': str(plot_engine).lower(),
+                           'columns': colNames,
+                           'comp_names': compNames,
+                           'use_hv_curve': use_hv_curve,
+                           'score_prefix': scorePrefix,
+                           'thresholds': scoreThresholds,
+                           'median_curves': medCurves,
+                           'rmse_thresh': rmse_thresh,
+                           'use_percentile': use_percentile,
+                           'outlier_method': outlier_method,
+                           'n_iterations': n_iterations}
     else:
-        pass
+        outlierPlotData = None
+    hvsr_data['_outlier_plot_data'] = outlierPlotData
+    hvsr_data['OutlierPlot'] = None
+    if outlierPlotData is not None and show_plot:
+        hvsr_data['OutlierPlot'] = _build_outlier_plot(hvsr_data, outlierPlotData, show_plot=True)
 
-    # Get unique values of bad_rmse indices and set the "Use" column of the hvsr_windows_df to False for that window
-    bad_rmse = np.unique(bad_rmse)
+    # Set the "Use" column of the hvsr_windows_df to False for windows where any component is an outlier
     if len(bad_rmse) > 0:
-        
-        hvsr_data['hvsr_windows_df']['Use'] = hvsr_data['hvsr_windows_df']['Use'] * (rmse_threshold > hvsr_data['hvsr_windows_df']['RMSE_'+column])
-        #hvsr_data['hvsr_windows_df'].loc[bad_index, "Use"] = False   
+        hvsr_data['hvsr_windows_df']['Use'] = hvsr_data['hvsr_windows_df']['Use'].astype(bool) & keepWindows
     
     if verbose:
         if len(bad_rmse)>0:
@@ -5775,6 +7620,148 @@ def remove_outlier_curves(hvsr_data, rmse_thresh=98, use_percentile=True, use_hv
     return hvsr_out
 
 
+# Track the peaks of the H/V curves of individual time windows over time
+def track_peaks(hvsr_data, azimuth='HV', max_freq_change=0.1, max_gap=2, min_track_length=3, min_peak_amp=1, peak_freq_range=None, use_all_windows=False, verbose=False):
+    """Link the peaks of the H/V curves of consecutive time windows into continuous peak frequency tracks (f0 over time)
+
+    The peaks of each time window's H/V curve (calculated in process_hvsr()) are linked to the active tracks 
+    of the previous time windows using an optimal assignment (scipy.optimize.linear_sum_assignment) on the difference in log-frequency.
+    A track stays active for up to max_gap time windows without a linked peak.
+    The tracks are stored as compact arrays in the peak_tracks attribute, 
+    and the f0 drift statistics of each track (e.g., f0 drift over time) are stored as a pandas.DataFrame in the peak_track_stats attribute.
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData or HVSRBatch
+        Data object after process_hvsr() has been run
+    azimuth : str or list, default='HV'
+        Which H/V curve(s) to track peaks for. 'HV' is the main H/V curve, otherwise the name of an azimuth (or a list of names). 
+        Use 'all' to track peaks for all curves.
+    max_freq_change : float, default=0.1
+        Maximum fractional change in frequency between linked peaks (0.1 = 10%)
+    max_gap : int, default=2
+        Maximum number of consecutive time windows without a linked peak before a track ends
+    min_track_length : int, default=3
+        Tracks with fewer peaks than this are not kept
+    min_peak_amp : float, default=1
+        Minimum H/V amplitude of the peaks to track
+    peak_freq_range : list or None, default=None
+        Two-item list with low and high frequency of peaks to track. If None, uses the peak_freq_range attribute of hvsr_data (or [0.4, 40])
+    use_all_windows : bool, default=False
+        If True, the peaks of time windows not being used (where the 'Use' column of hvsr_windows_df is False) are also tracked. 
+        Otherwise, those time windows are treated as time windows with no peaks.
+    verbose : bool, default=False
+        Whether to print information about the tracks to terminal
+
+    Returns
+    -------
+    hvsr_data : HVSRData or HVSRBatch
+        Input data with the peak_tracks and peak_track_stats attributes added. 
+        Each is a dictionary with one item per H/V curve (e.g., 'HV').
+        peak_tracks contains the arrays 'track_offsets' (start of each track in the other arrays, with the number of peaks as the last item), 
+        'window_index' (row of hvsr_windows_df), 'frequency', and 'amplitude', with the peaks of each track in time order.
+    """
+    orig_args = locals().copy() # Get the initial arguments
+    start_time = datetime.datetime.now()
+
+    if isinstance(hvsr_data, HVSRBatch):
+        if verbose:
+            print('\nTracking peaks over time (track_peaks())')
+            print('\t  Running in batch mode')
+        for site_name in hvsr_data.keys():
+            args = orig_args.copy() #Make a copy so we don't accidentally overwrite
+            args['hvsr_data'] = hvsr_data[site_name]
+            if hvsr_data[site_name]['ProcessingStatus']['OverallStatus']:
+                hvsr_data[site_name] = __track_peaks_batch(**args)
+        return HVSRBatch(hvsr_data)
+
+    if 'hvsr_windows_df' not in hvsr_data.keys() or 'x_freqs' not in hvsr_data.keys():
+        raise RuntimeError('track_peaks() requires the H/V curves of each time window. Run process_hvsr() first.')
+
+    hvsrDF = hvsr_data['hvsr_windows_df']
+    curveIDs = ['_'.join(col_name.split('_')[2:]) for col_name in hvsrDF.columns if col_name.startswith('HV_Curves') and 'Log' not in col_name]
+    curveIDs[0] = 'HV'
+    if str(azimuth).lower() == 'all':
+        azimuth = curveIDs
+    elif isinstance(azimuth, str):
+        azimuth = [azimuth]
+
+    if peak_freq_range is None:
+        if 'peak_freq_range' in hvsr_data.keys():
+            peak_freq_range = hvsr_data['peak_freq_range']
+        else:
+            peak_freq_range = [0.4, 40]
+
+    anyK = list(hvsr_data['x_freqs'].keys())[0]
+    freqs = np.asarray(hvsr_data['x_freqs'][anyK], dtype=float)
+    nWindows = hvsrDF.shape[0]
+    # Hours since the start of the first time window
+    winHours = np.asarray((hvsrDF.index - hvsrDF.index[0]).total_seconds(), dtype=float) / 3600
+    if use_all_windows:
+        useWins = np.ones(nWindows, dtype=bool)
+    else:
+        useWins = hvsrDF['Use'].astype(bool).to_numpy()
+
+    if 'peak_tracks' not in hvsr_data.keys():
+        hvsr_data['peak_tracks'] = {}
+        hvsr_data['peak_track_stats'] = {}
+
+    for az in azimuth:
+        if az not in curveIDs:
+            warnings.warn(f'{az} is not a curve in this data ({curveIDs}). Peaks not tracked for {az}.')
+            continue
+        colSuffix = '' if az == 'HV' else '_'+az
+        curves = np.stack(hvsrDF['HV_Curves'+colSuffix])
+
+        # Flatten the peaks of all windows, then keep only peaks of interest
+        peakLists = [np.asarray(pk, dtype=np.int64).ravel() for pk in hvsrDF['CurvesPeakIndices_'+az]]
+        peakWins = np.repeat(np.arange(nWindows), [pk.shape[0] for pk in peakLists])
+        peakInds = np.concatenate(peakLists) if len(peakLists) > 0 else np.empty(0, dtype=np.int64)
+        peakFreqs = freqs[peakInds]
+        peakAmps = curves[peakWins, peakInds]
+        keepPeaks = (useWins[peakWins] & (peakAmps > min_peak_amp) &
+                     (peakFreqs >= min(peak_freq_range)) & (peakFreqs <= max(peak_freq_range)))
+        peakWins = peakWins[keepPeaks]
+        peakFreqs = peakFreqs[keepPeaks]
+        peakAmps = peakAmps[keepPeaks]
+
+        trackIDs = __link_peak_tracks(peakWins, np.log(peakFreqs), nWindows=nWindows,
+                                      max_log_change=np.log1p(max_freq_change), max_gap=max_gap)
+
+        # Only keep long enough tracks, and renumber them in order of their first time window
+        trackLengths = np.bincount(trackIDs, minlength=1)
+        keepTracks = trackLengths[trackIDs] >= max(int(min_track_length), 1)
+        trackIDs = np.unique(trackIDs[keepTracks], return_inverse=True)[1].ravel()
+        order = np.lexsort((peakWins[keepTracks], trackIDs))
+        trackIDs = trackIDs[order]
+        peakWins = peakWins[keepTracks][order]
+        peakFreqs = peakFreqs[keepTracks][order]
+        peakAmps = peakAmps[keepTracks][order]
+        trackOffsets = np.concatenate(([0], np.cumsum(np.bincount(trackIDs)))).astype(np.int64)
+
+        hvsr_data['peak_tracks'][az] = {'track_offsets': trackOffsets,
+                                        'window_index': peakWins.astype(np.int64),
+                                        'frequency': peakFreqs,
+                                        'amplitude': peakAmps}
+        hvsr_data['peak_track_stats'][az] = __peak_track_stats(hvsr_data['peak_tracks'][az], hvsrDF.index, winHours)
+
+        if verbose:
+            trackStats = hvsr_data['peak_track_stats'][az]
+            print(f"\t{az}: {trackStats.shape[0]} peak tracks of at least {min_track_length} time windows")
+            if trackStats.shape[0] > 0:
+                longTrack = trackStats.sort_values('NumWindows', ascending=False).iloc[0]
+                print(f"\t  Longest track: {int(longTrack['NumWindows'])} windows, median f0={longTrack['f0_Median']:0.3f} Hz, f0 drift={longTrack['f0_Drift_Hz_per_hr']:0.4f} Hz/hr")
+
+    if 'processing_parameters' not in hvsr_data.keys():
+        hvsr_data['processing_parameters'] = {}
+    hvsr_data['processing_parameters']['track_peaks'] = {}
+    for key, value in orig_args.items():
+        hvsr_data['processing_parameters']['track_peaks'][key] = value
+
+    hvsr_data = _check_processing_status(hvsr_data, start_time=start_time, func_name=inspect.stack()[0][3], verbose=verbose)
+    return hvsr_data
+
+
 # Just for testing
 def test_function():
     print('is this working?')
@@ -5808,6 +7795,19 @@ def __generate_ppsds_batch(**generate_psds_kwargs):
     return params
 
 
+# Helper function for batch processing of track_peaks
+def __track_peaks_batch(**track_peaks_kwargs):
+    try:
+        hvsr_data = track_peaks(**track_peaks_kwargs)
+        if track_peaks_kwargs['verbose']:
+            print('\t{} succesfully completed track_peaks()'.format(hvsr_data['input_params']['site']))
+    except:
+        warnings.warn(f"Error in track_peaks({track_peaks_kwargs['hvsr_data']['input_params']['site']}, **track_peaks_kwargs)", RuntimeWarning)
+        hvsr_data = track_peaks_kwargs['hvsr_data']
+
+    return hvsr_data
+
+
 # Helper function for batch processing of get_report
 def __get_report_batch(**get_report_kwargs):
 
@@ -5970,6 +7970,364 @@ def _check_processing_status(hvsr_data, start_time=datetime.datetime.now(), func
     return hvsr_data
 
 
+# Helper function to map a function over items using a thread pool
+def _threaded_map(func, items, n_workers=1):
+    """Applies func to each item in items, using a thread pool if n_workers > 1.
+
+    Most of the heavy lifting in sprit is done by numpy/scipy/obspy routines that release the GIL, 
+    so threads can be used to run independent calculations (e.g., on each component) at the same time.
+
+    Parameters
+    ----------
+    func : function
+        Function that takes a single item as input
+    items : iterable
+        Items to pass to func
+    n_workers : int, optional
+        Maximum number of threads to use. If 1 or less, items are processed in a regular for loop, by default 1
+
+    Returns
+    -------
+    list
+        List with the output of func for each item, in the same order as items (regardless of the order in which they finish)
+    """
+    items = list(items)
+    if n_workers is None or n_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(int(n_workers), len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+# Helper function to create the outlier curve plot from the data saved by remove_outlier_curves()
+def _build_outlier_plot(hvsr_data, outlier_plot_data, show_plot=False):
+    """Create the outlier curve plot of remove_outlier_curves(), using the scores saved in the hvsr_windows_df
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData or dict
+        Data after remove_outlier_curves() has been run
+    outlier_plot_data : dict
+        Dictionary saved by remove_outlier_curves() in hvsr_data['_outlier_plot_data']
+    show_plot : bool, default=False
+        Whether to show the plot
+
+    Returns
+    -------
+    matplotlib.figure.Figure or plotly.graph_objs.Figure
+        Outlier curve plot
+    """
+    if outlier_plot_data['plot_engine'] == 'plotly':
+        return sprit_plot.plot_outlier_curves(hvsr_data, rmse_thresh=outlier_plot_data['rmse_thresh'],
+                                              use_percentile=outlier_plot_data['use_percentile'],
+                                              use_hv_curve=outlier_plot_data['use_hv_curve'],
+                                              outlier_method=outlier_plot_data['outlier_method'],
+                                              n_iterations=outlier_plot_data['n_iterations'],
+                                              from_roc=True, show_plot=show_plot)
+
+    compNames = outlier_plot_data['comp_names']
+    useHV = outlier_plot_data['use_hv_curve']
+    if useHV:
+        spMosaic = [['HV Curve']]
+        fSize = (8.5, 6)
+    else:
+        spMosaic = [[c] for c in compNames]
+        fSize = (8.5, len(compNames) * 2)
+
+    fig, ax = plt.subplot_mosaic(spMosaic, sharex=True, figsize=fSize)
+    fig.suptitle(f"{hvsr_data['site']}\nOutlier Curves to be Removed")
+    fig.set_layout_engine('constrained')
+
+    for i, column in enumerate(outlier_plot_data['columns']):
+        curves = np.stack(hvsr_data['hvsr_windows_df'][column])
+        removed = np.asarray(hvsr_data['hvsr_windows_df'][outlier_plot_data['score_prefix']+column] > outlier_plot_data['thresholds'][i])
+        if useHV:
+            axName = 'HV Curve'
+            xFreqs = hvsr_data['x_freqs'][list(hvsr_data['x_freqs'].keys())[0]][:curves.shape[1]]
+        else:
+            axName = compNames[i]
+            if 'x_freqs' in hvsr_data.keys():
+                xFreqs = hvsr_data['x_freqs'][axName]
+            else:
+                xFreqs = 1/hvsr_data['ppsds'][axName]['period_bin_centers']
+        xFreqs = np.asarray(xFreqs)[:curves.shape[1]]
+
+        # All curves in a category are drawn as a single collection (all H/V curves share one axis, so only label them once)
+        segments = np.stack(np.broadcast_arrays(xFreqs[np.newaxis, :], curves), axis=-1)
+        labels = ['Retained Curve', 'Removed Curve', 'Median Curve'] if (i == 0 or not useHV) else ['_nolegend_'] * 3
+        if np.any(~removed):
+            ax[axName].add_collection(matplotlib.collections.LineCollection(segments[~removed], linewidths=0.5, colors='rosybrown',
+                                                                            linestyles='solid', alpha=0.25, label=labels[0]))
+        if np.any(removed):
+            ax[axName].add_collection(matplotlib.collections.LineCollection(segments[removed], linewidths=1, colors='darkred',
+                                                                            linestyles='dashed', alpha=1, label=labels[1]))
+
+        # Plot the median curve and format axis
+        ax[axName].plot(xFreqs, outlier_plot_data['median_curves'][i], linewidth=1, color='k', label=labels[2])
+        ax[axName].set_ylabel(axName)
+        ax[axName].legend(fontsize=10, labelspacing=0.1)
+        ax[axName].semilogx()
+        ax[axName].autoscale_view()
+
+    if show_plot:
+        plt.show()
+    else:
+        plt.close(fig)
+    return fig
+
+
+# Helper function to get the columns of hvsr_windows_df used to find outlier curves
+def _outlier_curve_columns(hvsr_windows_df, use_hv_curve=False):
+    """Get the names and hvsr_windows_df columns of the curves used to find outlier curves
+
+    Parameters
+    ----------
+    hvsr_windows_df : pandas.DataFrame
+        The hvsr_windows_df attribute of an HVSRData object
+    use_hv_curve : bool, default=False
+        Whether to use the H/V curves (including azimuths) or the psd curves of the individual components (including azimuths)
+
+    Returns
+    -------
+    tuple
+        compNames: list of component names ('Z', 'E', 'N', then any azimuths), or of H/V curve column names ('HV_Curves' first);
+        colNames: list of hvsr_windows_df columns, in the same order as compNames
+    """
+    if not use_hv_curve:
+        compNames = ['Z', 'E', 'N']
+        for col_name in hvsr_windows_df.columns:
+            if 'psd_values' in col_name and 'RMSE' not in col_name:
+                cName = col_name.split('_')[2]
+                if cName not in compNames:
+                    compNames.append(cName)
+        colNames = ['psd_values_'+cn for cn in compNames]
+    else:
+        compNames = []
+        for col_name in hvsr_windows_df.columns:
+            if col_name.startswith('HV_Curves') and "Log10" not in col_name:
+                compNames.append(col_name)
+        colNames = compNames
+    return compNames, colNames
+
+
+# Helper function to get outlier scores of the curves of all time windows and components at once
+def _outlier_curve_scores(curve_stack, rmse_thresh=98, use_percentile=True, outlier_method='rmse', n_iterations=1):
+    """Score the curve of each time window and component against the median curve of that component, and find outlier windows
+
+    Parameters
+    ----------
+    curve_stack : numpy.ndarray
+        Array with the curves, with shape (windows x components x frequencies)
+    rmse_thresh : float, default=98
+        Threshold score above which a curve is an outlier (or percentile of the scores of each component, if use_percentile=True)
+    use_percentile : bool, default=True
+        Whether rmse_thresh is a percentile
+    outlier_method : {'rmse', 'mad'}, default='rmse'
+        'rmse' scores each curve with the Root Mean Square Error from the median curve. 
+        'mad' scores each curve with the root mean square of its difference from the median curve, 
+        scaled at each frequency by the Median Absolute Deviation (times 1.4826).
+    n_iterations : int, default=1
+        Maximum number of iterations. After the first iteration, the median curve (and MAD) are calculated using only the windows that are kept.
+
+    Returns
+    -------
+    tuple
+        keepWindows: boolean array (windows) that is False for windows where any component is an outlier;
+        scores: array of scores (windows x components);
+        thresholds: array with the threshold score of each component;
+        medCurves: array with the median curve of each component (components x frequencies)
+    """
+    curve_stack = np.asarray(curve_stack, dtype=float)
+    outlier_method = str(outlier_method).lower()
+    if outlier_method not in ['rmse', 'mad']:
+        raise ValueError(f"outlier_method must be 'rmse' or 'mad', not {outlier_method}")
+
+    keepWindows = np.ones(curve_stack.shape[0], dtype=bool)
+    thresholds = None
+    for iteration in range(max(int(n_iterations), 1)):
+        medCurves = np.nanmedian(curve_stack[keepWindows], axis=0)
+        curveDiffs = curve_stack - medCurves[np.newaxis, :, :]
+        if outlier_method == 'rmse':
+            scores = np.sqrt((curveDiffs**2).sum(axis=2) / curve_stack.shape[2])
+        else:
+            madCurves = 1.4826 * np.nanmedian(np.abs(curveDiffs[keepWindows]), axis=0)
+            madCurves[madCurves == 0] = np.nan
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                scores = np.sqrt(np.nanmean((curveDiffs / madCurves[np.newaxis, :, :])**2, axis=2))
+
+        # Percentile thresholds are only calculated on the first iteration
+        if thresholds is None:
+            if use_percentile is True:
+                thresholds = np.nanpercentile(scores, rmse_thresh, axis=0)
+            else:
+                thresholds = np.full(curve_stack.shape[1], rmse_thresh, dtype=float)
+
+        newKeep = ~np.any(scores > thresholds[np.newaxis, :], axis=1)
+        if np.array_equal(newKeep, keepWindows):
+            break
+        keepWindows = newKeep
+    return keepWindows, scores, thresholds, medCurves
+
+
+# Helper function to remove the large (sample- and window-level) arrays from a processed site
+def _release_site_data(hvsr_data):
+    """Removes the streams, obspy PPSD objects, and per-window psd arrays from a processed HVSRData object (in place).
+
+    This is used by sprit.run() for batch processing (release_site_data=True) so that memory does not grow with the number of sites.
+    The HVSR curves, peaks, and reports are kept.
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData
+        Processed HVSRData object
+
+    Returns
+    -------
+    HVSRData
+        The same HVSRData object, without the large arrays
+    """
+    for key in ['stream', 'stream_edited', 'input_stream', 'psd_raw', 'InputPlot']:
+        if key in hvsr_data.keys():
+            delattr(hvsr_data, key)
+    if 'ppsds_obspy' in hvsr_data.keys():
+        hvsr_data['ppsds_obspy'] = {}
+    if 'hvsr_windows_df' in hvsr_data.keys():
+        psdCols = [col for col in hvsr_data['hvsr_windows_df'].columns if str(col).startswith('psd_values_')]
+        hvsr_data['hvsr_windows_df'] = hvsr_data['hvsr_windows_df'].drop(columns=psdCols)
+    hvsr_data['stalta_cache'] = None
+    hvsr_data['component_matrix'] = None
+    hvsr_data['azimuth_grid'] = None
+    # Outlier plot of the (removed) psd arrays can no longer be created, if it has not been created already
+    outlierPlotData = getattr(hvsr_data, '_outlier_plot_data', None)
+    if outlierPlotData is not None and not outlierPlotData['use_hv_curve']:
+        hvsr_data['_outlier_plot_data'] = None
+    return hvsr_data
+
+
+# Helper function to get the aligned component data of an HVSRData object, dict, or obspy Stream/Trace
+def _get_component_matrix(hvsr_data):
+    """Gets a ComponentMatrix of the stream in hvsr_data. 
+    For HVSRData objects, the cached HVSRData.component_matrix is used, so the stream is only merged and aligned once while it is unchanged.
+
+    Parameters
+    ----------
+    hvsr_data : HVSRData, dict, obspy.Stream, or obspy.Trace
+        Object with the data
+
+    Returns
+    -------
+    ComponentMatrix
+    """
+    if isinstance(hvsr_data, HVSRData):
+        return hvsr_data.component_matrix
+    elif isinstance(hvsr_data, dict):
+        return ComponentMatrix(hvsr_data['stream'])
+    elif isinstance(hvsr_data, (obspy.Stream, obspy.Trace)):
+        return ComponentMatrix(hvsr_data)
+    raise RuntimeError("hvsr_data must be sprit.HVSRData, dict, obspy.Stream, or obspy.Trace")
+
+
+# Helper function to create a radial (azimuthal) trace from the horizontal components
+def _radial_trace(comp_matrix, azimuth_name, azimuth_deg, azimuth_rad=None, radial_mask=None):
+    """Creates a radial trace (N*cos(azimuth) + E*sin(azimuth)) from the N and E components of a ComponentMatrix.
+
+    Parameters
+    ----------
+    comp_matrix : ComponentMatrix
+        Aligned data of the stream
+    azimuth_name : str
+        Name of the azimuth (zero-padded angle in degrees), used as the location code of the trace
+    azimuth_deg : float
+        Azimuth, in degrees clockwise from north
+    azimuth_rad : float or None, optional
+        Azimuth in radians. If None, calculated from azimuth_deg, by default None
+    radial_mask : SampleMask or None, optional
+        Combined mask of the N and E components. If None, calculated from comp_matrix, by default None
+
+    Returns
+    -------
+    obspy.Trace
+        Radial trace (channel EHR), masked wherever either horizontal component is masked
+    """
+    if azimuth_rad is None:
+        azimuth_rad = np.deg2rad(azimuth_deg)
+    if radial_mask is None:
+        radial_mask = comp_matrix.combined_mask(['N', 'E'])
+
+    statsDict = {}
+    for key, value in comp_matrix.get_stats('E').items():
+        statsDict[key] = value
+    # Radial components use the shared time base of the horizontal components
+    statsDict['starttime'] = comp_matrix.starttime
+    statsDict['npts'] = comp_matrix.npts
+    statsDict['location'] = azimuth_name #Change location name
+    statsDict['channel'] = f"EHR" #Change channel name
+    statsDict['azimuth_deg'] = azimuth_deg
+    statsDict['azimuth_rad'] = azimuth_rad
+
+    # From hvsrpy: horizontal = self.ns._amp * math.cos(az_rad) + self.ew._amp*math.sin(az_rad)
+    # Samples removed from either horizontal component are removed from the radial component
+    radialData = np.add(comp_matrix.get_data('N') * np.cos(azimuth_rad), comp_matrix.get_data('E') * np.sin(azimuth_rad))
+    return obspy.Trace(data=radial_mask.to_masked_array(radialData), header=statsDict)
+
+
+# Helper function to read several files using a thread pool
+def _read_files(filepaths, read_fun, n_workers=1, verbose=False):
+    """Reads each file in filepaths using read_fun, using up to n_workers threads at a time.
+
+    Reading files (especially from network drives) and decoding miniseed data mostly release the GIL, 
+    so several files can be read at the same time with threads. 
+
+    Parameters
+    ----------
+    filepaths : list
+        List of filepaths
+    read_fun : function
+        Function that takes a filepath as its only argument and returns the data read from it
+    n_workers : int, optional
+        Maximum number of files to read at the same time, by default 1
+    verbose : bool, optional
+        Whether to print the time taken to read each file, by default False
+
+    Returns
+    -------
+    tuple (list, dict)
+        List with the output of read_fun for each file (in the same order as filepaths), 
+        and dictionary with the time (in seconds) taken to read each file {filepath: seconds}
+    """
+    def _timed_read(fpath):
+        readStart = datetime.datetime.now()
+        fileData = read_fun(fpath)
+        return fileData, (datetime.datetime.now() - readStart).total_seconds()
+
+    filepaths = list(filepaths)
+    readResults = _threaded_map(_timed_read, filepaths, n_workers=n_workers)
+    readTimes = {str(f): readTime for f, (_, readTime) in zip(filepaths, readResults)}
+    if verbose:
+        print(f"\tRead {len(filepaths)} files (n_workers={n_workers}):")
+        for f, readTime in readTimes.items():
+            print(f"\t  {pathlib.Path(f).name}: {readTime:.3f} s")
+    return [fileData for fileData, _ in readResults], readTimes
+
+
+# Helper function to set the warning filters used while reading Raspberry Shake files
+@contextlib.contextmanager
+def _rs_read_warning_filters():
+    """Context manager that ignores the (harmless) warnings raised when reading Raspberry Shake files and attaching their response.
+
+    warnings.catch_warnings() changes process-wide state and is not thread-safe, so the filters are only set when this is used 
+    on the main thread. Functions that read data in worker threads (e.g., batch_data_read()) should set them once around the thread pool instead.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    with warnings.catch_warnings():
+        warnings.filterwarnings(action='ignore', message='^readMSEEDBuffer()')
+        warnings.filterwarnings(action='ignore', message='Found more than one matching response.*')
+        yield
+
 # HELPER functions for fetch_data() and get_metadata()
 # Read in metadata .inv file, specifically for RaspShake
 def _update_shake_metadata(filepath, params, write_path=''):
@@ -6011,6 +8369,42 @@ def _update_shake_metadata(filepath, params, write_path=''):
     enddate=str(datetime.datetime.today())
 
     filepath = sprit_utils.checkifpath(filepath)
+
+    if write_path == '':
+        # The metadata file is only parsed once; the inventory for each site is an edited copy of it
+        siteOverrides = {'network': network, 'station': station, 'longitude': xcoord, 'latitude': ycoord, 'elevation': elevation, 'depth': depth}
+        def _edit_shake_inventory(fpath):
+            # Keep the attributes (units, uncertainties) of the original values, as when the xml text is edited
+            def _new_value(oldValue, newValue):
+                newValue = type(oldValue)(float(newValue))
+                newValue.__dict__.update(oldValue.__dict__)
+                return newValue
+
+            baseInv = INVENTORY_CACHE.get(fpath, read_fun=lambda f: obspy.read_inventory(str(f), format='STATIONXML', level='response'))
+            baseInv.created = obspy.UTCDateTime(datetime.datetime.now())
+            for net in baseInv:
+                net.code = network
+                for sta in net:
+                    sta.code = station
+                    sta.start_date = obspy.UTCDateTime(startdate)
+                    sta.end_date = obspy.UTCDateTime(enddate)
+                    sta.latitude = _new_value(sta.latitude, ycoord)
+                    sta.longitude = _new_value(sta.longitude, xcoord)
+                    sta.elevation = _new_value(sta.elevation, elevation)
+                    for cha in sta:
+                        cha.start_date = obspy.UTCDateTime(startdate)
+                        cha.end_date = obspy.UTCDateTime(enddate)
+                        cha.latitude = _new_value(cha.latitude, ycoord)
+                        cha.longitude = _new_value(cha.longitude, xcoord)
+                        cha.elevation = _new_value(cha.elevation, elevation)
+                        cha.depth = _new_value(cha.depth, depth)
+            return baseInv
+        inv = INVENTORY_CACHE.get(filepath, read_fun=_edit_shake_inventory, overrides=siteOverrides)
+
+        params['inv'] = inv
+        params['params']['inv'] = inv
+        return params
+
     tree = ET.parse(str(filepath))
     root = tree.getroot()
 
@@ -6048,36 +8442,19 @@ def _update_shake_metadata(filepath, params, write_path=''):
     #filetag = '_'+str(datetime.datetime.today().date())
     #outfile = str(parentPath)+'\\'+filename+filetag+'.inv'
 
-    if write_path != '':
-        try:
-            write_path = pathlib.Path(write_path)
-            if write_path.is_dir():
-                fname = params['network']+'_'+params['station']+'_'+params['site']
-                fname = fname + '_response.xml'
-                write_file = write_path.joinpath(fname)
-            else:
-                write_file=write_path
-            tree.write(write_file, xml_declaration=True, method='xml',encoding='UTF-8')
-            inv = obspy.read_inventory(write_file, format='STATIONXML', level='response')
-        except:
-            warnings.warn(f'write_path={write_path} is not recognized as a filepath, updated metadata file will not be written')
-            write_path=''
-    else:
-        try:
-            #Create temporary file for reading into obspy
-            tpf = tempfile.NamedTemporaryFile(delete=False)
-            stringRoot = ET.tostring(root, encoding='UTF-8', method='xml')
-            tpf.write(stringRoot)
-
-            inv = obspy.read_inventory(tpf.name, format='STATIONXML', level='response')
-            tpf.close()
-
-            os.remove(tpf.name)
-        except:
-            write_file = pathlib.Path(__file__).with_name('metadata.xml')
-            tree.write(write_file, xml_declaration=True, method='xml',encoding='UTF-8')
-            inv = obspy.read_inventory(write_file.as_posix(), format='STATIONXML', level='response')
-            os.remove(write_file.as_posix())
+    try:
+        write_path = pathlib.Path(write_path)
+        if write_path.is_dir():
+            fname = params['network']+'_'+params['station']+'_'+params['site']
+            fname = fname + '_response.xml'
+            write_file = write_path.joinpath(fname)
+        else:
+            write_file=write_path
+        tree.write(write_file, xml_declaration=True, method='xml',encoding='UTF-8')
+        inv = obspy.read_inventory(write_file, format='STATIONXML', level='response')
+    except:
+        warnings.warn(f'write_path={write_path} is not recognized as a filepath, updated metadata file will not be written')
+        return _update_shake_metadata(filepath=filepath, params=params, write_path='')
 
     params['inv'] = inv
     params['params']['inv'] = inv
@@ -6085,7 +8462,7 @@ def _update_shake_metadata(filepath, params, write_path=''):
 
 
 # Support function for get_metadata()
-def _read_RS_Metadata(params, source=None):
+def _read_RS_Metadata(params, source=None, use_cache=False):
     """Function to read the metadata from Raspberry Shake using the StationXML file provided by the company.
     Intended to be used within the get_metadata() function.
 
@@ -6093,12 +8470,25 @@ def _read_RS_Metadata(params, source=None):
     ----------
     params : dict
         The parameter dictionary output from input_params() and read into get_metadata()
+    use_cache : bool, optional
+        Whether the paz dictionary can be stored in (and read from) INVENTORY_CACHE. 
+        Only use if params['inv'] was read from params['metapath'] (or is not specified), by default False
 
     Returns
     -------
     params : dict
         Further modified parameter dictionary
     """
+    if use_cache:
+        # paz only depends on the metadata file and the network/station/channel codes, so the xml is only searched once for each combination
+        pazOverrides = {'output': 'paz', 'network': params['net'], 'station': params['sta'], 'channels': list(params['cha'])}
+        if 'inv' not in params.keys():
+            sprit_utils.checkifpath(params['metapath'])
+            params['inv'] = INVENTORY_CACHE.get(params['metapath'], read_fun=lambda f: obspy.read_inventory(str(f), format='STATIONXML', level='response'))
+        params['paz'] = INVENTORY_CACHE.get(params['metapath'], read_fun=lambda f: _read_RS_Metadata(params, source=source, use_cache=False)['paz'], overrides=pazOverrides)
+        params['params']['paz'] = params['paz']
+        return params
+
     if 'inv' in params.keys():
         inv = params['inv']
     else:
@@ -6185,8 +8575,167 @@ def _read_RS_Metadata(params, source=None):
     params['paz'] = paz
     params['params']['paz'] = paz
 
-    return params
+    return params
+
+
+
+# Helper function to get the catalog of a Raspberry Shake archive directory
+def _get_rs_catalog(archive_dir, verbose=False):
+    """Gets RSArchiveCatalog for archive_dir, creating it the first time it is used. 
+    
+    The catalog is not refreshed here: the caller refreshes it only if the files it needs are not found in it.
+    """
+    archive_dir = pathlib.Path(archive_dir).resolve()
+    with RS_CATALOGS_LOCK:
+        if archive_dir.as_posix() in RS_CATALOGS:
+            return RS_CATALOGS[archive_dir.as_posix()]
+        RS_CATALOGS[archive_dir.as_posix()] = RSArchiveCatalog(archive_dir, verbose=verbose)
+        return RS_CATALOGS[archive_dir.as_posix()]
+
+# Helper function to get (and cache) the start and end time of each record in a miniseed file
+def _get_mseed_record_index(filepath, use_cache=True):
+    """Scans the fixed headers of all the records of a miniseed file to get the location, start time, and end time of each record.
+
+    The index is cached (using the path, modification time, and size of the file) so repeated reads of the same file do not need to scan it again.
+
+    Parameters
+    ----------
+    filepath : str or pathlib.Path
+        Path to miniseed file
+    use_cache : bool, optional
+        Whether to use (and update) the cached index, by default True
+
+    Returns
+    -------
+    dict or None
+        Dictionary with keys 'record_length' (in bytes), 'ids' (trace id of each record), 'starts' and 'ends' (timestamps of first and last sample of each record), and 'delta' (sample spacing of each record).
+        None if the file cannot be indexed (e.g., it is not a miniseed file or its records are not all the same length)
+    """
+    filepath = pathlib.Path(filepath)
+    try:
+        fileStat = filepath.stat()
+    except Exception:
+        return None
+    cacheKey = (str(filepath.resolve()), fileStat.st_mtime_ns, fileStat.st_size)
+    if use_cache:
+        # Read under the lock, since another thread may be removing this entry from the cache
+        with MSEED_RECORD_INDEX_LOCK:
+            cachedIndex = MSEED_RECORD_INDEX_CACHE.get(cacheKey, None)
+        if cachedIndex is not None:
+            return cachedIndex
+
+    try:
+        firstRecord = get_record_information(str(filepath))
+    except Exception:
+        return None
+    recLen = firstRecord['record_length']
+    bOrder = firstRecord['byteorder']
+    if fileStat.st_size % recLen != 0:
+        return None
+    nRecords = fileStat.st_size // recLen
+
+    # Fixed section of data header (48 bytes) of each record
+    headerDtype = np.dtype([('seq', 'S6'), ('quality', 'S1'), ('reserved', 'S1'),
+                            ('station', 'S5'), ('location', 'S2'), ('channel', 'S3'), ('network', 'S2'),
+                            ('year', bOrder+'u2'), ('doy', bOrder+'u2'), ('hour', 'u1'), ('minute', 'u1'), ('second', 'u1'), ('unused', 'u1'), ('fract', bOrder+'u2'),
+                            ('npts', bOrder+'u2'), ('sr_factor', bOrder+'i2'), ('sr_mult', bOrder+'i2'),
+                            ('activity_flags', 'u1'), ('io_flags', 'u1'), ('quality_flags', 'u1'), ('n_blockettes', 'u1'),
+                            ('time_correction', bOrder+'i4'), ('data_offset', bOrder+'u2'), ('blockette_offset', bOrder+'u2')])
+    recordBytes = np.memmap(filepath, dtype=np.uint8, mode='r', shape=(nRecords, recLen))
+    headers = np.ascontiguousarray(recordBytes[:, :headerDtype.itemsize]).view(headerDtype).ravel()
+    del recordBytes
+
+    # Only index files where every record is a data record (otherwise, read the whole file)
+    if not np.isin(headers['quality'], [b'D', b'R', b'Q', b'M']).all():
+        return None
+
+    # Record start times (BTIME) as timestamps
+    days = (headers['year'].astype(np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64) + headers['doy'] - 1
+    starts = (days * 86400 + headers['hour'].astype(np.int64) * 3600 + headers['minute'].astype(np.int64) * 60 + headers['second']) + headers['fract'] * 1e-4
+    notApplied = (headers['activity_flags'] & 2) == 0
+    starts = starts + np.where(notApplied, headers['time_correction'] * 1e-4, 0)
+
+    # Sampling rate from sample rate factor and multiplier
+    factor = headers['sr_factor'].astype(float)
+    mult = headers['sr_mult'].astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sampRate = np.select([(factor > 0) & (mult > 0), (factor > 0) & (mult < 0), (factor < 0) & (mult > 0), (factor < 0) & (mult < 0)],
+                             [factor * mult, -factor / mult, -mult / factor, 1 / (factor * mult)], default=0)
+        delta = np.where(sampRate > 0, 1 / sampRate, 0)
+    ends = starts + np.clip(headers['npts'].astype(float) - 1, 0, None) * delta
+
+    ids = np.char.add(np.char.add(np.char.add(np.char.add(np.char.add(np.char.add(np.char.strip(headers['network'].astype(str)), '.'),
+                                  np.char.strip(headers['station'].astype(str))), '.'), np.char.strip(headers['location'].astype(str))), '.'),
+                      np.char.strip(headers['channel'].astype(str)))
+
+    recIndex = {'record_length': recLen, 'ids': ids, 'starts': starts, 'ends': ends, 'delta': delta}
+    if use_cache:
+        with MSEED_RECORD_INDEX_LOCK:
+            # Keep cache from growing indefinitely (remove the oldest index first)
+            while len(MSEED_RECORD_INDEX_CACHE) >= MSEED_RECORD_INDEX_CACHE_SIZE:
+                del MSEED_RECORD_INDEX_CACHE[next(iter(MSEED_RECORD_INDEX_CACHE))]
+            MSEED_RECORD_INDEX_CACHE[cacheKey] = recIndex
+    return recIndex
+
+
+# Helper function to read only the part of a file between starttime and endtime
+def _read_data_window(filepath, starttime=None, endtime=None, nearest_sample=True, use_index=True, **read_kwargs):
+    """Reads data from filepath between starttime and endtime. 
+    
+    For miniseed files, only the records that overlap [starttime, endtime] are read from the file and decoded (see _get_mseed_record_index()).
+    Other files are read with obspy.read(), which then trims the data.
+
+    Parameters
+    ----------
+    filepath : str or pathlib.Path
+        Path to data file
+    starttime : obspy.UTCDateTime or None, optional
+        Start of time window to read. If None, data is read from the start of the file, by default None
+    endtime : obspy.UTCDateTime or None, optional
+        End of time window to read. If None, data is read to the end of the file, by default None
+    nearest_sample : bool, optional
+        Passed to obspy.read(), by default True
+    use_index : bool, optional
+        Whether to use the (cached) index of miniseed records to only read the records that are needed, by default True
+    **read_kwargs
+        Other keyword arguments passed to obspy.read()
 
+    Returns
+    -------
+    obspy.Stream
+    """
+    read_kwargs = {k: v for k, v in read_kwargs.items() if k not in ['starttime', 'endtime', 'nearest_sample']}
+    if starttime is None and endtime is None:
+        return obspy.read(str(filepath), **read_kwargs)
+
+    starttime = None if starttime is None else obspy.UTCDateTime(starttime)
+    endtime = None if endtime is None else obspy.UTCDateTime(endtime)
+
+    recIndex = None
+    if use_index and str(read_kwargs.get('format', 'MSEED')).upper() == 'MSEED':
+        recIndex = _get_mseed_record_index(filepath)
+
+    if recIndex is None:
+        return obspy.read(str(filepath), starttime=starttime, endtime=endtime, nearest_sample=nearest_sample, **read_kwargs)
+
+    # Records that overlap time window (plus one sample on either side, for nearest_sample)
+    t0 = -np.inf if starttime is None else starttime.timestamp
+    t1 = np.inf if endtime is None else endtime.timestamp
+    recInds = np.flatnonzero((recIndex['ends'] + recIndex['delta'] >= t0) & (recIndex['starts'] - recIndex['delta'] <= t1))
+    if recInds.size == 0:
+        return obspy.Stream()
+
+    # Read each contiguous set of records at once
+    recLen = recIndex['record_length']
+    runStarts, runEnds = sprit_jit.runs_from_indices(recInds)
+    recordBuffer = io.BytesIO()
+    with open(filepath, 'rb') as f:
+        for firstRec, lastRec in zip(runStarts, runEnds):
+            f.seek(int(firstRec) * recLen)
+            recordBuffer.write(f.read(int(lastRec - firstRec + 1) * recLen))
+    recordBuffer.seek(0)
+    read_kwargs['format'] = 'MSEED'
+    return obspy.read(recordBuffer, starttime=starttime, endtime=endtime, nearest_sample=nearest_sample, **read_kwargs)
 
 # Helper function to sort channels
 def _sort_channels(input, source, verbose):
@@ -6346,43 +8895,74 @@ def _trim_data(input, stream=None, export_dir=None, data_export_format=None, sou
 
 
 # Helper function to detrend data
-def __detrend_data(input, detrend, detrend_options, verbose, source):
-    """Helper function to detrend data, specifically formatted for the HVSRData and HVSRBatch objects"""
+def __detrend_data(input, detrend, detrend_options, verbose, source, filter_type=None, filter_options={}):
+    """Helper function to detrend (and filter) data, specifically formatted for the HVSRData and HVSRBatch objects.
+    
+    Aligned traces (e.g., the Z, E, and N components) are stacked into a single 2-D array so each step is done once for all components. 
+    The input traces are not changed: new traces are only created if detrending is successful (otherwise the input data is used as-is).
+    For masked traces, each unmasked segment is detrended and filtered separately and the mask is kept.
+    """
     if source != 'batch':
         input = {'SITENAME': {'stream':input}} #Make same structure as batch
 
     for key in input.keys():
         dataIN = input[key]['stream']
-        if detrend==False:
-            pass
-        elif detrend==True:
-            #By default, do a spline removal
-            for tr in dataIN:
-                tr.detrend(type='spline', order=detrend_options, dspline=1000)        
-        else:
-            data_undetrended = dataIN.copy()
+        if (detrend is False or detrend is None) and filter_type is None:
+            continue
+
+        # Group traces with the same starttime, sampling rate, and number of samples
+        #   obspy cannot detrend or filter across masked samples, so each unmasked segment of a masked trace is processed on its own
+        traceGroups = {}
+        for tr in dataIN:
+            if np.ma.is_masked(tr.data):
+                trParts = [(seg, int(round((seg.stats.starttime - tr.stats.starttime) * tr.stats.sampling_rate))) for seg in tr.split()]
+            else:
+                trParts = [(tr, 0)]
+            for trPart, partOffset in trParts:
+                trKey = (str(trPart.stats.starttime), float(trPart.stats.sampling_rate), int(trPart.stats.npts))
+                traceGroups.setdefault(trKey, []).append((tr, trPart, partOffset))
+
+        procRows = {id(tr): [] for tr in dataIN}
+        detrendedTraces = set()
+        for trGroup in traceGroups.values():
+            dataArr = np.vstack([np.asarray(np.ma.getdata(trPart.data), dtype=np.float64) for tr, trPart, partOffset in trGroup])
+            detrended = False
             try:
-                if str(detrend).lower()=='simple':
-                    for tr in dataIN:
-                        tr.detrend(type=detrend)
-                if str(detrend).lower()=='linear':
-                    for tr in dataIN:
-                        tr.detrend(type=detrend)
-                if str(detrend).lower()=='constant' or detrend=='demean':
-                    for tr in dataIN:
-                        tr.detrend(type=detrend)                
-                if str(detrend).lower()=='polynomial':
-                    for tr in dataIN:
-                        tr.detrend(type=detrend, order=detrend_options)   
-                if str(detrend).lower()=='spline':
-                    for tr in dataIN:
-                        tr.detrend(type=detrend, order=int(detrend_options), dspline=1000)       
-            except:
-                dataIN = data_undetrended
+                dataArr = _detrend_array(dataArr, detrend=detrend, detrend_options=detrend_options)
+                detrended = detrend is not False and detrend is not None
+            except Exception:
+                dataArr = np.vstack([np.asarray(np.ma.getdata(trPart.data), dtype=np.float64) for tr, trPart, partOffset in trGroup])
                 if verbose:
                     warnings.warn("Detrend error, data not detrended", UserWarning)
-        
-        input[key]['stream'] = dataIN
+
+            if filter_type is not None:
+                dataArr = _filter_array(dataArr, filter_type=filter_type, filter_options=filter_options, sampling_rate=trGroup[0][1].stats.sampling_rate)
+
+            for i, (tr, trPart, partOffset) in enumerate(trGroup):
+                procRows[id(tr)].append((partOffset, dataArr[i]))
+            if detrended:
+                detrendedTraces.update(id(tr) for tr, trPart, partOffset in trGroup)
+
+        # Only data has changed, so new traces are made with the same stats (plus the processing steps, in the same format as obspy)
+        detrendInfo = _processing_info('detrend', **_detrend_processing_args(detrend, detrend_options))
+        filterInfo = _processing_info('filter', type=filter_type, options=dict(filter_options), args=())
+        newTraces = {}
+        for tr in dataIN:
+            if np.ma.is_masked(tr.data):
+                newData = np.ma.getdata(tr.data).astype(np.float64)
+                for partOffset, row in procRows[id(tr)]:
+                    newData[partOffset:partOffset + row.size] = row
+                newData = np.ma.masked_array(newData, mask=np.ma.getmaskarray(tr.data).copy())
+            else:
+                newData = procRows[id(tr)][0][1]
+            newTr = obspy.Trace(data=newData, header=tr.stats.copy())
+            if id(tr) in detrendedTraces:
+                newTr.stats.setdefault('processing', []).append(detrendInfo)
+            if filter_type is not None:
+                newTr.stats.setdefault('processing', []).append(filterInfo)
+            newTraces[id(tr)] = newTr
+
+        input[key]['stream'] = obspy.Stream([newTraces[id(tr)] for tr in dataIN])
 
     if source=='batch':
         #Return a dict
@@ -6393,8 +8973,158 @@ def __detrend_data(input, detrend, detrend_options, verbose, source):
     return output
 
 
+# Helper function to detrend all the rows of a 2-D array (one row per trace) at once
+def _detrend_array(data, detrend, detrend_options=2, dspline=1000):
+    """Detrends each row of data (in place, where possible), in the same way as the obspy.Trace.detrend() type of the same name.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        2-D float array, with one row per trace (all rows must have the same number of samples)
+    detrend : str or bool
+        Type of detrending: 'simple', 'linear', 'constant' (or 'demean'), 'polynomial', or 'spline'. 
+        If True, spline detrending is used. If False or None (or any other string), data is returned unchanged.
+    detrend_options : int, optional
+        Order of the polynomial or spline, by default 2
+    dspline : int, optional
+        Number of samples between spline knots, by default 1000
+
+    Returns
+    -------
+    numpy.ndarray
+        Detrended data
+    """
+    if detrend is False or detrend is None:
+        return data
+    if detrend is True:
+        detrend = 'spline'
+    detrend = str(detrend).lower()
+    npts = data.shape[1]
+
+    if detrend == 'simple':
+        data -= data[:, :1] + np.arange(npts) * (data[:, -1:] - data[:, :1]) / float(npts - 1)
+    elif detrend in ['linear', 'constant', 'demean']:
+        if detrend == 'demean':
+            detrend = 'constant'
+        data = scipy.signal.detrend(data, axis=1, type=detrend, overwrite_data=True)
+    elif detrend == 'polynomial':
+        x = np.arange(npts)
+        coeffs = np.polyfit(x, data.T, deg=int(detrend_options))
+        data -= (np.vander(x, int(detrend_options) + 1) @ coeffs).T
+    elif detrend == 'spline':
+        # Same knots as obspy.signal.detrend.spline(); the b-spline least-squares fit is done for all rows at once
+        order = int(detrend_options)
+        x = np.arange(npts, dtype=np.float64)
+        splknots = np.arange(dspline / 2.0, npts - dspline / 2.0 + 2, dspline)
+        knots = np.concatenate([np.repeat(x[0], order + 1), splknots, np.repeat(x[-1], order + 1)])
+        # The (sparse) b-spline basis is shared by all rows, so the least-squares problem only needs to be set up once
+        basis = scipy.interpolate.BSpline.design_matrix(x, knots, order).tocsc()
+        # The normal equations matrix is symmetric with (order) diagonals on each side of the main one, so it is solved in banded form
+        gram = (basis.T @ basis).tocoo()
+        upper = gram.row <= gram.col
+        gramBands = np.zeros((order + 1, gram.shape[0]))
+        gramBands[order + gram.row[upper] - gram.col[upper], gram.col[upper]] = gram.data[upper]
+        coeffs = scipy.linalg.solveh_banded(gramBands, basis.T @ data.T)
+        data -= (basis @ coeffs).T
+    return data
+
+
+# Helper function to get the detrend arguments in the form they were given to obspy.Trace.detrend()
+def _detrend_processing_args(detrend, detrend_options):
+    if detrend is True:
+        return {'type': 'spline', 'options': {'order': detrend_options, 'dspline': 1000}}
+    if str(detrend).lower() == 'polynomial':
+        return {'type': detrend, 'options': {'order': detrend_options}}
+    if str(detrend).lower() == 'spline':
+        return {'type': detrend, 'options': {'order': int(detrend_options), 'dspline': 1000}}
+    return {'type': detrend, 'options': {}}
+
+
+# Helper function to format a processing step for trace.stats.processing, as obspy does for its own Trace methods
+def _processing_info(function, **arguments):
+    argList = sorted(f"{k}='{v}'" if isinstance(v, str) else f"{k}={v!r}" for k, v in arguments.items())
+    return f"ObsPy {obspy.__version__}: {function}({'::'.join(argList)})"
+
+
+# Helper function to filter all the rows of a 2-D array (one row per trace) at once
+def _filter_array(data, filter_type, filter_options, sampling_rate):
+    """Filters each row of data using the obspy.signal.filter function named filter_type (e.g., 'bandpass'), as with obspy.Stream.filter()"""
+    import obspy.signal.filter
+    filterFun = getattr(obspy.signal.filter, str(filter_type).lower())
+    filterOptions = dict(filter_options)
+    filterOptions['df'] = float(sampling_rate)
+    if 'axis' in inspect.signature(filterFun).parameters:
+        return np.asarray(filterFun(data, axis=-1, **filterOptions), dtype=np.float64)
+    # Older versions of obspy only filter along the first axis
+    return np.vstack([filterFun(row, **filterOptions) for row in data])
+
+
+# Helper function to decimate data
+def __decimate_data(stream, target_sampling_rate, hvsr_band, verbose=False):
+    """Helper function to decimate the data in stream (in place) to target_sampling_rate, or to the lowest rate that covers hvsr_band if target_sampling_rate='auto'.
+    
+    Integer factors use scipy.signal.decimate() with a zero-phase FIR anti-alias filter. 
+    Otherwise (or for segments too short to be filtered that way, e.g., between gaps), obspy's Trace.resample() is used, with its anti-alias filter.
+    All traces (and segments between gaps) are put on the same grid of new sample times, starting at the first sample of the stream, so they can be merged again afterwards.
+
+    Returns
+    -------
+    tuple
+        The decimated stream, and a dictionary with the original and new sampling rates (None if no traces were decimated)
+    """
+    # The FIR filter starts attenuating a little below the new Nyquist frequency, so keep it well above hvsr_band
+    minAutoRate = 2.5 * max(hvsr_band)
+
+    decimationInfo = None
+    shortSegments = []
+    if len(stream) > 0:
+        gridStart = min(tr.stats.starttime for tr in stream)
+    for tr in stream:
+        origRate = float(tr.stats.sampling_rate)
+        if str(target_sampling_rate).lower() == 'auto':
+            targetRate = origRate / max(int(origRate // minAutoRate), 1)
+        else:
+            targetRate = float(target_sampling_rate)
+            if targetRate < minAutoRate:
+                warnings.warn(f"target_sampling_rate={targetRate} does not cover hvsr_band={hvsr_band} (a sampling rate of at least {minAutoRate} is recommended)")
+
+        if targetRate >= origRate:
+            continue
+
+        factor = origRate / targetRate
+        decimated = False
+        if abs(factor - round(factor)) < 1e-6:
+            factor = int(round(factor))
+            # Skip the first samples of the trace, if needed, so that its first sample is on the new grid (e.g., for a segment after a gap)
+            nSkip = -int(round((tr.stats.starttime - gridStart) * origRate)) % factor
+            if 0 < nSkip < tr.stats.npts:
+                tr.stats.starttime += nSkip / origRate
+                tr.data = tr.data[nSkip:]
+            # Zero-phase filtering pads the data by three times the filter length (20*factor+1), so shorter segments cannot be filtered
+            if tr.stats.npts > 3 * (20 * factor + 1):
+                try:
+                    tr.data = scipy.signal.decimate(np.asarray(tr.data, dtype=np.float64), factor, ftype='fir', zero_phase=True)
+                    tr.stats.sampling_rate = origRate / factor
+                    decimated = True
+                except ValueError:
+                    pass
+            if not decimated:
+                shortSegments.append(tr.id)
+        if not decimated:
+            tr.resample(targetRate, window='hann', no_filter=False)
+            # Move the resampled trace (by less than half of a sample) onto the new grid
+            tr.stats.starttime = gridStart + round((tr.stats.starttime - gridStart) * targetRate) / targetRate
+        decimationInfo = {'original_sampling_rate': origRate, 'sampling_rate': float(tr.stats.sampling_rate), 'factor': factor}
+
+    if len(shortSegments) > 0:
+        warnings.warn(f"{len(shortSegments)} trace segment(s) too short for the zero-phase decimation filter were resampled with Trace.resample() instead ({', '.join(sorted(set(shortSegments)))})")
+    if verbose and decimationInfo is not None:
+        print(f"\tData decimated from {decimationInfo['original_sampling_rate']} Hz to {decimationInfo['sampling_rate']} Hz")
+    return stream, decimationInfo
+
+
 # Read data from raspberry shake
-def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=False):
+def __read_RS_file_struct(input_data, source, year, doy, inv, params, n_workers=1, verbose=False):
     """"Private function used by fetch_data() to read in Raspberry Shake data"""
     from obspy.core import UTCDateTime
     fileList = []
@@ -6404,26 +9134,20 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
     #Read RS files
     if source=='raw': #raw data with individual files per trace
         if input_data.is_dir():
-            for child in input_data.iterdir():
-                if child.is_file() and child.name.startswith('AM') and str(doy).zfill(3) in child.name and str(year) in child.name:
-                    filesinfolder = True
-                    folderPathList.append(input_data)
-                    fileList.append(child)
-                elif child.is_dir() and child.name.startswith('EH') and not filesinfolder:
-                    folderPathList.append(child)
-                    for c in child.iterdir():
-                        if c.is_file() and c.name.startswith('AM') and c.name.endswith(str(doy).zfill(3)) and str(year) in c.name:
-                            fileList.append(c)
-
+            # Use catalog of archive (indexed the first time it is used, then only updated with changes)
+            rsCatalog = _get_rs_catalog(input_data, verbose=verbose)
+            fileList = rsCatalog.find(station=params['station'], date=(year, doy), channels=params['channels'])
+            if len(fileList) != len(params['channels']):
+                # Files may have been added since the catalog was last refreshed (only directories that have changed are listed again)
+                fileList = rsCatalog.refresh(verbose=verbose).find(station=params['station'], date=(year, doy), channels=params['channels'])
+            if len(fileList) == 0:
+                # If there are no files for the specified station/channels, use any files from that day
+                fileList = rsCatalog.find(date=(year, doy))
 
             if len(fileList) == 0:
-                doyList = []
-                printList= []
-                for j, folder in enumerate(folderPathList):
-                    for i, file in enumerate(folder.iterdir()):
-                        if j ==0:
-                            doyList.append(str(year) + ' ' + str(file.name[-3:]))
-                            printList.append(f"{datetime.datetime.strptime(doyList[i], '%Y %j').strftime('%b %d')} | Day of year: {file.name[-3:]}")
+                printList = []
+                for yr, dy in rsCatalog.available_days(year=year):
+                    printList.append(f"{datetime.datetime.strptime(f'{yr} {dy}', '%Y %j').strftime('%b %d')} | Day of year: {str(dy).zfill(3)}")
                 if len(printList) == 0:
                     warnings.warn('No files found matching Raspberry Shake data structure or files in specified directory.')
                 else:
@@ -6432,30 +9156,28 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
                         print('\t',p)
                 return None
             elif len(fileList) !=3:
-                warnings.warn('3 channels needed! {} found.'.format(len(folderPathList)), UserWarning)
+                warnings.warn('3 channels needed! {} found.'.format(len(fileList)), UserWarning)
             else:
                 fileList.sort(reverse=True) # Puts z channel first
-                folderPathList.sort(reverse=True)
                 if verbose:
                     print('Reading files: \n\t{}\n\t{}\n\t{}'.format(fileList[0].name, fileList[1].name, fileList[2].name))
 
-            traceList = []
-            for i, f in enumerate(fileList):
-                with warnings.catch_warnings():
-                    warnings.filterwarnings(action='ignore', message='^readMSEEDBuffer()')
-                    st = obspy.read(str(f))#, starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
-                    st = st.split()
-                    st.trim(starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
-                    st.merge()
-                    tr = (st[0])
-                    #tr= obspy.Trace(tr.data,header=meta)
-                    traceList.append(tr)
-            rawDataIN = obspy.Stream(traceList)
-            with warnings.catch_warnings():
-                warnings.filterwarnings(action='ignore', message='Found more than one matching response.*')
+            def _read_rs_trace(f):
+                st = _read_data_window(f, starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
+                st = st.split()
+                st.trim(starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=False)
+                st.merge()
+                tr = (st[0])
+                #tr= obspy.Trace(tr.data,header=meta)
+                return tr
+
+            # Read the channel files concurrently (warning filters are set outside of threads, since they are not thread-safe)
+            with _rs_read_warning_filters():
+                traceList, params['file_read_times'] = _read_files(fileList, _read_rs_trace, n_workers=n_workers, verbose=verbose)
+                rawDataIN = obspy.Stream(traceList)
                 rawDataIN.attach_response(inv)
         else:
-            rawDataIN = obspy.read(str(input_data), starttime=UTCDateTime(params['starttime']), endttime=UTCDateTime(params['endtime']), nearest_sample=True)
+            rawDataIN = _read_data_window(input_data, starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=True)
             rawDataIN.attach_response(inv)
     elif source=='dir': #files with 3 traces, but may be several in a directory or only directory name provided
         OBSPY_FORMATS = ['AH','ALSEP_PSE','ALSEP_WTH','ALSEP_WTN','CSS','DMX','GCF','GSE1','GSE2','KINEMETRICS_EVT','MSEED','NNSA_KB_CORE','PDAS','PICKLE','Q','REFTEK130','RG16','SAC','SACXY','SEG2','SEGY','SEISAN','SH_ASC','SLIST','SU','TSPAIR','WAV','WIN','Y']
@@ -6471,24 +9193,18 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
                 folderPathList.append(input_data)
                 fileList.append(file.name)
                         
-        filepaths = []
+        filepaths = sorted([folderPathList[i].joinpath(f) for i, f in enumerate(fileList)])
         rawDataIN = obspy.Stream()
-        for i, f in enumerate(fileList):
-            filepaths.append(folderPathList[i].joinpath(f))
-            #filepaths[i] = pathlib.Path(filepaths[i])
-            currData = obspy.read(filepaths[i])
-            currData.merge()
-            #rawDataIN.append(currData)
-            #if i == 0:
-            #    rawDataIN = currData.copy()
+        dirStreams, params['file_read_times'] = _read_files(filepaths, lambda fpath: obspy.read(fpath).merge(), n_workers=n_workers, verbose=verbose)
+        for currData in dirStreams:
             if isinstance(currData, obspy.core.stream.Stream):
-                rawDataIN += currData.copy()
+                rawDataIN += currData
         #rawDataIN = obspy.Stream(rawDataIN)
         rawDataIN.attach_response(inv)  
         if type(rawDataIN) is list and len(rawDataIN)==1:
             rawDataIN = rawDataIN[0]
     elif source=='file':
-        rawDataIN = obspy.read(str(input_data), starttime=UTCDateTime(params['starttime']), endttime=UTCDateTime(params['endtime']), nearest=True)
+        rawDataIN = _read_data_window(input_data, starttime=UTCDateTime(params['starttime']), endtime=UTCDateTime(params['endtime']), nearest_sample=True)
         rawDataIN.merge()   
         rawDataIN.attach_response(inv)
     elif type(source) is list or type(input_data) is list:
@@ -6501,56 +9217,31 @@ def __read_RS_file_struct(input_data, source, year, doy, inv, params, verbose=Fa
 # Helper functions for remove_noise()
 # Helper function for removing gaps
 def __remove_gaps(stream, window_gaps_obspy):
-    """Helper function for removing gaps"""
-    
-    # combine overlapping windows
-    overlapList = []
-    for i in range(len(window_gaps_obspy)-2):
-        if window_gaps_obspy[i][1] > window_gaps_obspy[i+1][0]:
-            overlapList.append(i)
-    
-    for i, t in enumerate(overlapList):
-        if i < len(window_gaps_obspy)-2:
-            window_gaps_obspy[i][1] = window_gaps_obspy[i+1][1]
-            window_gaps_obspy.pop(i+1)
-
-    # Add streams
-    window_gaps_s = []
-    for w, win in enumerate(window_gaps_obspy):
-        if w == 0:
-            pass
-        elif w == len(window_gaps_obspy)-1:
-            pass
-        else:
-            window_gaps_s.append(win[1]-win[0])
-    
-    if len(window_gaps_s) > 0:
-        stream_windows = []
-        j = 0
-        for i, window in enumerate(window_gaps_s):
-            j=i
-            newSt = stream.copy()
-            stream_windows.append(newSt.trim(starttime=window_gaps_obspy[i][1], endtime=window_gaps_obspy[i+1][0]))
-        i = j + 1
-        newSt = stream.copy()
-        stream_windows.append(newSt.trim(starttime=window_gaps_obspy[i][1], endtime=window_gaps_obspy[i+1][0]))
-
-        for i, st in enumerate(stream_windows):
-            if i == 0:
-                outStream = st.copy()
-            else:
-                newSt = st.copy()
-                gap = window_gaps_s[i-1]
-                outStream = outStream + newSt.trim(starttime=st[0].stats.starttime - gap, pad=True, fill_value=None)
-        outStream.merge()
+    """Helper function for removing gaps
+    
+    Parameters
+    ----------
+    stream : obspy.Stream
+        Stream from which to remove windows
+    window_gaps_obspy : list or IntervalSet
+        Windows to remove. If a list, it should be a list of [start, end] windows (obspy.UTCDateTime), 
+        with the first and last items being the start and end of the stream (these are not removed).
+
+    Returns
+    -------
+    obspy.Stream
+        Copy of stream with masked arrays where windows have been removed
+    """
+    if isinstance(window_gaps_obspy, IntervalSet):
+        removeWindows = window_gaps_obspy
     else:
-        outStream = stream.copy()
+        removeWindows = IntervalSet(window_gaps_obspy[1:-1])
 
-    return outStream
+    return removeWindows.apply(stream)
 
 
 # Helper function for getting windows to remove noise using stalta antitrigger method
-def __remove_anti_stalta(stream, sta, lta, thresh, show_stalta_plot=False, verbose=False):
+def __remove_anti_stalta(stream, sta, lta, thresh, show_stalta_plot=False, n_workers=1, return_windows=False, cft_cache=None, verbose=False):
     """Helper function for getting windows to remove noise using stalta antitrigger method
 
     Parameters
@@ -6567,6 +9258,12 @@ def __remove_anti_stalta(stream, sta, lta, thresh, show_stalta_plot=False, verbo
         the second value (index [1] is the upper threshold (above which trigger is activated)), by default [8, 8]
     show_plot : bool
         If True, will plot the trigger and stalta values. Reads from remove_noise() function, by default False.
+    n_workers : int
+        Number of threads to use to calculate the characteristic function of each trace, by default 1.
+    return_windows : bool
+        If True, returns an IntervalSet with the windows to be removed rather than the stream with those windows removed, by default False.
+    cft_cache : STALTACache or None
+        If specified, characteristic functions are read from (or saved to) this cache, so they are only calculated once for the same data, sta, and lta, by default None.
 
     Returns
     -------
@@ -6582,52 +9279,34 @@ def __remove_anti_stalta(stream, sta, lta, thresh, show_stalta_plot=False, verbo
 
     sta_samples = sta / sampleRate #Convert to samples
     lta_samples = lta / sampleRate #Convert to samples
-    staltaStream = stream.copy()
     cFunList = []
 
-    for t, tr in enumerate(staltaStream):
-        with warnings.catch_warnings():
-            warnings.filterwarnings('ignore', category=UserWarning)
-            cFunList.append(classic_sta_lta(tr, nsta=sta_samples, nlta=lta_samples))
+    # The traces are not changed, so they do not need to be copied (and the cache can identify their data arrays)
+    def _get_cft(tr):
+        # Masked samples are nan, as when a masked trace is converted to a float array sample by sample,
+        #   but without the UserWarning for each masked sample (warnings.catch_warnings() is not thread-safe, so it is not used here)
+        trData = np.ma.filled(np.ma.masked_array(tr.data, dtype=np.float64), np.nan)
+        return classic_sta_lta(trData, nsta=sta_samples, nlta=lta_samples)
+
+    if cft_cache is None:
+        cFunList = _threaded_map(_get_cft, stream, n_workers=n_workers)
+    else:
+        cFunList = _threaded_map(lambda tr: cft_cache.get(tr, sta, lta, _get_cft), stream, n_workers=n_workers)
 
     if show_stalta_plot is True:
-        obspy.signal.trigger.plot_trigger(tr, cFunList[0], thresh[1], thresh[0])
+        obspy.signal.trigger.plot_trigger(stream[0], cFunList[0], thresh[1], thresh[0])
     elif type(show_stalta_plot) is int:
-        obspy.signal.trigger.plot_trigger(tr, cFunList[show_stalta_plot], thresh[1], thresh[0])
+        obspy.signal.trigger.plot_trigger(stream[show_stalta_plot], cFunList[show_stalta_plot], thresh[1], thresh[0])
 
     windows_samples = []
     for t, cf in enumerate(cFunList):
-        if len(obspy.signal.trigger.trigger_onset(cf, thresh[1], thresh[0])) > 0:
-            windows_samples.extend(obspy.signal.trigger.trigger_onset(cf, thresh[1], thresh[0]).tolist())
-    def condense_window_samples(win_samples):
-        # Sort the list of lists based on the first element of each internal list
-        sorted_list = sorted(win_samples, key=lambda x: x[0])
-        
-        # Initialize an empty result list
-        result = []
-        if len(win_samples) == 0:
-            return result
-        # Initialize variables to track the current range
-        start, end = sorted_list[0]
-        
-        # Iterate over the sorted list
-        for i in range(1, len(sorted_list)):
-            current_start, current_end = sorted_list[i]
-            
-            # If the current range overlaps with the previous range
-            if current_start <= end:
-                # Update the end of the current range
-                end = max(end, current_end)
-            else:
-                # Add the previous range to the result and update the current range
-                result.append([start, end])
-                start, end = current_start, current_end
-        
-        # Add the last range to the result
-        result.append([start, end])
-        
-        return result        
-    windows_samples = condense_window_samples(windows_samples)
+        onsets = obspy.signal.trigger.trigger_onset(cf, thresh[1], thresh[0])
+        if len(onsets) > 0:
+            windows_samples.extend(onsets.tolist())
+
+    # Combine overlapping windows from all traces
+    windows_samples = np.array(windows_samples, dtype=np.int64).reshape(-1, 2)
+    windows_samples = np.column_stack(sprit_jit.merge_windows(windows_samples[:, 0], windows_samples[:, 1])).tolist()
 
     startT = stream[0].stats.starttime
     endT = stream[0].stats.endtime
@@ -6648,12 +9327,14 @@ def condense_window_samples(win_samples):
     
     window_UTC.append([endT, endT])
     #window_MPL[w].append(window_UTC[w][i].matplotlib_date)
+    if return_windows:
+        return IntervalSet(window_UTC[1:-1])
     outStream = __remove_gaps(stream, window_UTC)
     return outStream
 
 
 # Helper function for getting windows to remove noise using moving stdev
-def __remove_moving_std(stream, std_ratio_thresh=2, std_window_s=20, min_win_size=5):
+def __remove_moving_std(stream, std_ratio_thresh=2, std_window_s=20, min_win_size=5, return_windows=False):
     """Helper function for removing noisy data due to high local standard deviation.
     This is similar to the default noise removal method used in Grilla software.
 
@@ -6669,86 +9350,43 @@ def __remove_moving_std(stream, std_ratio_thresh=2, std_window_s=20, min_win_siz
         Size of the rolling window in seconds to use to calculate the local/moving/rolling standard deviation, by default 20
     min_win_size : float, optional
         The minimum size of window in seconds for data removal (where all points in that window exceed std_ratio_thresh), by default 5
+    return_windows : bool, optional
+        If True, returns an IntervalSet with the windows to be removed rather than the stream with those windows removed, by default False
 
     Returns
     -------
     obspy.Stream
         Obspy Stream object with "noisy" windows calculated by remove_moving_std masked, if applicable.
     """
-    instream = stream.copy()
-    outstream = instream.copy()
-
-    removeDTs = pd.DatetimeIndex([], tz='UTC')  # Empty index to start
-    # Use pandas to simplify rolling/moving std
-    for tr in instream.split():
-        dtList = []
-        for t in tr.times(type="utcdatetime"):
-            dtList.append(t.datetime.replace(tzinfo=zoneinfo.ZoneInfo('UTC')))
-        # Create pandas series out of trace data
-        traceData = pd.Series(data=tr.data,
-                            index=dtList)
-
-        # Get StDev values
-        totalSTD = traceData.std()
-        movingSTD = traceData.rolling(datetime.timedelta(seconds=std_window_s), center=True).std()
-
-        # Calculate whether ratio is larger than threshold value
-        boolseries = np.abs(movingSTD/totalSTD) > std_ratio_thresh
+    removeWindows = IntervalSet()
+    for tr in stream.split():
+        delta = tr.stats.delta
+        std_window_samples = int(round(std_window_s / delta))
+        min_win_samples = int(min_win_size / delta)
 
-        # Create index of just removed windows
-        removeDTs = removeDTs.join(boolseries.iloc[np.nonzero(boolseries)[0]].index, how='outer')
+        # Get StDev values (kernel is compiled if numba is installed)
+        traceData = np.asarray(tr.data, dtype=float)
+        totalSTD = np.std(traceData, ddof=1)
+        movingSTD = sprit_jit.moving_std(traceData, std_window_samples)
 
-    # Get unique indices as datetime.datetime objects
-    removeDTs = removeDTs.unique()  # Get unique dtindex
-    removeDTs.sort_values()  # Sort dt index
-    removeDTs = removeDTs.to_pydatetime()  # Convert to np.array of datetime.datetime objs
+        # Calculate whether ratio is larger than threshold value
+        with np.errstate(invalid='ignore'):
+            exceedsThresh = np.abs(movingSTD/totalSTD) > std_ratio_thresh
 
-    delta = stream[0].stats.delta  # Get sample rate
+        # Convert instances of mstd/totstd > thresh to windows (keep if longer than min_win_size)
+        runStarts, runEnds = sprit_jit.runs_from_mask(exceedsThresh, min_win_samples)
+        startTS = tr.stats.starttime.timestamp
+        removeWindows = removeWindows | IntervalSet(np.column_stack([startTS + runStarts*delta, startTS + runEnds*delta]), time_type='timestamp')
 
-    # Convert instances of mstd/totstd > thresh to windows (keep if longer than min_win_size)
-    windows = []
-    windex = 0
-    for i, rdt in enumerate(removeDTs):
-        if i == 0:
-            # Intialize windows list
-            windows.append([rdt, None])
-        else:
-            # If the "window" is just two samples next to each other, keep moving
-            if (rdt - removeDTs[i-1]).total_seconds() == delta:
-                pass
-            elif (rdt - removeDTs[i-1]).total_seconds() < delta:
-                # if for some reason the window is less than sample rate, move on
-                pass
-            else:
-                # if window exists, but is smaller than min_win_size
-                if (removeDTs[i-1] - windows[windex][0]).total_seconds() < min_win_size:
-                    windows.pop()  # remove this window
-                    windows.append([removeDTs[i+1], None]) # Rest the window w/next data point
-                    continue  # Go to next dt
-
-                windows[windex][1] = removeDTs[i-1] # Close last window
-                windows.append([rdt, None]) # Start a new window
-                windex += 1 # Update window index
-    windows = windows[:-1]
-    # Need to convert these to windows now!
-    removeUTC = []
-    for swin, ewin in windows:
-        removeUTC.append([obspy.UTCDateTime(swin), obspy.UTCDateTime(ewin)])
-    
-    stime = outstream.split()[0].stats.starttime
-    etime = outstream.split()[-1].stats.endtime
-    removeUTC.insert(0, [stime, stime])
-    removeUTC.append([etime, etime])
-
-    #for win0, win1 in removeUTC:
-    #    print(win0, win1, win1>win0)
-    outstream  = __remove_gaps(outstream, removeUTC)
+    if return_windows:
+        return removeWindows
+    outstream  = __remove_gaps(stream, removeWindows)
 
     return outstream
 
 
 # Remove noise saturation
-def __remove_noise_saturate(stream, sat_percent, min_win_size, verbose=False):
+def __remove_noise_saturate(stream, sat_percent, min_win_size, n_workers=1, return_windows=False, verbose=False):
     """Function to remove "saturated" data points that exceed a certain percent (sat_percent) of the maximum data value in the stream.  
 
     Parameters
@@ -6759,6 +9397,10 @@ def __remove_noise_saturate(stream, sat_percent, min_win_size, verbose=False):
         Percentage of the maximum amplitude, which will be used as the saturation threshold above which data points will be excluded
     min_win_size : float
         The minumum size a window must be (in seconds) for it to be removed
+    n_workers : int, optional
+        Number of threads to use to scan the traces, by default 1
+    return_windows : bool, optional
+        If True, returns an IntervalSet with the windows to be removed rather than the stream with those windows removed, by default False
 
     Returns
     -------
@@ -6770,55 +9412,38 @@ def __remove_noise_saturate(stream, sat_percent, min_win_size, verbose=False):
     if sat_percent > 1:
         sat_percent = sat_percent / 100
 
-    removeInd = np.array([], dtype=int)
-    for trace in stream:
+    def _get_saturated_ind(trace):
         dataArr = trace.data.copy()
 
-        sample_rate = trace.stats.delta
-
         #Get max amplitude value
         maxAmp = np.max(np.absolute(dataArr, where = not None))
         thresholdAmp = maxAmp * sat_percent
         cond = np.nonzero(np.absolute(dataArr, where=not None) > thresholdAmp)[0]
-        removeInd = np.hstack([removeInd, cond])
+        return cond
         #trace.data = np.ma.where(np.absolute(data, where = not None) > (noise_percent * maxAmp), None, data)
+
+    sample_rate = stream[-1].stats.delta
     #Combine indices from all three traces
+    removeInd = np.hstack([np.array([], dtype=int)] + _threaded_map(_get_saturated_ind, stream, n_workers=n_workers))
     removeInd = np.unique(removeInd)
     
-    removeList = []  # initialize
+    # Get runs of consecutive indices that are long enough to remove (kernel is compiled if numba is installed)
     min_win_samples = int(min_win_size / sample_rate)
+    runStarts, runEnds = sprit_jit.runs_from_indices(removeInd, min_win_samples)
 
-    if len(removeInd) > 0:
-        startInd = removeInd[0]
-        endInd = removeInd[0]
-
-        for i in range(0, len(removeInd)):             
-            if removeInd[i] - removeInd[i-1] > 1:
-                if endInd - startInd >= min_win_samples:
-                    removeList.append([int(startInd), int(endInd)])
-                startInd = removeInd[i]
-            endInd = removeInd[i]
-
-    removeList.append([-1, -1]) #figure out a way to get rid of this
-
-    #Convert removeList from samples to seconds after start to UTCDateTime
+    #Convert runs from samples to times
     sampleRate = stream[0].stats.delta
-    startT = stream[0].stats.starttime
-    endT = stream[0].stats.endtime
-    removeSec = []
-    removeUTC = []
-    removeUTC.append([startT, startT])
-    for i, win in enumerate(removeList):
-        removeSec.append(list(np.round(sampleRate * np.array(win),6)))
-        removeUTC.append(list(np.add(startT, removeSec[i])))
-    removeUTC[-1][0] = removeUTC[-1][1] = endT
-    
-    outstream  = __remove_gaps(stream, removeUTC)
+    startTS = stream[0].stats.starttime.timestamp
+    removeWindows = IntervalSet(np.column_stack([startTS + runStarts*sampleRate, startTS + runEnds*sampleRate]), time_type='timestamp')
+
+    if return_windows:
+        return removeWindows
+    outstream  = __remove_gaps(stream, removeWindows)
     return outstream
 
 
 # Helper function for removing data using the noise threshold input from remove_noise()
-def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, verbose=False):
+def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, n_workers=1, return_windows=False, verbose=False):
     """Helper function for removing data using the noise threshold input from remove_noise()
 
     The purpose of the noise threshold method is to remove noisy windows (e.g., lots of traffic all at once). 
@@ -6836,6 +9461,10 @@ def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, ver
         Length of lta to use (in seconds)
     min_win_size : int, default = 1
         Minimum amount of time (in seconds) at which noise is above noise_percent level.
+    n_workers : int, default = 1
+        Number of threads to use to calculate the lta of each trace
+    return_windows : bool, default = False
+        If True, returns an IntervalSet with the windows to be removed rather than the stream with those windows removed
     
     Returns
     -------
@@ -6847,8 +9476,7 @@ def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, ver
     if noise_percent > 1:
         noise_percent = noise_percent / 100
 
-    removeInd = np.array([], dtype=int)
-    for trace in stream:
+    def _get_noisy_ind(trace):
         dataArr = trace.data.copy()
 
         sample_rate = trace.stats.delta
@@ -6864,51 +9492,31 @@ def __remove_noise_thresh(stream, noise_percent=0.8, lta=30, min_win_size=1, ver
         #Get max lta value
         maxLTA = np.max(ltaArr, where = not None)
         cond = np.nonzero(np.absolute(ltaArr, where=not None) > (noise_percent * maxLTA))[0]
-        removeInd = np.hstack([removeInd, cond])
+        return cond
         #trace.data = np.ma.where(np.absolute(data, where = not None) > (noise_percent * maxAmp), None, data)
+
+    sample_rate = stream[-1].stats.delta
     #Combine indices from all three traces
+    removeInd = np.hstack([np.array([], dtype=int)] + _threaded_map(_get_noisy_ind, stream, n_workers=n_workers))
     removeInd = np.unique(removeInd)
 
     # Make sure we're not removing single indices (we only want longer than min_win_size)
-    removeList = []  # initialize    
     min_win_samples = int(min_win_size / sample_rate)
-
-    if len(removeInd) > 0:
-        startInd = removeInd[0]
-        endInd = removeInd[0]
-
-        for i in range(0, len(removeInd)):
-            #If indices are non-consecutive... 
-            if removeInd[i] - removeInd[i-1] > 1:
-                #If the indices are non-consecutive and the 
-                if endInd - startInd >= min_win_samples:
-                    removeList.append([int(startInd), int(endInd)])
-                    
-                #Set startInd as the current index
-                startInd = removeInd[i]
-            endInd = removeInd[i]
-            
-    removeList.append([-1, -1])
+    runStarts, runEnds = sprit_jit.runs_from_indices(removeInd, min_win_samples)
 
     sampleRate = stream[0].stats.delta
-    startT = stream[0].stats.starttime
-    endT = stream[0].stats.endtime
-    removeSec = []
-    removeUTC = []
+    startTS = stream[0].stats.starttime.timestamp
+    removeWindows = IntervalSet(np.column_stack([startTS + runStarts*sampleRate, startTS + runEnds*sampleRate]), time_type='timestamp')
 
-    removeUTC.append([startT, startT])
-    for i, win in enumerate(removeList):
-        removeSec.append(list(np.round(sampleRate * np.array(win),6)))
-        removeUTC.append(list(np.add(startT, removeSec[i])))
-    removeUTC[-1][0] = removeUTC[-1][1] = endT
-
-    outstream  = __remove_gaps(stream, removeUTC)
+    if return_windows:
+        return removeWindows
+    outstream  = __remove_gaps(stream, removeWindows)
 
     return outstream
 
 
 # Helper function for removing data during warmup (when seismometers are still initializing) and "cooldown" (when there may be noise from deactivating seismometer) time, if desired
-def __remove_warmup_cooldown(stream, warmup_time = 0, cooldown_time = 0, verbose=False):
+def __remove_warmup_cooldown(stream, warmup_time = 0, cooldown_time = 0, return_windows=False, verbose=False):
     """Private helper function to remove data from the start and/or end of each site
 
     Parameters
@@ -6919,6 +9527,8 @@ def __remove_warmup_cooldown(stream, warmup_time = 0, cooldown_time = 0, verbose
         Time in seconds at the start of the record to remove from analysis, by default 0
     cooldown_time : int, optional
         Time in seconds at the end of the record to remove from analysis, by default 0
+    return_windows : bool, optional
+        If True, returns an IntervalSet with the windows to be removed rather than the stream with those windows removed, by default False
     verbose : bool, optional
         Whether to print information about the process to the terminal, by default False
 
@@ -6950,7 +9560,8 @@ def __remove_warmup_cooldown(stream, warmup_time = 0, cooldown_time = 0, verbose
 
     if windows_samples == []:
         # If no warmup or cooldown indicated, don't do anything
-        pass
+        if return_windows:
+            return IntervalSet()
     else:
         # Otherwise, get the actual starttime (UTCDateTime)
         startT = stream[0].stats.starttime
@@ -6973,6 +9584,9 @@ def __remove_warmup_cooldown(stream, warmup_time = 0, cooldown_time = 0, verbose
                 # Get the UTC time for the new item
                 window_UTC[w].append(startT+tSec)
                 window_MPL[w].append(window_UTC[w][j].matplotlib_date)
+        if return_windows:
+            return IntervalSet(window_UTC)
+
         # "pad" list with endtime
         window_UTC.insert(0, [startT, startT])
         window_UTC.append([endT, endT])
@@ -6983,7 +9597,7 @@ def __remove_warmup_cooldown(stream, warmup_time = 0, cooldown_time = 0, verbose
 
 
 # Helper function for selecting windows
-def _keep_processing_windows(stream, processing_window=[":"], verbose=False):
+def _keep_processing_windows(stream, processing_window=[":"], return_windows=False, verbose=False):
     """Keep processing windows
 
     Parameters
@@ -6992,6 +9606,9 @@ def _keep_processing_windows(stream, processing_window=[":"], verbose=False):
         Stream
     processing_window : list, optional
         Processing window list, by default [":"]
+    return_windows : bool, optional
+        If True, returns an IntervalSet with the windows to be removed (everything outside of the processing windows, at the samples of each trace)
+        rather than the stream with those windows removed, by default False
     verbose : bool, optional
         Whether to print information about the removal to the terminal
 
@@ -7006,7 +9623,6 @@ def _keep_processing_windows(stream, processing_window=[":"], verbose=False):
     instream = stream
     allList = [':', 'all', 'everything']
 
-    print(stream[0].stats.starttime.year)
     year = stream[0].stats.starttime.year
     month = stream[0].stats.starttime.month
     day = stream[0].stats.starttime.day
@@ -7017,6 +9633,8 @@ def _keep_processing_windows(stream, processing_window=[":"], verbose=False):
     windows_to_get = []
     for p in processing_window:
         if str(p).lower() in allList:
+            if return_windows:
+                return IntervalSet()
             return instream
         
         if isinstance(p, (tuple, list)):
@@ -7039,28 +9657,23 @@ def _keep_processing_windows(stream, processing_window=[":"], verbose=False):
                 print(f'The processing_window parameter of remove_noise was set as {processing_window}')
                 print("The processing_window parameter must be a list or tuple with a start and end time or with lists/tuples of start/end times.")
                 print('processing_window noise removal method not applied')
+                if return_windows:
+                    return IntervalSet()
                 return instream
     
     # windows_to_get should be a list of two-item lists with UTCDateTime objects no matter how it came in
-    stime = instream[0].stats.starttime
-    etime = instream[-1].stats.endtime
-
-    windows_to_get.insert(0, [stime, stime])
-    windows_to_get.append([etime, etime])
-
-    # Need the list formatted slightly different, use window_UTC
-    window_UTC = []
-    # Rearrange
-    for i, win in enumerate(windows_to_get):
-        if i == 0:
-            window_UTC.append([stime, windows_to_get[i+1][0]])
-        elif i < len(windows_to_get) - 1:
-            window_UTC.append([win[1], windows_to_get[i+1][0]])
-
-    window_UTC.insert(0, windows_to_get[0])
-    window_UTC.append(windows_to_get[-1])
-
-    outStream = __remove_gaps(stream, window_UTC)
+    # All processing windows are applied to the data at once, as a single mask
+    keepWindows = IntervalSet(windows_to_get)
+    if return_windows:
+        removeWindows = IntervalSet()
+        for tr in instream:
+            runStarts, runEnds = IntervalSet._mask_runs(~keepWindows.sample_mask(tr.stats.starttime, tr.stats.npts, tr.stats.delta))
+            # Windows extend half a sample past the first/last sample removed, so they cover the same samples regardless of timestamp precision
+            startTS = tr.stats.starttime.timestamp
+            removeWindows = removeWindows | IntervalSet(np.column_stack([startTS + (runStarts - 0.5)*tr.stats.delta, startTS + (runEnds + 0.5)*tr.stats.delta]), 
+                                                        time_type='timestamp')
+        return removeWindows
+    outStream = keepWindows.apply(instream, keep=True)
 
     return outStream
 
@@ -7363,23 +9976,9 @@ def _get_removed_windows(input, fig=None, ax=None, lineArtist =[], winArtist = [
     #windows.append([0,np.nan])
     #mask = np.isnan(trace.data)  # Create a mask for None values
     #masked_array = np.ma.array(trace.data, mask=mask).copy()
-    masked_array = trace.data.copy()
-    if isinstance(masked_array, np.ma.MaskedArray):
-        masked_array = masked_array.mask.nonzero()[0]
-        lastMaskInd = masked_array[0]-1
-        wInd = 0
-        for i in range(0, len(masked_array)-1):
-            maskInd = masked_array[i]
-            if maskInd-lastMaskInd > 1 or i==0:
-                windows.append([np.nan, np.nan])
-                if i==0:
-                    windows[wInd][0] = masked_array[i]
-                else:
-                    windows[wInd-1][1] = masked_array[i - 1]
-                windows[wInd][0] = masked_array[i]
-                wInd += 1
-            lastMaskInd = maskInd
-        windows[wInd-1][1] = masked_array[-1] #Fill in last masked value (wInd-1 b/c wInd+=1 earlier)
+    if isinstance(trace.data, np.ma.MaskedArray):
+        runStarts, runEnds = IntervalSet._mask_runs(np.ma.getmaskarray(trace.data))
+        windows = np.column_stack([runStarts, runEnds]).tolist()
     winTypeList = ['gaps'] * len(windows)
 
     #Check if the windows are just gaps
@@ -7530,111 +10129,30 @@ def __remove_windows(stream, window_list, warmup_time):
     outStream : obspy.core.stream.Stream object
         Stream with a masked array for the data where 'noise' has been removed
     """
-    og_stream = stream.copy()
-
     #Find the latest start time and earliest endtime of all traces (in case they aren't consistent)
-    maxStartTime = obspy.UTCDateTime(-1e10) #Go back pretty far (almost 400 years) to start with
-    minEndTime = obspy.UTCDateTime(1e10)
-    for comp in ['E', 'N', 'Z']:
-        tr = stream.select(component=comp).copy()
-        if tr[0].stats.starttime > maxStartTime:
-            maxStartTime = tr[0].stats.starttime
-        if tr[0].stats.endtime < minEndTime:
-            minEndTime = tr[0].stats.endtime
+    maxStartTime = max([tr.stats.starttime for tr in stream])
+    minEndTime = min([tr.stats.endtime for tr in stream])
 
     #Trim all traces to the same start/end time
     stream.trim(starttime=maxStartTime, endtime=minEndTime)      
 
-    #Sort windows by the start of the window
-    sorted_window_list = []
-    windowStart = []
-    for i, window in enumerate(window_list):
-        windowStart.append(window[0])
-    windowStart_og = windowStart.copy()
-    windowStart.sort()
-    sorted_start_list = windowStart
-    ranks = [windowStart_og.index(item) for item in sorted_start_list]
-    for r in ranks:
-        sorted_window_list.append(window_list[r])
-
-    for i, w in enumerate(sorted_window_list):
-        if i < len(sorted_window_list) - 1:
-            if w[1] > sorted_window_list[i+1][0]:
-                warnings.warn(f"Warning: Overlapping windows. Please start over and reselect windows to be removed or use a different noise removal method: {w[1]} '>' {sorted_window_list[i+1][0]}")
-                return
-                
-    window_gaps_obspy = []
-    window_gaps = []
+    # Windows are matplotlib dates; convert them all at once (overlapping windows are merged)
+    removeWindows = IntervalSet(window_list, time_type='matplotlib')
 
+    # Remove warmup time and a buffer (1% of the record) at the end of the record
     buffer_time = np.ceil((stream[0].stats.endtime-stream[0].stats.starttime)*0.01)
+    bufferWindows = [[stream[0].stats.endtime - buffer_time, stream[0].stats.endtime]]
+    if warmup_time > 0:
+        bufferWindows.append([stream[0].stats.starttime, stream[0].stats.starttime + warmup_time])
+    removeWindows = removeWindows | IntervalSet(bufferWindows)
 
-    #Get obspy.UTCDateTime objects for the gap times
-    window_gaps_obspy.append([stream[0].stats.starttime + warmup_time, stream[0].stats.starttime + warmup_time])
-    for i, window in enumerate(sorted_window_list):
-        for j, item in enumerate(window):
-            if j == 0:
-                window_gaps_obspy.append([0,0])
-            window_gaps_obspy[i+1][j] = obspy.UTCDateTime(matplotlib.dates.num2date(item))
-        window_gaps.append((window[1]-window[0])*86400)
-    window_gaps_obspy.append([stream[0].stats.endtime-buffer_time, stream[0].stats.endtime-buffer_time])
-    #Note, we added start and endtimes to obpsy list to help with later functionality
-
-    #Clean up stream windows (especially, start and end)
-    for i, window in enumerate(window_gaps):
-        newSt = stream.copy()
-        #Check if first window starts before end of warmup time
-        #If the start of the first exclusion window is before the warmup_time is over
-        if window_gaps_obspy[i+1][0] - newSt[0].stats.starttime < warmup_time:
-            #If the end of first exclusion window is also before the warmup_time is over
-            if window_gaps_obspy[i+1][1] - newSt[0].stats.starttime < warmup_time:
-                #Remove that window completely, it is unnecessary
-                window_gaps.pop(i)
-                window_gaps_obspy.pop(i+1)
-                #...and reset the entire window to start at the warmup_time end
-                window_gaps_obspy[0][0] = window_gaps_obspy[0][1] = newSt[0].stats.starttime + warmup_time
-                continue
-            else: #if window overlaps the start of the stream after warmup_time
-                #Remove that window
-                window_gaps.pop(i)
-                #...and reset the start of the window to be the end of warm up time
-                #...and  remove that first window from the obspy list
-                window_gaps_obspy[0][0] = window_gaps_obspy[0][1] =  window_gaps_obspy[i+1][1]#newSt[0].stats.starttime + warmup_time
-                window_gaps_obspy.pop(i+1)
-
-
-        if stream[0].stats.endtime - window_gaps_obspy[i+1][1] > stream[0].stats.endtime - buffer_time:        
-            if stream[0].stats.endtime - window_gaps_obspy[i+1][0] > stream[0].stats.endtime - buffer_time:
-                window_gaps.pop(i)
-                window_gaps_obspy.pop(i+1)
-            else:  #if end of window overlaps the buffer time, just end it at the start of the window (always end with stream, not gap)
-                window_gaps.pop(i)
-                window_gaps_obspy[-1][0] = window_gaps_obspy[-1][1] = newSt[0].stats.endtime - buffer_time
-   
-    #Add streams
-    stream_windows = []
-    j = 0
-    for i, window in enumerate(window_gaps):
-        j=i
-        newSt = stream.copy()
-        stream_windows.append(newSt.trim(starttime=window_gaps_obspy[i][1], endtime=window_gaps_obspy[i+1][0]))
-    i = j + 1
-    newSt = stream.copy()
-    stream_windows.append(newSt.trim(starttime=window_gaps_obspy[i][1], endtime=window_gaps_obspy[i+1][0]))
-
-    for i, st in enumerate(stream_windows):
-        if i == 0:
-            outStream = st.copy()
-        else:
-            newSt = st.copy()
-            gap = window_gaps[i-1]
-            outStream = outStream + newSt.trim(starttime=st[0].stats.starttime - gap, pad=True, fill_value=None)       
-    outStream.merge()
+    outStream = removeWindows.apply(stream)
     return outStream
 
 
 # Helper functions for generate_psds()
 # Generate psds from raw data (no response removed)
-def __single_psd_from_raw_data(hvsr_data, window_length=30.0, overlap=0.5, show_psd_plot=False, verbose=False):
+def __single_psd_from_raw_data(hvsr_data, window_length=30.0, overlap=0.5, num_freq_bins=500, show_psd_plot=False, n_workers=1, verbose=False):
     """Helper function to get psds from raw trace streams (no response information is needed in this case)
 
     Parameters
@@ -7647,8 +10165,12 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, overlap=0.5, show_
         Percent overlap between windows (0-1), by default 0.5.
         A percentage value between 1-100 will be accepted, but will be divided by 100 to convert to 0-1.
         If the value is over 100, the modulus of 100 will be calculated, then divided by 100; i.e., (overlap%100)/100.
+    num_freq_bins : int, optional
+        Number of (log-spaced) frequencies between hvsr_band[0] and hvsr_band[1] at which the psds are calculated, by default 500
     show_psd_plot : bool, optional
         Whether to show a plot of the psds, by default False
+    n_workers : int, optional
+        Number of threads used to calculate the psds of the components (and azimuths) concurrently, by default 1
     verbose : bool, optional
         Whether to print information about the PSD processing to terminal, by default False
 
@@ -7659,13 +10181,11 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, overlap=0.5, show_
         Values are numpy array containing the PSDs for that component at each time step.
         Index 1 of tuple contains a numpy array with the start and end times of each time window used for FFT processing.
     """
-    zdata = hvsr_data.stream.select(component='Z').merge()
-    edata = hvsr_data.stream.select(component='E').merge()
-    ndata = hvsr_data.stream.select(component='N').merge()
+    # Aligned data of all components (see HVSRData.component_matrix)
+    compMatrix = _get_component_matrix(hvsr_data)
 
-    sample_rate = zdata[0].stats.sampling_rate
-    sample_space = zdata[0].stats.delta
-    zdata = zdata.split()
+    sample_rate = compMatrix.sampling_rate
+    sample_space = compMatrix.delta
 
     # Transform overlap to proper formatting (% b/w 0-1)
     if overlap > 100:
@@ -7690,62 +10210,58 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, overlap=0.5, show_
         
     # Generated x values to which data will be interpolated later
     #  This maintains consistency in array size across all FFT windows
-    x_freqs = np.logspace(np.log10(0.4), np.log10(40), 500)
+    #  (these must be the same frequencies that generate_psds() assigns to the psds)
+    x_freqs = np.logspace(np.log10(hvsr_data['hvsr_band'][0]), np.log10(hvsr_data['hvsr_band'][1]), num_freq_bins)
+
+    # Get all possible windows (same for all components)
+    #  The windows that are actually used will likely be the same if there are no gaps in the data
+    windows = _create_windows(hvsr_data=hvsr_data, window=window_length, overlap=overlap, window_length_method='length', verbose=False)
 
     # For each component, create the time windows and do FFT analysis
-    psdDict = {'Z':{}, 'E':{}, 'N':{}}
-    for key, curr_component in {'Z':zdata, 'E':edata, 'N':ndata}.items():
-        # Get all data in same format (obspy.Stream, traces will be extracted later)
-        if isinstance(curr_component, obspy.Trace):
-            st = obspy.Stream([curr_component]).merge()
-        else:
-            st = curr_component.merge()
-        tr = st[0]
+    #  The components are independent, so they are processed concurrently if n_workers > 1 (all threads use the same aligned data)
+    def _component_psds(key):
+        compPSDs = {}
+        # Each window is a slice of the (aligned) data and (bit-packed) mask of the component, rather than a trimmed copy of the trace
+        trData = compMatrix.get_data(key)
+        trMask = compMatrix.get_mask(key)
+        trFirst, trLast = compMatrix.get_extent(key)
 
         # Initialize for intermediate outputs
         psds = []
         freqs = []
         final_psds = []
-
-        # Get all possible windows and initialize output window list for windows that are actually used
-        #  This will likely be the same if there are no gaps in the data
-        windows = _create_windows(hvsr_data=hvsr_data, window=window_length, overlap=overlap, window_length_method='length', verbose=False)
         windows_out = []
 
-        # Iterate through each window to trim data trace and perform fft analysis
+        # Iterate through each window to get data and perform fft analysis
         for i, (stime, etime) in enumerate(windows):
-            # Trim trace to just window time (copy so doesn't overwrite main trace)
-            window_trace = tr.copy()
-            window_trace.trim(starttime=stime, endtime=etime) 
-            
+            # Get first and last sample of window (nearest sample, as in obspy.Trace.trim()), within the extent of the component
+            firstSamp = max(compMatrix.sample_of(stime), trFirst)
+            lastSamp = min(compMatrix.sample_of(etime), trLast)
+
             # Handle gaps in data 
             # Only process longest continous data section in each window, if gaps exist
-            window_st = window_trace.split()  # Split into continuous data sections
-            longest_trace = window_st[0] # Initialize longest as first trace
-
-            if len(window_st) > 1: # if more than one trace comes out of .split()
-                # Get the longest trace and used that for analysis for this window
-                for shorttr in window_st:
-                    if len(shorttr) > len(longest_trace):
-                        longest_trace = shorttr
-            window_trace = longest_trace
+            runStarts, runEnds = trMask.runs(firstSamp, lastSamp + 1, masked=False)
+            if runStarts.size > 0:
+                longestRun = np.argmax(runEnds - runStarts)
+                window_data = trData[firstSamp + runStarts[longestRun]:firstSamp + runEnds[longestRun] + 1]
+            else:
+                window_data = trData[:0]
 
             # If the data being processed ends up being shorter than window time
             #    Reset inputs to scipy.signal.welch to match new "window" length
             nsamplesperwin = psd_window_samples
-            if len(window_trace) < nsamplesperwin:
-                nsamplesperwin = len(window_trace.data)
-                overlap_samples = nsamplesperwin - 1
+            win_overlap_samples = overlap_samples
+            if len(window_data) < nsamplesperwin:
+                nsamplesperwin = len(window_data)
+                win_overlap_samples = nsamplesperwin - 1
 
             # PERFORM FFT analysis using Welch method if length of window is > 1 sample
             # If time window used, the start time will be recorded in window_out list
                 # and PSD will be stored in psdDict[key][str(starttime)] as numpy array.
             if nsamplesperwin > 1:
-                with warnings.catch_warnings():
-                    warnings.simplefilter('ignore') # Sometimes unnecessary warnings arise
-                    f, pxx = scipy.signal.welch(window_trace.data, fs=window_trace.stats.sampling_rate, window='hann', nperseg=nsamplesperwin, 
-                                        noverlap=overlap_samples, nfft=None, detrend='linear', return_onesided=True, 
-                                        scaling='density', axis=-1, average='mean')
+                f, pxx = scipy.signal.welch(window_data, fs=sample_rate, window='hann', nperseg=nsamplesperwin, 
+                                    noverlap=win_overlap_samples, nfft=None, detrend='linear', return_onesided=True, 
+                                    scaling='density', axis=-1, average='mean')
                 
                 # Only add successful psds to psdDict (and the window starttime to window_out)
                 if pxx.size > 0 and f.size > 0:
@@ -7753,27 +10269,148 @@ def __single_psd_from_raw_data(hvsr_data, window_length=30.0, overlap=0.5, show_
                     psds.append(np.flip(pxx))
                     interpPSD = np.interp(x_freqs, f, pxx, left=None, right=None, period=None)
                     interpPSD_dB = 10*np.log10(interpPSD) # Convert to decibels
-                    psdDict[key][str(stime)] = interpPSD_dB
+                    compPSDs[str(stime)] = interpPSD_dB
                     final_psds.append(interpPSD_dB)
                 
                     windows_out.append(stime)
                 else:
                     if verbose:
-                        print(f"\tWindow starting at {stime} not used ({len(window_trace)} samples long)")
+                        print(f"\tWindow starting at {stime} not used ({len(window_data)} samples long)")
             else:
                 if verbose:
-                    print(f"\tWindow starting at {stime} not used ({len(window_trace)} samples long)")
+                    print(f"\tWindow starting at {stime} not used ({len(window_data)} samples long)")
         #psds = np.mean(np.array(final_psds), axis=0)
         #psdDict[key][str(stime)] = np.array(final_psds)
+        return compPSDs, windows_out, psds
 
+    # matplotlib is not thread-safe, so components are processed one after another if plotting
+    #   warnings.catch_warnings() is not thread-safe either, so it is only used here rather than in each window
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') # Sometimes unnecessary warnings arise
+        compResults = _threaded_map(_component_psds, ['Z', 'E', 'N'], n_workers=(1 if show_psd_plot else n_workers))
+    psdDict = {}
+    for key, (compPSDs, windows_out, psds) in zip(['Z', 'E', 'N'], compResults):
+        psdDict[key] = compPSDs
         if show_psd_plot:
             plt.plot(x_freqs, psds, linewidth=0.5, c='k')
             plt.semilogx()
             plt.semilogy()
 
+    # Radial (azimuthal) psds calculated from the N/E data of each window, if calculate_azimuth() stored azimuths (rather than radial traces)
+    #   'spectral_azimuths' use the N/E (cross) spectra, 'radial_azimuths' use the radial data of each window
+    if isinstance(hvsr_data, (HVSRData, dict)):
+        # Use the same windows as the other components, so all psds line up
+        azWindows = [(stime, etime) for stime, etime in windows if str(stime) in psdDict['N'].keys()]
+        for azKey, azDomain in [('spectral_azimuths', 'spectral'), ('radial_azimuths', 'time')]:
+            if azKey in hvsr_data.keys() and len(hvsr_data[azKey]) > 0:
+                psdDict.update(__azimuth_psds(compMatrix, azWindows, hvsr_data[azKey], x_freqs, psd_window_samples=psd_window_samples, 
+                                              overlap_samples=overlap_samples, domain=azDomain, n_workers=n_workers))
+
     return psdDict, np.array(windows_out)
 
 
+# Get the psds of radial components at many azimuths from the N/E data
+def __azimuth_psds(comp_matrix, windows, azimuths, x_freqs, psd_window_samples, overlap_samples, domain='spectral', n_workers=1):
+    """Helper function to calculate the psds of the radial components (N*cos(az) + E*sin(az)) at each azimuth without creating the radial traces.
+
+    If domain='spectral', the N and E psds (Pnn, Pee) and their cross spectrum (Pne) are calculated once for each window (same Welch parameters as __single_psd_from_raw_data()). 
+    Since the psd of a linear combination of two signals is cos(az)^2*Pnn + sin(az)^2*Pee + 2*sin(az)*cos(az)*Re(Pne), 
+    the psds of all azimuths are then calculated at once. The spectra are interpolated to x_freqs before they are combined, since interpolation is also linear.
+    If domain='time', the radial data of all azimuths is calculated only for the samples of each window, and the psd of each is calculated from that data 
+    (the same as the psds of radial traces, but without storing the radial traces).
+    Samples masked in either horizontal component are not used (as with radial traces in the time domain).
+
+    Parameters
+    ----------
+    comp_matrix : ComponentMatrix
+        Aligned data of the stream
+    windows : list
+        List of (starttime, endtime) tuples of each window
+    azimuths : dict
+        Dictionary with azimuth names as keys and azimuths (degrees clockwise from north) as values
+    x_freqs : numpy.ndarray
+        Frequencies to which the psds are interpolated
+    psd_window_samples : int
+        Number of samples of each Welch segment
+    overlap_samples : float
+        Number of overlapping samples between Welch segments
+    domain : str, optional
+        Whether to calculate the psds from the N/E spectra ('spectral') or from the radial data of each window ('time'), by default 'spectral'
+    n_workers : int, optional
+        Number of threads between which the windows are split, by default 1
+
+    Returns
+    -------
+    dict
+        Dictionary with azimuth names as keys and dictionaries of {str(window starttime): psd (dB)} as values
+    """
+    nData = comp_matrix.get_data('N')
+    eData = comp_matrix.get_data('E')
+    horizMask = comp_matrix.combined_mask(['N', 'E'])
+    firstHoriz = max(comp_matrix.get_extent('N')[0], comp_matrix.get_extent('E')[0])
+    lastHoriz = min(comp_matrix.get_extent('N')[1], comp_matrix.get_extent('E')[1])
+
+    azNames = list(azimuths.keys())
+    azRad = np.deg2rad(np.array(list(azimuths.values()), dtype=np.float64))
+    cosAz = np.cos(azRad)[:, np.newaxis]
+    sinAz = np.sin(azRad)[:, np.newaxis]
+
+    def _window_psds(window):
+        stime, etime = window
+        firstSamp = max(comp_matrix.sample_of(stime), firstHoriz)
+        lastSamp = min(comp_matrix.sample_of(etime), lastHoriz)
+
+        # Longest continuous section of the window with both horizontal components
+        runStarts, runEnds = horizMask.runs(firstSamp, lastSamp + 1, masked=False)
+        if runStarts.size > 0:
+            longestRun = np.argmax(runEnds - runStarts)
+            winSlice = slice(firstSamp + runStarts[longestRun], firstSamp + runEnds[longestRun] + 1)
+        else:
+            winSlice = slice(0, 0)
+        horizData = np.vstack([nData[winSlice], eData[winSlice]])
+
+        nsamplesperwin = psd_window_samples
+        win_overlap_samples = overlap_samples
+        if horizData.shape[1] < nsamplesperwin:
+            nsamplesperwin = horizData.shape[1]
+            win_overlap_samples = nsamplesperwin - 1
+
+        if nsamplesperwin <= 1:
+            # Keep psds lined up with the other components
+            return np.full((len(azNames), x_freqs.size), np.nan)
+
+        welchKwargs = dict(fs=comp_matrix.sampling_rate, window='hann', nperseg=nsamplesperwin, noverlap=win_overlap_samples, nfft=None, 
+                           detrend='linear', return_onesided=True, scaling='density', axis=-1, average='mean')
+        if domain == 'time':
+            # Radial data is only calculated (for all azimuths at once) for the samples in this window
+            radialData = np.add(horizData[0] * cosAz, horizData[1] * sinAz)
+            f, pRadial = scipy.signal.welch(radialData, **welchKwargs)
+            radialPSDs = np.array([np.interp(x_freqs, f, pxx) for pxx in pRadial])
+        else:
+            f, pHoriz = scipy.signal.welch(horizData, **welchKwargs)
+            _, pNE = scipy.signal.csd(horizData[0], horizData[1], **welchKwargs)
+            
+            pNN = np.interp(x_freqs, f, pHoriz[0])
+            pEE = np.interp(x_freqs, f, pHoriz[1])
+            pNE = np.interp(x_freqs, f, np.real(pNE))
+            radialPSDs = cosAz**2 * pNN + sinAz**2 * pEE + 2 * sinAz * cosAz * pNE
+        with np.errstate(divide='ignore'):
+            return 10*np.log10(np.clip(radialPSDs, 0, None)) # Convert to decibels
+
+    # Windows are independent, so they are split between threads if n_workers > 1 (all threads use the same N/E data)
+    #   warnings.catch_warnings() is not thread-safe, so it is only used here rather than in each window
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore') # Sometimes unnecessary warnings arise
+        windowPSDs = _threaded_map(_window_psds, windows, n_workers=n_workers)
+
+    azPSDs = {azName: {} for azName in azNames}
+    for (stime, etime), radialPSDs_dB in zip(windows, windowPSDs):
+        for azName, azPSD in zip(azNames, radialPSDs_dB):
+            azPSDs[azName][str(stime)] = azPSD
+
+    return azPSDs
+
+
 # Generate windows "manually"
 def _create_windows(hvsr_data, window=30, overlap=0.5, window_length_method='length', verbose=False):
     """Function to create time windows based on input stream.
@@ -7805,26 +10442,15 @@ def _create_windows(hvsr_data, window=30, overlap=0.5, window_length_method='len
     winNum_list = ['number of windows', 'window_number', 'window number', 
                    'number', 'num', 'winnum', 'window_num', 'amount']
 
-    # Get input data as obspy.Stream
-    if isinstance(hvsr_data, HVSRData):
-        st = hvsr_data.stream.merge()
-    elif isinstance(hvsr_data, obspy.Stream):
-        st = hvsr_data.merge()
-    elif isinstance(hvsr_data, obspy.Trace):
-        st = obspy.Stream([hvsr_data]).merge()
+    # Get input data as aligned (merged) traces
+    if isinstance(hvsr_data, (HVSRData, obspy.Stream, obspy.Trace)):
+        compMatrix = _get_component_matrix(hvsr_data)
     else:
         raise RuntimeError("hvsr_data parameter of _create_windows() must be sprit.HVSRData, obspy.Stream, or obspy.Trace")
 
     # Get largest starttime and smallest endtime (to ensure all data is used)
-    for i, tr in enumerate(st):
-        if i==0:
-            maxStart = tr.stats.starttime
-            minEnd = tr.stats.endtime
-        else:
-            if tr.stats.starttime > maxStart:
-                maxStart = tr.stats.starttime
-            if tr.stats.endtime < minEnd:
-                minEnd = tr.stats.endtime
+    maxStart = max([st.starttime for st in compMatrix.stats])
+    minEnd = min([st.endtime for st in compMatrix.stats])
     # Calculate time between end and start
     timeRange = minEnd - maxStart
 
@@ -7882,61 +10508,20 @@ def _create_windows(hvsr_data, window=30, overlap=0.5, window_length_method='len
 
 # Remove noisy windows from df
 def __remove_windows_from_df(hvsr_data, verbose=False):
-    # Get gaps from masked regions of traces
-    gaps0 = []
-    gaps1 = []
-    outStream = hvsr_data['stream_edited'].split()
-    for i, trace in enumerate(outStream):
-        if i == 0:
-            trEndTime = trace.stats.endtime
-            comp_end = trace.stats.component
-            continue # Wait until the second trace
-
-        trStartTime = trace.stats.starttime
-        comp_start = trace.stats.component
-        firstDiff = True
-        secondDiff = True
-
-        # Check if both are different from any existing gap times
-        if trEndTime in gaps0:
-            firstDiff = False
-        if trStartTime in gaps1:
-            secondDiff = False
-        
-        # If the first element and second element are both new, add to gap list
-        if firstDiff and secondDiff:
-            gaps0.append(trEndTime)
-            gaps1.append(trStartTime)
+    # Get gaps from the windows removed by remove_noise() (or, if they are not available, the masked regions of traces)
+    if 'removed_windows' in hvsr_data.keys() and isinstance(hvsr_data['removed_windows'], IntervalSet):
+        gapSet = hvsr_data['removed_windows']
+    else:
+        gapSet = IntervalSet.from_stream(hvsr_data['stream_edited'])
+    gaps = [tuple(gap) for gap in gapSet.to_list()]
 
-        trEndTime = trace.stats.endtime
-    
-    gaps = list(zip(gaps0, gaps1))
     hvsr_windows_df_exists = ('hvsr_windows_df' in hvsr_data.keys()) or ('params' in hvsr_data.keys() and 'hvsr_windows_df' in hvsr_data['params'].keys()) or ('input_params' in hvsr_data.keys() and 'hvsr_windows_df' in hvsr_data['input_params'].keys())
     if hvsr_windows_df_exists:
         hvsrDF = hvsr_data['hvsr_windows_df']
         use_before = hvsrDF["Use"].copy().astype(bool)
-        outStream = hvsr_data['stream_edited'].split()
-        #for i, trace in enumerate(outStream):
-            #if i == 0:
-            #    trEndTime = trace.stats.endtime
-            #    comp_end = trace.stats.component
-            #    continue
-            #trStartTime = trace.stats.starttime
-            #comp_start = trace.stats.component
-            
-            #if trEndTime < trStartTime and comp_end == comp_start:
-        hvsrDF['Use'] = hvsrDF['Use'].astype(bool)
-        for gap in gaps:
-            # All windows whose starts occur within the gap are set to False
-            gappedIndices = hvsrDF.between_time(gap[0].datetime.time(), gap[1].datetime.time()).index#.loc[:, 'Use']
-            hvsrDF.loc[gappedIndices,'Use'] = False
-
-            # The previous window is also set to false, since the start of the gap lies within that window
-            prevInd = hvsrDF.index.get_indexer([gap[0]], method='ffill')
-            prevDTInd = hvsrDF.index[prevInd]
-            hvsrDF.loc[prevDTInd, 'Use'] = False
-
-        hvsrDF['Use'] = hvsrDF['Use'].astype(bool)
+
+        # All windows that overlap any gap are set to False
+        hvsrDF['Use'] = hvsrDF['Use'].astype(bool) & ~gapSet.overlaps(hvsrDF['TimesProcessed_Obspy'], hvsrDF['TimesProcessed_ObspyEnd'])
             
         hvsr_data['hvsr_windows_df'] = hvsrDF  # May not be needed, just in case, though
 
@@ -7951,9 +10536,6 @@ def __remove_windows_from_df(hvsr_data, verbose=False):
             else:
                 print(f"\t\tNo windows removed using remove_noise()")
 
-        outStream.merge()
-        hvsr_data['stream_edited'] = outStream
-
     hvsr_data['x_gaps_obspyDT'] = gaps
 
     return hvsr_data
@@ -8154,26 +10736,41 @@ def __get_hvsr_curve(x, psd, horizontal_method, hvsr_data, azimuth=None, verbose
         hvsr_tSteps = _dfa(x, hvsr_data, verbose)
         hvsr_curve = np.mean(hvsr_tSteps, axis=0)
     else:
-        for j in range(len(x)-1):
-            psd0 = [psd['Z'][j], psd['Z'][j + 1]]
-            psd1 = [psd['E'][j], psd['E'][j + 1]]
-            psd2 = [psd['N'][j], psd['N'][j + 1]]
-            f =    [x[j], x[j + 1]]
-
-            hvratio = __get_hvsr(psd0, psd1, psd2, f, azimuth=azimuth, use_method=horizontal_method)
-            hvsr_curve.append(hvratio)
-            
-            # Do azimuth HVSR Calculations, if applicable
-            hvratio_az = 0
-            for k in psd.keys():
-                if k.lower() not in ['z', 'e', 'n']:
-                    psd_az = [psd[k][j], psd[k][j + 1]]
-                    hvratio_az = __get_hvsr(psd0, psd_az, None, f, azimuth=azimuth, use_method='az')
-                    if j == 0:
-                        hvsr_azimuth[k] = [hvratio_az]
-                    else:
-                        hvsr_azimuth[k].append(hvratio_az)
-            
+        # Same calculation as __get_hvsr()/__get_power(), but for all frequency steps at once
+        nSteps = max(len(x) - 1, 0)
+        xArr = np.asarray(x, dtype=np.float64)
+        stepWidth = np.abs(np.diff(xArr))
+
+        def _step_power(db):
+            power = np.power(10.0, np.asarray(db, dtype=np.float64)[:nSteps+1] / 10.0)
+            return (power[:-1] + power[1:]) / 2.0 * stepWidth
+
+        pZ = _step_power(psd['Z'])
+        pE = _step_power(psd['E'])
+        pN = _step_power(psd['N'])
+        hZ = np.sqrt(pZ)
+        hE = np.sqrt(pE)
+        hN = np.sqrt(pN)
+
+        def _az_h():
+            az = 90 if azimuth is None else azimuth
+            azRad = np.deg2rad(az)
+            return np.add(hN * np.cos(azRad), hE * np.sin(azRad))
+
+        hMethods = {2: lambda: (hE + hN) / 2.0, # Arithmetic mean
+                    3: lambda: np.sqrt(hE * hN), # Geometric mean
+                    4: lambda: np.sqrt(pE + pN), # Vector summation
+                    5: lambda: np.sqrt((pE + pN) / 2.0), # Quadratic mean
+                    6: lambda: np.maximum(hE, hN), # Max horizontal value
+                    7: lambda: np.minimum(hE, hN), # Minimum horizontal value
+                    8: _az_h}
+        hvsr_curve = hMethods[horizontal_method]() / hZ
+
+        # Do azimuth HVSR Calculations, if applicable (horizontals are already combined)
+        for k in psd.keys():
+            if k.lower() not in ['z', 'e', 'n']:
+                hvsr_azimuth[k] = (np.sqrt(_step_power(psd[k])) / hZ).tolist()
+
         hvsr_tSteps = None # Only used for DFA
 
 
@@ -8450,6 +11047,8 @@ def _generate_print_report(hvsr_results, azimuth="HV", show_print_report=True, v
         peakPass = peakTestsPassed >= 5
 
         report_string_list.append('\t{0:.3f} Hz Peak Frequency ± {1:.4f} Hz'.format(hvsr_results['BestPeak'][azimuth]['f0'], float(hvsr_results["BestPeak"][azimuth]['Sf'])))        
+        if 'CI' in hvsr_results['BestPeak'][azimuth]['Report'].keys():
+            report_string_list.append(f"\t  {hvsr_results['BestPeak'][azimuth]['Report']['CI']}")
         if curvePass and peakPass:
             report_string_list.append('\t  {} Peak at {} Hz passed quality checks! :D'.format(sprit_utils.check_mark(), round(hvsr_results['BestPeak'][azimuth]['f0'],3)))
         else:
@@ -8552,6 +11151,12 @@ def _generate_table_report(hvsr_results, azimuth='HV', show_table_report=True, v
     dfList = [[d['input_params']['site'], d['input_params']['acq_date'], d['input_params']['xcoord'], d['input_params']['ycoord'], d['input_params']['elevation'], round(d['BestPeak'][azimuth]['f0'], 3), round(d['BestPeak'][azimuth]['Sf'], 4)]]
     dfList[0].extend(criteriaList)
 
+    # Add bootstrap confidence interval of peak frequency, if calculated by check_peaks()
+    if 'f0_CI' in hvsr_results['BestPeak'][azimuth].keys():
+        ciInd = pdCols.index('Peak_StDev') + 1
+        pdCols[ciInd:ciInd] = ['Peak_CI_Low', 'Peak_CI_High']
+        dfList[0][ciInd:ciInd] = [round(v, 3) for v in hvsr_results['BestPeak'][azimuth]['f0_CI']]
+
     outDF = pd.DataFrame(dfList, columns=pdCols)
     outDF.index.name = 'ID'
     
@@ -9920,6 +12525,16 @@ def __check_curve_reliability(hvsr_data, _peak, col_id='HV'):
     window_len = hvsr_data['ppsds'][anyKey]['ppsd_length'] #Window length in seconds
     window_num = np.array(hvsr_data['psd_raw'][anyKey]).shape[0]
 
+    # Evaluate the StDev test for all peaks at once:
+    #   each row of inBand marks the frequencies between 0.5f0 and 2f0 for that peak
+    peakFreqs = np.array([float(p['f0']) for p in _peak], dtype=float)
+    compVals = np.where(peakFreqs >= 0.5, 2, 3)
+    curveFreqs = np.asarray(hvsr_data['x_freqs'][anyKey], dtype=float)[:-1]
+    logStd = np.asarray(hvsr_data['hvsr_log_std'][col_id], dtype=float)[:curveFreqs.shape[0]]
+    curveFreqs = curveFreqs[:logStd.shape[0]]
+    inBand = (curveFreqs[np.newaxis, :] >= peakFreqs[:, np.newaxis] / 2) & (curveFreqs[np.newaxis, :] < peakFreqs[:, np.newaxis] * 2)
+    test3List = ~np.any(inBand & (logStd[np.newaxis, :] >= compVals[:, np.newaxis]), axis=1)
+
     for _i in range(len(_peak)):
         # Test 1
         peakFreq= _peak[_i]['f0']
@@ -9928,25 +12543,8 @@ def __check_curve_reliability(hvsr_data, _peak, col_id='HV'):
         nc = window_len * window_num * peakFreq
         test2 = nc > 200
 
-        halfF0 = peakFreq/2
-        doublef0 = peakFreq*2
-        
-
-        test3 = True
-        failCount = 0
-        for i, freq in enumerate(hvsr_data['x_freqs'][anyKey][:-1]):
-            if freq >= halfF0 and freq <doublef0:
-                compVal = 2
-                if peakFreq >= 0.5:
-                    if hvsr_data['hvsr_log_std'][col_id][i] >= compVal:
-                        test3=False
-                        failCount +=1
-
-                else: #if peak freq is less than 0.5
-                    compVal = 3
-                    if hvsr_data['hvsr_log_std'][col_id][i] >= compVal:
-                        test3=False
-                        failCount +=1
+        compVal = int(compVals[_i])
+        test3 = bool(test3List[_i])
 
         if test1:
             _peak[_i]['Report']['Lw'] = f'{round(peakFreq,3)} > {10/int(window_len):0.3} (10 / {int(window_len)})  {sprit_utils.check_mark()}'
@@ -9969,6 +12567,32 @@ def __check_curve_reliability(hvsr_data, _peak, col_id='HV'):
     return _peak
 
 
+# Get the index of the first True value in each row of a 2D boolean array
+def __first_true_index(mask, from_end=False):
+    """Get the index of the first (or last) True value in each row of a 2D boolean array
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        2D boolean array
+    from_end : bool, default=False
+        If True, get the index of the last True value in each row instead
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer array with one value per row of mask (-1 for rows with no True values)
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim != 2 or mask.shape[1] == 0:
+        return np.full(mask.shape[0] if mask.ndim > 0 else 0, -1, dtype=int)
+    if from_end:
+        inds = mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+    else:
+        inds = np.argmax(mask, axis=1)
+    return np.where(np.any(mask, axis=1), inds, -1)
+
+
 # Check clarity of peaks
 def __check_clarity(_x, _y, _peak, do_rank=True):
     """Check clarity of peak amplitude(s)
@@ -10005,42 +12629,49 @@ def __check_clarity(_x, _y, _peak, do_rank=True):
     else:
         jstart = len(_y)-1
 
-    
+    # Evaluate the f- and f+ conditions for all peaks at once
+    #   Each row of a mask corresponds to one peak, each column to one frequency of the curve
+    _xArr = np.asarray(_x, dtype=float)
+    _yArr = np.asarray(_y, dtype=float)
+    f0Arr = np.array([float(p['f0']) for p in _peak], dtype=float)[:, np.newaxis]
+    a0Arr = np.array([float(p['A0']) for p in _peak], dtype=float)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # There exist one frequency f-, lying between f0/4 and f0, such that A0 / A(f-) > 2
+        #   (the last index that meets the condition, as in a scan from jstart down to 0)
+        lowX = _xArr[:jstart+1]
+        lowMask = (f0Arr / 4.0 <= lowX) & (lowX < f0Arr) & (a0Arr / _yArr[:lowX.shape[0]] > 2.0)
+        lowInds = __first_true_index(lowMask, from_end=True)
+
+        # There exist one frequency f+, lying between f0 and 4*f0, such that A0 / A(f+) > 2
+        hiX = _xArr[:min(len(_x)-1, _yArr.shape[0])]
+        hiMask = (f0Arr * 4.0 >= hiX) & (hiX > f0Arr) & (a0Arr / _yArr[:hiX.shape[0]] > 2.0)
+        hiInds = __first_true_index(hiMask)
+
     for _i in range(len(_peak)):
-        #Initialize as False
-        _peak[_i]['f-'] = sprit_utils.x_mark()
-        _peak[_i]['Report']['A(f-)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']/4:0.2f} Hz-{_peak[_i]['f0']:0.3f} Hz {sprit_utils.x_mark()}"
-        _peak[_i]['PassList']['ProminenceLow'] = False #Start with assumption that it is False until we find an instance where it is True
-        for _j in range(jstart, -1, -1):
-            # There exist one frequency f-, lying between f0/4 and f0, such that A0 / A(f-) > 2.
-            if (float(_peak[_i]['f0']) / 4.0 <= _x[_j] < float(_peak[_i]['f0'])) and float(_peak[_i]['A0']) / _y[_j] > 2.0:
-                _peak[_i]['Score'] += 1
-                _peak[_i]['f-'] = '%10.3f %1s' % (_x[_j], sprit_utils.check_mark())
-                _peak[_i]['Report']['A(f-)'] = f"Amp. of H/V Curve @{_x[_j]:0.3f}Hz ({_y[_j]:0.3f}) < {_peak[_i]['A0']/2:0.3f} {sprit_utils.check_mark()}"
-                _peak[_i]['PassList']['ProminenceLow'] = True
-                break
-            else:
-                pass
-    
+        _j = lowInds[_i]
+        if _j < 0:
+            _peak[_i]['f-'] = sprit_utils.x_mark()
+            _peak[_i]['Report']['A(f-)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']/4:0.2f} Hz-{_peak[_i]['f0']:0.3f} Hz {sprit_utils.x_mark()}"
+            _peak[_i]['PassList']['ProminenceLow'] = False
+        else:
+            _peak[_i]['Score'] += 1
+            _peak[_i]['f-'] = '%10.3f %1s' % (_x[_j], sprit_utils.check_mark())
+            _peak[_i]['Report']['A(f-)'] = f"Amp. of H/V Curve @{_x[_j]:0.3f}Hz ({_y[_j]:0.3f}) < {_peak[_i]['A0']/2:0.3f} {sprit_utils.check_mark()}"
+            _peak[_i]['PassList']['ProminenceLow'] = True
+
     if do_rank:
         max_rank += 1
     for _i in range(len(_peak)):
-        #Initialize as False
-        _peak[_i]['f+'] = sprit_utils.x_mark()
-        _peak[_i]['Report']['A(f+)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']:0.2f} Hz-{_peak[_i]['f0']*4:0.3f} Hz {sprit_utils.x_mark()}"
-        _peak[_i]['PassList']['ProminenceHi'] = False
-        for _j in range(len(_x) - 1):
-
-            # There exist one frequency f+, lying between f0 and 4*f0, such that A0 / A(f+) > 2.
-            if float(_peak[_i]['f0']) * 4.0 >= _x[_j] > float(_peak[_i]['f0']) and \
-                    float(_peak[_i]['A0']) / _y[_j] > 2.0:
-                _peak[_i]['Score'] += 1
-                _peak[_i]['f+'] = f"{_x[_j]:0.3f} {sprit_utils.check_mark()}"
-                _peak[_i]['Report']['A(f+)'] = f"H/V Curve at {_x[_j]:0.2f} Hz: {_y[_j]:0.2f} < {_peak[_i]['A0']/2:0.2f} (f0/2) {sprit_utils.check_mark()}"
-                _peak[_i]['PassList']['ProminenceHi'] = True
-                break
-            else:
-                pass
+        _j = hiInds[_i]
+        if _j < 0:
+            _peak[_i]['f+'] = sprit_utils.x_mark()
+            _peak[_i]['Report']['A(f+)'] = f"H/V curve > {_peak[_i]['A0']/2:0.2f} for all {_peak[_i]['f0']:0.2f} Hz-{_peak[_i]['f0']*4:0.3f} Hz {sprit_utils.x_mark()}"
+            _peak[_i]['PassList']['ProminenceHi'] = False
+        else:
+            _peak[_i]['Score'] += 1
+            _peak[_i]['f+'] = f"{_x[_j]:0.3f} {sprit_utils.check_mark()}"
+            _peak[_i]['Report']['A(f+)'] = f"H/V Curve at {_x[_j]:0.2f} Hz: {_y[_j]:0.2f} < {_peak[_i]['A0']/2:0.2f} (f0/2) {sprit_utils.check_mark()}"
+            _peak[_i]['PassList']['ProminenceHi'] = True
 
     # Amplitude Clarity test
     # Only peaks with A0 > 2 pass
@@ -10087,54 +12718,40 @@ def __check_freq_stability(_peak, _peakm, _peakp):
     # check σf and σA
     max_rank += 1
 
+    # For each peak, find the first peak (in list order) of the hvsrm and hvsrp curves within ±5% of its frequency
+    peakFreqs = np.array([float(p['f0']) for p in _peak], dtype=float)[:, np.newaxis]
+    peakmFreqs = np.array([float(p['f0']) for p in _peakm], dtype=float)[np.newaxis, :]
+    peakpFreqs = np.array([float(p['f0']) for p in _peakp], dtype=float)[np.newaxis, :]
+    mInds = __first_true_index((peakFreqs * 0.95 <= peakmFreqs) & (peakmFreqs <= peakFreqs * 1.05))
+    pInds = __first_true_index((peakFreqs * 0.95 <= peakpFreqs) & (peakpFreqs <= peakFreqs * 1.05))
+
     # First check below
-    # Initialize list
-    _found_m = list()
-    #print('peak', _peak)
-    #print('peakm', _peakm)
-    #SSprint('peakp', _peakp)
+    _found_m = mInds >= 0
     for _i in range(len(_peak)):
-        _dx = 1000000.
-        # Initialize test as not passing for this frequency
-        _found_m.append(False)
-        _peak[_i]['Report']['P-'] = sprit_utils.x_mark()
-        # Iterate through all time windows
-        for _j in range(len(_peakm)):
-            if abs(_peakm[_j]['f0'] - _peak[_i]['f0']) < _dx:
-                _index = _j
-                _dx = abs(_peakm[_j]['f0'] - _peak[_i]['f0']) #_dx is difference between peak frequencies for each time window and main peak
-            if _peak[_i]['f0'] * 0.95 <= _peakm[_j]['f0'] <= _peak[_i]['f0'] * 1.05:
-                _peak[_i]['Report']['P-'] = f"{_peakm[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.check_mark()}"
-                _found_m[_i] = True
-                break
-        
-        if _peak[_i]['Report']['P-'] == sprit_utils.x_mark():
-            _peak[_i]['Report']['P-'] = f"{_peakm[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
+        if _found_m[_i]:
+            _peak[_i]['Report']['P-'] = f"{_peakm[mInds[_i]]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.check_mark()}"
+        elif len(_peakm) > 0:
+            # Report the last hvsrm peak checked
+            _peak[_i]['Report']['P-'] = f"{_peakm[-1]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
+        else:
+            _peak[_i]['Report']['P-'] = sprit_utils.x_mark()
 
     # Then Check above
-    _found_p = list()
     for _i in range(len(_peak)):
-        _dx = 1000000.
-        _found_p.append(False)
-        _peak[_i]['Report']['P+'] = sprit_utils.x_mark()
-        for _j in range(len(_peakp)):
-            if abs(_peakp[_j]['f0'] - _peak[_i]['f0']) < _dx:
-
-                _dx = abs(_peakp[_j]['f0'] - _peak[_i]['f0'])
-            if _peak[_i]['f0'] * 0.95 <= _peakp[_j]['f0'] <= _peak[_i]['f0'] * 1.05:
-                if _found_m[_i]:
-                    _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.check_mark()}"
-                    _peak[_i]['Score'] += 1
-                    _peak[_i]['PassList']['FreqStability'] = True
-                else:
-                    _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
-                    _peak[_i]['PassList']['FreqStability'] = False
-                break
+        if len(_peakp) == 0:
+            _peak[_i]['Report']['P+'] = sprit_utils.x_mark()
+        elif pInds[_i] >= 0:
+            if _found_m[_i]:
+                _peak[_i]['Report']['P+'] = f"{_peakp[pInds[_i]]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.check_mark()}"
+                _peak[_i]['Score'] += 1
+                _peak[_i]['PassList']['FreqStability'] = True
             else:
-                _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
-                _peak[_i]['PassList']['FreqStability'] = False                
-        if _peak[_i]['Report']['P+'] == sprit_utils.x_mark() and len(_peakp) > 0:
-            _peak[_i]['Report']['P+'] = f"{_peakp[_j]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
+                _peak[_i]['Report']['P+'] = f"{_peakp[pInds[_i]]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
+                _peak[_i]['PassList']['FreqStability'] = False
+        else:
+            # Report the last hvsrp peak checked
+            _peak[_i]['Report']['P+'] = f"{_peakp[-1]['f0']:0.2f} Hz within ±5% of {_peak[_i]['f0']:0.2f} Hz {sprit_utils.x_mark()}"
+            _peak[_i]['PassList']['FreqStability'] = False
 
     return _peak
 
@@ -10283,45 +12900,332 @@ def __get_stdf(x_values, indexList, hvsrPeaks):
             Array of x_values of dataset (frequency or period, most often frequency)
         indexList : list
             List of index/indices of peak(s) of interest, (index is within the x_values list)
+        hvsrPeaks : pandas.Series or list
+            Each item contains a list of peak indices for the H/V curve from one time window
     
     Returns
     -------
         stdf : list
             List of standard deviations of the peak 
     """
-    stdf = list()
-    # Go through list containing all peak indices (often, just a single index of the main peak)
-    for index in indexList:
-        point = list()
-        # Iterate to get index for all rows of pandas series, 
-        #   each row contains a list of peak indices for the H/V curve from that time window
-        for j in range(len(hvsrPeaks)):
-            p = None
-            
-            # Iterate through each peak in each time window
-            for k in range(len(hvsrPeaks.iloc[j])):
-                if p is None:
-                    p = hvsrPeaks.iloc[j][k]
-                else:
-                    # Find frequency peak closest in the current time window to the (current) hvsr peak
-                    if abs(index - hvsrPeaks.iloc[j][k]) < abs(index - p):
-                        p = hvsrPeaks.iloc[j][k]
-                        # p = hvsrPeaks[j][k]
-                        # print(p=p1, p, p1)
-            if p is not None:
-                # It should never be None, this is just a double check
-                # Append the index of interest for that time window
-                point.append(p)
-        # Append the last index
-        point.append(index)
-        v = list()
-        
-        # Get all the actual frequencies (go through each index and extract the frequency from x_values)
-        for pl in range(len(point)):
-            v.append(x_values[point[pl]])
-        
-        # stdf is a list in case there are multiple peaks to check. 
-        # Most of the time this is only a 1-item list
-        # Contains std of frequencies of the peaks from each time window H/V curve that are closest to the main H/V peak
-        stdf.append(np.std(v))
+    indexList = np.asarray(indexList, dtype=np.int64).ravel()
+    if indexList.shape[0] == 0:
+        return list()
+
+    # Find the peak closest to each peak of interest in every time window (windows without peaks are skipped)
+    sortedPeaks, sortOrder, offsets = __flatten_window_peaks(hvsrPeaks)
+    nearestPeaks = __nearest_window_peaks(sortedPeaks, sortOrder, offsets, indexList)
+
+    # Get the actual frequencies of those peaks, plus the peak of interest itself (last column)
+    points = np.concatenate((nearestPeaks, indexList[:, np.newaxis]), axis=1)
+    freqValues = np.asarray(x_values)[points]
+
+    # stdf is a list in case there are multiple peaks to check. 
+    # Most of the time this is only a 1-item list
+    # Contains std of frequencies of the peaks from each time window H/V curve that are closest to the main H/V peak
+    stdf = list(np.std(freqValues, axis=1))
     return stdf
+
+
+# Flatten the peak indices of all time windows into one array
+def __flatten_window_peaks(hvsrPeaks):
+    """Flatten the peak indices of all time windows into one array, sorted within each window
+
+    Parameters
+    ----------
+    hvsrPeaks : pandas.Series or list
+        Each item contains a list of peak indices for the H/V curve from one time window
+
+    Returns
+    -------
+    tuple
+        sortedPeaks: peak indices of all windows, sorted (stably) within each window;
+        sortOrder: position of each item of sortedPeaks in the unsorted (concatenated) peak lists;
+        offsets: start of each window in sortedPeaks (length is number of windows + 1)
+    """
+    peakLists = [np.asarray(wp, dtype=np.int64).ravel() for wp in list(hvsrPeaks)]
+    lengths = np.array([pl.shape[0] for pl in peakLists], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if offsets[-1] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), offsets
+
+    flatPeaks = np.concatenate(peakLists)
+    windowIDs = np.repeat(np.arange(lengths.shape[0], dtype=np.int64), lengths)
+    peakSpan = int(flatPeaks.max() - flatPeaks.min()) + 1
+    sortOrder = np.argsort(windowIDs * peakSpan + (flatPeaks - flatPeaks.min()), kind='stable')
+    return flatPeaks[sortOrder], sortOrder, offsets
+
+
+# Find the peak nearest to each target index in every time window
+def __nearest_window_peaks(sortedPeaks, sortOrder, offsets, targets):
+    """Find the peak nearest to each target index in every time window that has peaks
+
+    Uses a single searchsorted call over all windows. 
+    If two peaks are equally close, the one that comes first in that window's (unsorted) peak list is used.
+
+    Parameters
+    ----------
+    sortedPeaks : numpy.ndarray
+        Peak indices of all windows, sorted within each window (from __flatten_window_peaks())
+    sortOrder : numpy.ndarray
+        Position of each item of sortedPeaks in the unsorted peak lists (from __flatten_window_peaks())
+    offsets : numpy.ndarray
+        Start of each window in sortedPeaks (from __flatten_window_peaks())
+    targets : numpy.ndarray
+        Indices of the peaks of interest
+
+    Returns
+    -------
+    numpy.ndarray
+        Array with shape (number of targets, number of windows with peaks) with the nearest peak index in each window
+    """
+    targets = np.asarray(targets, dtype=np.int64).ravel()
+    winStarts = offsets[:-1][np.diff(offsets) > 0]
+    winEnds = offsets[1:][np.diff(offsets) > 0]
+    if winStarts.shape[0] == 0 or targets.shape[0] == 0:
+        return np.empty((targets.shape[0], 0), dtype=np.int64)
+
+    # Offset values by window so all windows can be searched at once
+    windowIDs = np.repeat(np.arange(winStarts.shape[0], dtype=np.int64), winEnds - winStarts)
+    minVal = min(sortedPeaks.min(), targets.min())
+    valSpan = int(max(sortedPeaks.max(), targets.max()) - minVal) + 1
+    sortedKeys = windowIDs * valSpan + (sortedPeaks - minVal)
+    targetKeys = np.arange(winStarts.shape[0], dtype=np.int64)[np.newaxis, :] * valSpan + (targets[:, np.newaxis] - minVal)
+
+    # First peak >= target (right) and last peak < target (left) in each window
+    rightInds = np.searchsorted(sortedKeys, targetKeys, side='left')
+    rightValid = rightInds < winEnds[np.newaxis, :]
+    leftInds = rightInds - 1
+    leftValid = leftInds >= winStarts[np.newaxis, :]
+    rightInds = np.minimum(rightInds, sortedKeys.shape[0] - 1)
+    leftInds = np.maximum(leftInds, 0)
+    # Use first (stably sorted) occurrence of the left value, in case of repeated indices
+    leftInds = np.searchsorted(sortedKeys, sortedKeys[leftInds], side='left')
+
+    rightDist = sortedPeaks[rightInds] - targets[:, np.newaxis]
+    leftDist = targets[:, np.newaxis] - sortedPeaks[leftInds]
+    useLeft = leftValid & (~rightValid | (leftDist < rightDist) | ((leftDist == rightDist) & (sortOrder[leftInds] < sortOrder[rightInds])))
+    return np.where(useLeft, sortedPeaks[leftInds], sortedPeaks[rightInds])
+
+
+# Get bootstrap confidence intervals of peak frequency and amplitude
+def __bootstrap_peak_ci(x_values, hvsr_curve, ind_curves, best_peak, n_resamples=1000, ci=95, peak_freq_range=[0.4, 40], fast=True, seed=None, max_chunk_size=5e6):
+    """Private function to get bootstrap confidence intervals of the frequency and amplitude of a peak
+
+    The used time windows are resampled (with replacement) n_resamples times. 
+    The median H/V curves of all resamples are calculated together (in chunks of at most max_chunk_size values).
+    The peak of each median curve is its local maximum nearest to f0 within the frequencies being checked
+    (or the maximum within those frequencies, if there is no local maximum).
+
+    Parameters
+    ----------
+    x_values : list or np.array
+        Array of x_values of dataset (frequency or period, most often frequency)
+    hvsr_curve : list or np.array
+        H/V curve the best peak was picked from
+    ind_curves : np.array
+        2D array with the H/V curve of each used time window (one row per window)
+    best_peak : dict
+        Dictionary with information about the best peak (from check_peaks()), including 'f0' and 'A0'
+    n_resamples : int, default=1000
+        Number of bootstrap resamples
+    ci : float, default=95
+        Confidence level, in percent
+    peak_freq_range : list, default=[0.4, 40]
+        Two-item list with low and high frequency to limit the frequencies checked for the peak
+    fast : bool, default=True
+        If True, only check the frequencies around the best peak where hvsr_curve is greater than A0/2 (within f0/2 and 2*f0)
+    seed : int or None, default=None
+        Seed for numpy's random number generator
+    max_chunk_size : int, default=5e6
+        Maximum number of values in each (resamples x windows x frequencies) array used to calculate the median curves
+
+    Returns
+    -------
+    tuple
+        Two two-item lists, with the lower and upper bounds of the confidence interval of f0 and A0
+    """
+    indCurves = np.asarray(ind_curves, dtype=float)
+    freqs = np.asarray(x_values, dtype=float)[:indCurves.shape[1]]
+    hvCurve = np.asarray(hvsr_curve, dtype=float)[:freqs.shape[0]]
+    f0 = float(best_peak['f0'])
+    a0 = float(best_peak['A0'])
+
+    # Frequencies to check for the peak of each resample
+    checkMask = (freqs >= min(peak_freq_range)) & (freqs <= max(peak_freq_range))
+    if fast:
+        checkMask &= (freqs >= f0 / 2) & (freqs <= f0 * 2)
+        # Only keep the part of the curve around the peak that is above A0/2
+        peakInd = int(np.argmin(np.abs(freqs - f0)))
+        belowInds = np.flatnonzero(~(hvCurve > a0 / 2))
+        lowerBound = belowInds[belowInds < peakInd].max(initial=-1)
+        upperBound = belowInds[belowInds > peakInd].min(initial=freqs.shape[0])
+        lobeMask = np.zeros(freqs.shape[0], dtype=bool)
+        lobeMask[lowerBound+1:upperBound] = True
+        checkMask &= lobeMask
+    if not np.any(checkMask):
+        return [f0, f0], [a0, a0]
+
+    checkFreqs = freqs[checkMask]
+    checkCurves = indCurves[:, checkMask]
+    nWindows = checkCurves.shape[0]
+    # Distance (in samples) of each frequency being checked from f0
+    f0Dist = np.abs(np.arange(checkFreqs.shape[0]) - np.argmin(np.abs(checkFreqs - f0)))
+
+    rng = np.random.default_rng(seed)
+    resampleInds = rng.integers(0, nWindows, size=(int(n_resamples), nWindows))
+    if np.isnan(checkCurves).any():
+        medianFun = np.nanmedian
+        maxIndFun = np.nanargmax
+    else:
+        medianFun = np.median
+        maxIndFun = np.argmax
+
+    f0Vals = np.empty(resampleInds.shape[0], dtype=float)
+    a0Vals = np.empty(resampleInds.shape[0], dtype=float)
+    chunkLen = max(1, int(max_chunk_size // checkCurves.size))
+    for i in range(0, resampleInds.shape[0], chunkLen):
+        medCurves = medianFun(checkCurves[resampleInds[i:i+chunkLen]], axis=1)
+        isPeak = np.zeros(medCurves.shape, dtype=bool)
+        isPeak[:, 1:-1] = (medCurves[:, 1:-1] > medCurves[:, :-2]) & (medCurves[:, 1:-1] > medCurves[:, 2:])
+        maxInds = np.where(np.any(isPeak, axis=1), 
+                           np.argmin(np.where(isPeak, f0Dist, f0Dist.shape[0]), axis=1),
+                           maxIndFun(medCurves, axis=1))
+        f0Vals[i:i+chunkLen] = checkFreqs[maxInds]
+        a0Vals[i:i+chunkLen] = medCurves[np.arange(medCurves.shape[0]), maxInds]
+
+    pctiles = [(100 - ci) / 2, 100 - (100 - ci) / 2]
+    f0CI = [float(v) for v in np.percentile(f0Vals, pctiles)]
+    a0CI = [float(v) for v in np.percentile(a0Vals, pctiles)]
+    return f0CI, a0CI
+
+
+# Link peaks of consecutive time windows into tracks
+def __link_peak_tracks(peak_windows, peak_values, nWindows, max_log_change, max_gap=2):
+    """Private function to link peaks of consecutive time windows into tracks, using optimal assignment
+
+    Parameters
+    ----------
+    peak_windows : numpy.ndarray
+        Time window (row number) of each peak, in ascending order
+    peak_values : numpy.ndarray
+        Value to link peaks on (e.g., log of peak frequency)
+    nWindows : int
+        Number of time windows
+    max_log_change : float
+        Maximum difference in peak_values between linked peaks
+    max_gap : int, default=2
+        Maximum number of consecutive time windows without a linked peak before a track ends
+
+    Returns
+    -------
+    numpy.ndarray
+        Track ID of each peak
+    """
+    trackIDs = np.empty(peak_windows.shape[0], dtype=np.int64)
+    winOffsets = np.searchsorted(peak_windows, np.arange(nWindows + 1))
+
+    # Last value and time window of each active track
+    activeIDs = np.empty(0, dtype=np.int64)
+    activeVals = np.empty(0, dtype=float)
+    activeWins = np.empty(0, dtype=np.int64)
+    nTracks = 0
+    for win in range(nWindows):
+        first, last = winOffsets[win], winOffsets[win+1]
+        if first == last:
+            continue
+
+        # End tracks that have gone too many windows without a peak
+        stillActive = (win - activeWins) <= max_gap + 1
+        activeIDs = activeIDs[stillActive]
+        activeVals = activeVals[stillActive]
+        activeWins = activeWins[stillActive]
+
+        winVals = peak_values[first:last]
+        winTracks = np.full(last - first, -1, dtype=np.int64)
+        if activeIDs.shape[0] > 0:
+            costs = np.abs(winVals[:, np.newaxis] - activeVals[np.newaxis, :])
+            # Peak/track pairs that are too far apart can't be linked
+            costs[costs > max_log_change] = max_log_change * 1e6 + 1
+            peakRows, trackCols = scipy.optimize.linear_sum_assignment(costs)
+            linked = costs[peakRows, trackCols] <= max_log_change
+            winTracks[peakRows[linked]] = activeIDs[trackCols[linked]]
+            activeVals[trackCols[linked]] = winVals[peakRows[linked]]
+            activeWins[trackCols[linked]] = win
+
+        # Peaks not linked to a track start new tracks
+        newPeaks = winTracks < 0
+        nNew = int(np.count_nonzero(newPeaks))
+        winTracks[newPeaks] = np.arange(nTracks, nTracks + nNew)
+        activeIDs = np.concatenate((activeIDs, winTracks[newPeaks]))
+        activeVals = np.concatenate((activeVals, winVals[newPeaks]))
+        activeWins = np.concatenate((activeWins, np.full(nNew, win, dtype=np.int64)))
+        nTracks += nNew
+
+        trackIDs[first:last] = winTracks
+    return trackIDs
+
+
+# Get statistics of peak frequency tracks
+def __peak_track_stats(peak_tracks, window_times, window_hours):
+    """Private function to get the f0 statistics (including drift over time) of each peak track from track_peaks()
+
+    Parameters
+    ----------
+    peak_tracks : dict
+        Dictionary with the arrays of the peak tracks of one H/V curve (from track_peaks())
+    window_times : pandas.DatetimeIndex
+        Start time of each time window
+    window_hours : numpy.ndarray
+        Hours since start of the first time window, for each time window
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame with one row per track (index is the track ID)
+    """
+    offsets = peak_tracks['track_offsets']
+    wins = peak_tracks['window_index']
+    f = np.asarray(peak_tracks['frequency'], dtype=float)
+    nTracks = offsets.shape[0] - 1
+    statCols = ['StartTime', 'EndTime', 'NumWindows', 'Coverage', 'f0_Median', 'f0_Mean', 'f0_StDev', 'f0_Min', 'f0_Max', 'A0_Median', 'f0_Drift_Hz_per_hr']
+    if nTracks == 0:
+        return pd.DataFrame(columns=statCols)
+
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+    n = np.diff(offsets).astype(float)
+    trackIDs = np.repeat(np.arange(nTracks), np.diff(offsets))
+    # Time (in hours) relative to the start of each track, to keep the sums below accurate for long recordings
+    t = np.asarray(window_hours, dtype=float)[wins]
+    t = t - t[starts][trackIDs]
+
+    # Medians from values sorted within each track
+    def _track_medians(vals):
+        sortedVals = vals[np.lexsort((vals, trackIDs))]
+        return (sortedVals[starts + (np.diff(offsets) - 1) // 2] + sortedVals[starts + np.diff(offsets) // 2]) / 2
+
+    # Least-squares slope of f0 over time (Hz per hour) from sums over each track
+    sumT = np.add.reduceat(t, starts)
+    sumF = np.add.reduceat(f, starts)
+    sumTT = np.add.reduceat(t * t, starts)
+    sumTF = np.add.reduceat(t * f, starts)
+    meanF = sumF / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sumTF - sumT * sumF) / (n * sumTT - sumT * sumT)
+        slope[n < 2] = np.nan
+    stdF = np.sqrt(np.maximum(np.add.reduceat((f - meanF[trackIDs])**2, starts) / n, 0))
+
+    trackStats = pd.DataFrame({'StartTime': window_times[wins[starts]],
+                               'EndTime': window_times[wins[ends]],
+                               'NumWindows': np.diff(offsets),
+                               'Coverage': np.diff(offsets) / (wins[ends] - wins[starts] + 1),
+                               'f0_Median': _track_medians(f),
+                               'f0_Mean': meanF,
+                               'f0_StDev': stdF,
+                               'f0_Min': np.minimum.reduceat(f, starts),
+                               'f0_Max': np.maximum.reduceat(f, starts),
+                               'A0_Median': _track_medians(np.asarray(peak_tracks['amplitude'], dtype=float)),
+                               'f0_Drift_Hz_per_hr': slope})
+    trackStats.index.name = 'TrackID'
+    return trackStats
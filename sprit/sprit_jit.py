@@ -0,0 +1,288 @@
+"""
+This module contains the sample-level kernels used by the noise removal functions in sprit_hvsr.
+
+Each kernel has a NumPy implementation and a loop-based implementation with the same signature.
+If numba is installed, the loop-based implementations are compiled with numba.njit and used by default.
+Otherwise, the NumPy implementations are used.
+"""
+import numpy as np
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except Exception:
+    NUMBA_AVAILABLE = False
+
+
+# NumPy implementations
+def _runs_from_indices_numpy(indices, min_length):
+    indices = np.asarray(indices, dtype=np.int64)
+    if indices.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(indices) > 1)
+    starts = indices[np.concatenate(([0], breaks + 1))]
+    ends = indices[np.concatenate((breaks, [indices.size - 1]))]
+    keep = (ends - starts) >= min_length
+    return starts[keep], ends[keep]
+
+
+def _runs_from_mask_numpy(mask, min_length):
+    return _runs_from_indices_numpy(np.flatnonzero(mask), min_length)
+
+
+def _merge_windows_numpy(starts, ends):
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if starts.size == 0:
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    starts = starts[order]
+    ends = ends[order]
+    runningEnd = np.maximum.accumulate(ends)
+    newGroup = np.ones(starts.size, dtype=bool)
+    newGroup[1:] = starts[1:] > runningEnd[:-1]
+    groupStartInds = np.flatnonzero(newGroup)
+    return starts[groupStartInds], np.maximum.reduceat(ends, groupStartInds)
+
+
+def _moving_std_numpy(data, window_length):
+    data = np.asarray(data, dtype=np.float64)
+    npts = data.size
+    halfWin = window_length // 2
+    first = np.clip(np.arange(npts) - halfWin, 0, npts)
+    last = np.clip(np.arange(npts) - halfWin + window_length, 0, npts)
+
+    # Use cumulative sums of (demeaned) data so each window is computed in constant time
+    centered = data - data.mean()
+    cumSum = np.concatenate(([0.0], np.cumsum(centered)))
+    cumSumSq = np.concatenate(([0.0], np.cumsum(centered * centered)))
+    count = (last - first).astype(np.float64)
+    winSum = cumSum[last] - cumSum[first]
+    winSumSq = cumSumSq[last] - cumSumSq[first]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (winSumSq - winSum * winSum / count) / (count - 1)
+    var[count < 2] = np.nan
+    return np.sqrt(np.clip(var, 0, None))
+
+
+# Loop-based implementations (compiled with numba, if available)
+def _runs_from_indices_loop(indices, min_length):
+    n = indices.size
+    starts = np.empty(n, dtype=np.int64)
+    ends = np.empty(n, dtype=np.int64)
+    nRuns = 0
+    if n == 0:
+        return starts[:0], ends[:0]
+    startInd = indices[0]
+    endInd = indices[0]
+    for i in range(1, n):
+        if indices[i] - endInd > 1:
+            if endInd - startInd >= min_length:
+                starts[nRuns] = startInd
+                ends[nRuns] = endInd
+                nRuns += 1
+            startInd = indices[i]
+        endInd = indices[i]
+    if endInd - startInd >= min_length:
+        starts[nRuns] = startInd
+        ends[nRuns] = endInd
+        nRuns += 1
+    return starts[:nRuns], ends[:nRuns]
+
+
+def _runs_from_mask_loop(mask, min_length):
+    n = mask.size
+    starts = np.empty(n, dtype=np.int64)
+    ends = np.empty(n, dtype=np.int64)
+    nRuns = 0
+    inRun = False
+    startInd = 0
+    for i in range(n):
+        if mask[i] and not inRun:
+            inRun = True
+            startInd = i
+        elif not mask[i] and inRun:
+            inRun = False
+            if i - 1 - startInd >= min_length:
+                starts[nRuns] = startInd
+                ends[nRuns] = i - 1
+                nRuns += 1
+    if inRun and n - 1 - startInd >= min_length:
+        starts[nRuns] = startInd
+        ends[nRuns] = n - 1
+        nRuns += 1
+    return starts[:nRuns], ends[:nRuns]
+
+
+def _merge_windows_loop(starts, ends):
+    n = starts.size
+    outStarts = np.empty(n, dtype=np.int64)
+    outEnds = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return outStarts, outEnds
+    order = np.argsort(starts, kind='mergesort')
+    nOut = 0
+    currStart = starts[order[0]]
+    currEnd = ends[order[0]]
+    for i in range(1, n):
+        s = starts[order[i]]
+        e = ends[order[i]]
+        if s <= currEnd:
+            if e > currEnd:
+                currEnd = e
+        else:
+            outStarts[nOut] = currStart
+            outEnds[nOut] = currEnd
+            nOut += 1
+            currStart = s
+            currEnd = e
+    outStarts[nOut] = currStart
+    outEnds[nOut] = currEnd
+    nOut += 1
+    return outStarts[:nOut], outEnds[:nOut]
+
+
+def _moving_std_loop(data, window_length):
+    npts = data.size
+    out = np.empty(npts, dtype=np.float64)
+    halfWin = window_length // 2
+    mean = 0.0
+    for i in range(npts):
+        mean += data[i]
+    mean = mean / max(npts, 1)
+
+    # Running sums over the window, updated as the window slides
+    winSum = 0.0
+    winSumSq = 0.0
+    first = 0
+    last = 0
+    for i in range(npts):
+        newFirst = min(max(i - halfWin, 0), npts)
+        newLast = min(max(i - halfWin + window_length, 0), npts)
+        while last < newLast:
+            val = data[last] - mean
+            winSum += val
+            winSumSq += val * val
+            last += 1
+        while first < newFirst:
+            val = data[first] - mean
+            winSum -= val
+            winSumSq -= val * val
+            first += 1
+        count = last - first
+        if count < 2:
+            out[i] = np.nan
+        else:
+            var = (winSumSq - winSum * winSum / count) / (count - 1)
+            out[i] = np.sqrt(var) if var > 0 else 0.0
+    return out
+
+
+if NUMBA_AVAILABLE:
+    _runs_from_indices_jit = numba.njit(cache=True)(_runs_from_indices_loop)
+    _runs_from_mask_jit = numba.njit(cache=True)(_runs_from_mask_loop)
+    _merge_windows_jit = numba.njit(cache=True)(_merge_windows_loop)
+    _moving_std_jit = numba.njit(cache=True)(_moving_std_loop)
+else:
+    _runs_from_indices_jit = _runs_from_indices_loop
+    _runs_from_mask_jit = _runs_from_mask_loop
+    _merge_windows_jit = _merge_windows_loop
+    _moving_std_jit = _moving_std_loop
+
+
+# Functions used by sprit_hvsr
+def runs_from_indices(indices, min_length=0, use_jit=None):
+    """Get the first and last index of each run of consecutive indices
+
+    Parameters
+    ----------
+    indices : numpy.ndarray
+        Sorted array of unique (integer) sample indices
+    min_length : int, optional
+        Runs where the last index minus the first index is less than min_length are not returned, by default 0
+    use_jit : bool or None, optional
+        Whether to use the numba-compiled kernel. If None, it is used if numba is installed, by default None
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Arrays with the first and last index of each run
+    """
+    if use_jit is None:
+        use_jit = NUMBA_AVAILABLE
+    if use_jit:
+        return _runs_from_indices_jit(np.ascontiguousarray(indices, dtype=np.int64), int(min_length))
+    return _runs_from_indices_numpy(indices, min_length)
+
+
+def runs_from_mask(mask, min_length=0, use_jit=None):
+    """Get the first and last index of each run of True values in a boolean array
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        Boolean array with one value per sample
+    min_length : int, optional
+        Runs where the last index minus the first index is less than min_length are not returned, by default 0
+    use_jit : bool or None, optional
+        Whether to use the numba-compiled kernel. If None, it is used if numba is installed, by default None
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Arrays with the first and last index of each run
+    """
+    if use_jit is None:
+        use_jit = NUMBA_AVAILABLE
+    if use_jit:
+        return _runs_from_mask_jit(np.ascontiguousarray(mask, dtype=np.bool_), int(min_length))
+    return _runs_from_mask_numpy(mask, min_length)
+
+
+def merge_windows(starts, ends, use_jit=None):
+    """Sort windows (in samples) and merge any that overlap
+
+    Parameters
+    ----------
+    starts : numpy.ndarray
+        First sample of each window
+    ends : numpy.ndarray
+        Last sample of each window
+    use_jit : bool or None, optional
+        Whether to use the numba-compiled kernel. If None, it is used if numba is installed, by default None
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Arrays with the first and last sample of each merged window
+    """
+    if use_jit is None:
+        use_jit = NUMBA_AVAILABLE
+    if use_jit:
+        return _merge_windows_jit(np.ascontiguousarray(starts, dtype=np.int64), np.ascontiguousarray(ends, dtype=np.int64))
+    return _merge_windows_numpy(starts, ends)
+
+
+def moving_std(data, window_length, use_jit=None):
+    """Centered moving (rolling) standard deviation
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Input data
+    window_length : int
+        Length of moving window, in samples
+    use_jit : bool or None, optional
+        Whether to use the numba-compiled kernel. If None, it is used if numba is installed, by default None
+
+    Returns
+    -------
+    numpy.ndarray
+        Standard deviation (ddof=1) of the window centered on each sample (nan where the window has fewer than two samples)
+    """
+    if use_jit is None:
+        use_jit = NUMBA_AVAILABLE
+    window_length = max(int(window_length), 1)
+    if use_jit:
+        return _moving_std_jit(np.ascontiguousarray(data, dtype=np.float64), window_length)
+    return _moving_std_numpy(data, window_length)
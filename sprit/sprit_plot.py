@@ -1005,141 +1005,80 @@ def plot_preview(hv_data, stream=None, preview_fig=None, spectrogram_component='
     if return_fig:
         return preview_fig
 
-def plot_outlier_curves(hvsr_data, plot_engine='plotly', rmse_thresh=0.98, use_percentile=True, use_hv_curve=False, from_roc=False, show_plot=True, verbose=False):
-    hv_data = hvsr_data
-    #outlier_fig = go.FigureWidget()
+def plot_outlier_curves(hvsr_data, plot_engine='plotly', rmse_thresh=0.98, use_percentile=True, use_hv_curve=False, outlier_method='rmse', n_iterations=1, 
+                        from_roc=False, show_plot=True, verbose=False):
     outlier_fig = go.Figure()
 
-    roc_kwargs = {'rmse_thresh':rmse_thresh,
-                    'use_percentile':True,
-                    'use_hv_curve':use_hv_curve,
-                    'show_outlier_plot':False,
-                    'plot_engine':'None',
-                    'verbose':verbose
-                    }
-    if 'PPSDStatus' in hvsr_data.ProcessingStatus.keys() and hvsr_data.ProcessingStatus['PPSDStatus']:
-        #log_textArea.value += f"\n\n{datetime.datetime.now()}\nremove_outlier_curves():\n'{roc_kwargs}"    
-        #hvsr_data = sprit_hvsr.remove_outlier_curves(hvsr_data, **roc_kwargs)
-        pass
-    else:
-        #log_textArea.value += f"\n\n{datetime.datetime.now()}\nremove_outlier_curves() attempted, but not completed. hvsr_data.ProcessingStatus['PPSDStatus']=False\n'{roc_kwargs}"
+    if 'PPSDStatus' not in hvsr_data['ProcessingStatus'].keys() or not hvsr_data['ProcessingStatus']['PPSDStatus']:
+        return outlier_fig
+    if 'hvsr_windows_df' not in hvsr_data.keys():
         return outlier_fig
 
-    if roc_kwargs['use_hv_curve']:
+    def comp_rgba(comp, a):
+        compstr = f'rgba(0, 0, 0, {a})'
+        if comp=='E':
+            compstr = f'rgba(50, 50, 250, {a})'
+        if comp=='N':
+            compstr = f'rgba(250, 50, 50, {a})'
+        return compstr
+
+    # Join all curves of a category into one trace (curves separated by nan values)
+    def nan_separated(x_data, curves):
+        curves = np.asarray(curves, dtype=float)
+        xArr = np.tile(np.append(x_data, np.nan), curves.shape[0])
+        yArr = np.hstack([curves, np.full((curves.shape[0], 1), np.nan)]).ravel()
+        return xArr, yArr
+
+    # Score the same curves as remove_outlier_curves() (including azimuths), but only plot Z/E/N (or the main H/V curve)
+    compNames, colNames = sprit_hvsr._outlier_curve_columns(hvsr_data['hvsr_windows_df'], use_hv_curve=use_hv_curve)
+    if use_hv_curve:
+        rowDict = {'HV_Curves':1}
         no_subplots = 1
-        if hasattr(hvsr_data, 'hvsr_windows_df') and 'HV_Curves' in hvsr_data.hvsr_windows_df.columns:
-            outlier_fig.data = []
-            outlier_fig.update_layout(grid=None)  # Clear the existing grid layout
-            outlier_subp = subplots.make_subplots(rows=no_subplots, cols=1, horizontal_spacing=0.01, vertical_spacing=0.1)
-            outlier_fig.update_layout(grid={'rows': 1})
-            #outlier_fig = go.FigureWidget(outlier_subp)
-            outlier_fig = go.Figure(outlier_subp)
-
-            x_data = hvsr_data['x_freqs']
-            curve_traces = []
-            for hv in hvsr_data.hvsr_windows_df['HV_Curves'].iterrows():
-                curve_traces.append(go.Scatter(x=x_data, y=hv[1]))
-            outlier_fig.add_traces(curve_traces)
-            
-            # Calculate a median curve, and reshape so same size as original
-            medCurve = np.nanmedian(np.stack(hvsr_data.hvsr_windows_df['HV_Curves']), axis=0)
-            outlier_fig.add_trace(go.Scatter(x=x_data, y=medCurve, line=dict(color='rgba(0,0,0,1)', width=1.5),showlegend=False))
-            
-            minY = np.nanmin(np.stack(hvsr_data.hvsr_windows_df['HV_Curves']))
-            maxY = np.nanmax(np.stack(hvsr_data.hvsr_windows_df['HV_Curves']))
-            totalWindows = hvsr_data.hvsr_windows_df.shape[0]
-            #medCurveArr = np.tile(medCurve, (curr_data.shape[0], 1))
-
+        outlier_fig = go.Figure(subplots.make_subplots(rows=no_subplots, cols=1, horizontal_spacing=0.01, vertical_spacing=0.1))
     else:
+        rowDict = {'Z':1, 'E':2, 'N':3}
         no_subplots = 3
-        outlier_fig.data = []
-        outlier_fig.update_layout(grid=None)  # Clear the existing grid layout
-        outlier_subp = subplots.make_subplots(rows=no_subplots, cols=1, horizontal_spacing=0.01, vertical_spacing=0.02,
-                                                row_heights=[1, 1, 1])
-        outlier_fig.update_layout(grid={'rows': 3})
-        #outlier_fig = go.FigureWidget(outlier_subp)
-        outlier_fig = go.Figure(outlier_subp)
-
-        if hasattr(hvsr_data, 'hvsr_windows_df'):
-            rowDict = {'Z':1, 'E':2, 'N':3}
-            showTLabelsDict={'Z':False, 'E':False, 'N':True}
-            def comp_rgba(comp, a):
-                compstr = ''
-                if comp=='Z':
-                    compstr = f'rgba(0, 0, 0, {a})'
-                if comp=='E':
-                    compstr = f'rgba(50, 50, 250, {a})'
-                if comp=='N':
-                    compstr = f'rgba(250, 50, 50, {a})'
-                return compstr                         
-            compNames = ['Z', 'E', 'N']
-            rmse_to_plot=[]
-            med_traces=[]
-
-            noRemoved = 0
-            indRemoved = []
-            for i, comp in enumerate(compNames):
-                if hasattr(hvsr_data, 'x_freqs'):
-                    x_data = hvsr_data['x_freqs'][comp]
-                else:
-                    x_data = [1/p for p in hvsr_data['ppsds'][comp]['period_xedges'][1:]]                    
-                column = 'psd_values_'+comp
-                # Retrieve data from dataframe (use all windows, just in case)
-                curr_data = np.stack(hvsr_data['hvsr_windows_df'][column])
-                
-                # Calculate a median curve, and reshape so same size as original
-                medCurve = np.nanmedian(curr_data, axis=0)
-                medCurveArr = np.tile(medCurve, (curr_data.shape[0], 1))
-                medTrace = go.Scatter(x=x_data, y=medCurve, line=dict(color=comp_rgba(comp, 1), width=1.5), 
-                                                name=f'{comp} Component', showlegend=True)
-                # Calculate RMSE
-                rmse = np.sqrt(((np.subtract(curr_data, medCurveArr)**2).sum(axis=1))/curr_data.shape[1])
-
-                rmse_threshold = np.percentile(rmse, roc_kwargs['rmse_thresh'])
-                
-                # Retrieve index of those RMSE values that lie outside the threshold
-                timeIndex = hvsr_data['hvsr_windows_df'].index
-                for j, curve in enumerate(curr_data):
-                    if rmse[j] > rmse_threshold:
-                        badTrace = go.Scatter(x=x_data, y=curve,
-                                            line=dict(color=comp_rgba(comp, 1), width=1.5, dash='dash'),
-                                            #marker=dict(color=comp_rgba(comp, 1), size=3),
-                                            name=str(hvsr_data.hvsr_windows_df.index[j]), showlegend=False)
-                        outlier_fig.add_trace(badTrace, row=rowDict[comp], col=1)
-                        if j not in indRemoved:
-                            indRemoved.append(j)
-                        noRemoved += 1
-                    else:
-                        goodTrace = go.Scatter(x=x_data, y=curve,
-                                                line=dict(color=comp_rgba(comp, 0.01)), name=str(hvsr_data.hvsr_windows_df.index[j]), showlegend=False)
-                        outlier_fig.add_trace(goodTrace, row=rowDict[comp], col=1)
-
-                #timeIndRemoved = pd.DatetimeIndex([timeIndex[ind] for ind in indRemoved])
-                #hvsr_data['hvsr_windows_df'].loc[timeIndRemoved, 'Use'] = False
-
-                outlier_fig.add_trace(medTrace, row=rowDict[comp], col=1)
-                
-                outlier_fig.update_xaxes(showticklabels=False, row=1, col=1)
-                outlier_fig.update_yaxes(title={'text':'Z'}, row=1, col=1)
-                outlier_fig.update_xaxes(showticklabels=False, row=2, col=1)
-                outlier_fig.update_yaxes(title={'text':'E'}, row=2, col=1)
-                outlier_fig.update_xaxes(showticklabels=True, row=3, col=1)
-                outlier_fig.update_yaxes(title={'text':'N'}, row=3, col=1)
-
-                outlier_fig.update_layout(margin={"l":10, "r":10, "t":30, 'b':0}, showlegend=True,
-                                title=f"{hvsr_data['site']} Outliers")
-                if comp == 'N':
-                    minY = np.nanmin(curr_data)
-                    maxY = np.nanmax(curr_data)
-                totalWindows = curr_data.shape[0]
-            
-            outlier_fig.add_annotation(
-                text=f"{len(indRemoved)}/{totalWindows} outlier windows removed",
-                x=np.log10(max(x_data)) - (np.log10(max(x_data))-np.log10(min(x_data))) * 0.01,
-                y=minY+(maxY-minY)*0.01,
-                xanchor="right", yanchor="bottom",#bgcolor='rgba(256,256,256,0.7)',
-                showarrow=False,row=no_subplots, col=1)
-
+        outlier_fig = go.Figure(subplots.make_subplots(rows=no_subplots, cols=1, horizontal_spacing=0.01, vertical_spacing=0.02,
+                                                       row_heights=[1, 1, 1]))
+
+    # Retrieve data from dataframe (use all windows, just in case)
+    curveStack = np.stack([np.stack(hvsr_data['hvsr_windows_df'][column]) for column in colNames], axis=1)
+    keepWindows, rmse, rmse_threshold, medCurves = sprit_hvsr._outlier_curve_scores(curveStack, rmse_thresh=rmse_thresh, use_percentile=use_percentile,
+                                                                                      outlier_method=outlier_method, n_iterations=n_iterations)
+    for i, comp in enumerate(compNames[:no_subplots]):
+        if use_hv_curve:
+            x_data = hvsr_data['x_freqs'][list(hvsr_data['x_freqs'].keys())[0]][:curveStack.shape[2]]
+        elif 'x_freqs' in hvsr_data.keys():
+            x_data = hvsr_data['x_freqs'][comp]
+        else:
+            x_data = [1/p for p in hvsr_data['ppsds'][comp]['period_xedges'][1:]]
+        x_data = np.asarray(x_data)[:curveStack.shape[2]]
+
+        removed = rmse[:, i] > rmse_threshold[i]
+        xGood, yGood = nan_separated(x_data, curveStack[~removed, i, :])
+        outlier_fig.add_trace(go.Scatter(x=xGood, y=yGood, mode='lines', line=dict(color=comp_rgba(comp, 0.1), width=1),
+                                         name=f'{comp} Retained', showlegend=False, connectgaps=False), row=rowDict[comp], col=1)
+        if np.any(removed):
+            xBad, yBad = nan_separated(x_data, curveStack[removed, i, :])
+            outlier_fig.add_trace(go.Scatter(x=xBad, y=yBad, mode='lines', line=dict(color=comp_rgba(comp, 1), width=1.5, dash='dash'),
+                                             name=f'{comp} Removed', showlegend=False, connectgaps=False), row=rowDict[comp], col=1)
+        outlier_fig.add_trace(go.Scatter(x=x_data, y=medCurves[i], line=dict(color=comp_rgba(comp, 1), width=1.5),
+                                         name=f'{comp} Component', showlegend=not use_hv_curve), row=rowDict[comp], col=1)
+
+        outlier_fig.update_xaxes(showticklabels=(rowDict[comp] == no_subplots), row=rowDict[comp], col=1)
+        outlier_fig.update_yaxes(title={'text':comp.split('_')[0]}, row=rowDict[comp], col=1)
+
+    minY = np.nanmin(curveStack[:, no_subplots-1, :])
+    maxY = np.nanmax(curveStack[:, no_subplots-1, :])
+    totalWindows = curveStack.shape[0]
+    outlier_fig.update_layout(margin={"l":10, "r":10, "t":30, 'b':0}, showlegend=True,
+                              title=f"{hvsr_data['site']} Outliers")
+    outlier_fig.add_annotation(
+        text=f"{np.count_nonzero(~keepWindows)}/{totalWindows} outlier windows removed",
+        x=np.log10(np.nanmax(x_data)) - (np.log10(np.nanmax(x_data))-np.log10(np.nanmin(x_data))) * 0.01,
+        y=minY+(maxY-minY)*0.01,
+        xanchor="right", yanchor="bottom",
+        showarrow=False, row=no_subplots, col=1)
 
     outlier_fig.update_xaxes(type='log')
     #with outlier_graph_widget:
@@ -1151,3 +1090,38 @@ def comp_rgba(comp, a):
         outlier_fig.show()
 
     return outlier_fig
+
+
+def plot_azimuth(hvsr_data, fig=None, show_azimuth_peaks=False, interpolate_azimuths=True, show_azimuth_grid=False, show_plot=True):
+    if fig is None:
+        fig = go.Figure()
+    fig.data = []
+
+    # Same (cached) polar grid as the matplotlib azimuth plot
+    azGrid = hvsr_data.azimuth_grid
+    theta, values = azGrid.mirrored(interpolate=interpolate_azimuths)
+    th, r = np.meshgrid(np.rad2deg(theta), azGrid.freqs, indexing='ij')
+
+    fig.add_trace(go.Scatterpolargl(r=r.ravel(), theta=th.ravel(), mode='markers',
+                                    marker=dict(color=values.ravel(), colorscale='Jet', size=3, 
+                                                colorbar=dict(title='H/V')),
+                                    hovertemplate='%{theta:.0f}°, %{r:.2f} Hz<extra></extra>',
+                                    showlegend=False))
+
+    if show_azimuth_peaks:
+        peakVals = [hvsr_data.BestPeak[k]['f0'] for k in azGrid.azimuth_names]
+        peakThetas = azGrid.azimuths_deg.tolist()
+        fig.add_trace(go.Scatterpolar(r=peakVals + peakVals, theta=peakThetas + (np.array(peakThetas) + 180).tolist(), mode='markers',
+                                      marker=dict(symbol='hexagon-open', color='black', size=8),
+                                      name='Peaks', showlegend=False))
+
+    hvsrBand = hvsr_data['hvsr_band']
+    fig.update_layout(title=hvsr_data['site'],
+                      polar=dict(angularaxis=dict(rotation=90, direction='clockwise', showgrid=show_azimuth_grid),
+                                 radialaxis=dict(type='log', range=[np.log10(hvsrBand[0]), np.log10(hvsrBand[1])], 
+                                                 showgrid=show_azimuth_grid, title='Frequency [Hz]')))
+
+    if show_plot:
+        fig.show()
+
+    return fig